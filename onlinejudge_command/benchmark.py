@@ -0,0 +1,88 @@
+"""This module summarizes measurements of repeated runs, e.g. `--repeat` of `test` subcommand.
+"""
+
+import math
+import random
+import statistics
+from typing import *
+
+BOOTSTRAP_RESAMPLES = 1000
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """percentile computes the q-th percentile (0 <= q <= 100) with the linear interpolation between closest ranks.
+    """
+
+    if not values:
+        raise ValueError('percentile of empty data')
+    if not 0 <= q <= 100:
+        raise ValueError('percentile must be in [0, 100]: {}'.format(q))
+    sorted_values = sorted(values)
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """summarize computes min, median, mean, p95 and the sample standard deviation of measurements.
+
+    :returns: a dict which has `count`, `min`, `median`, `mean`, `p95` and `stddev`. `stddev` is 0 for a single value.
+    """
+
+    if not values:
+        raise ValueError('summary of empty data')
+    return {
+        'count': len(values),
+        'min': min(values),
+        'median': statistics.median(values),
+        'mean': statistics.fmean(values),
+        'p95': percentile(values, 95),
+        'stddev': statistics.stdev(values) if len(values) >= 2 else 0.0,
+    }
+
+
+def bootstrap_confidence_interval(values: Sequence[float], statistic: Callable[[Sequence[float]], float], *, confidence: float = 0.95, resamples: int = BOOTSTRAP_RESAMPLES, seed: int = 0) -> Tuple[float, float]:
+    """bootstrap_confidence_interval estimates the confidence interval of a statistic with the percentile bootstrap.
+
+    The result is deterministic for the same seed.
+    """
+
+    if not values:
+        raise ValueError('confidence interval of empty data')
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be in (0, 1): {}'.format(confidence))
+    rnd = random.Random(seed)
+    estimates = [statistic(rnd.choices(values, k=len(values))) for _ in range(resamples)]
+    alpha = (1 - confidence) / 2 * 100
+    return percentile(estimates, alpha), percentile(estimates, 100 - alpha)
+
+
+def summarize_speedups(ratios: Sequence[float], *, confidence: float = 0.95) -> Dict[str, float]:
+    """summarize_speedups computes the geometric mean of speedup ratios and its confidence interval.
+
+    :param ratios: positive ratios like `baseline_time / time`
+    :returns: a dict which has `speedup`, `lower` and `upper`.
+    """
+
+    if any(ratio <= 0 for ratio in ratios):
+        raise ValueError('speedup ratios must be positive')
+    lower, upper = bootstrap_confidence_interval(ratios, statistics.geometric_mean, confidence=confidence)
+    return {
+        'speedup': statistics.geometric_mean(ratios),
+        'lower': lower,
+        'upper': upper,
+    }
+
+
+def compare_speed(baseline: Sequence[float], target: Sequence[float], *, confidence: float = 0.95) -> Dict[str, float]:
+    """compare_speed estimates how many times `target` is faster than `baseline` from paired measurements, i.e. the i-th values of them are measured in turn.
+
+    :returns: the same dict as `summarize_speedups`. The speedup is greater than 1 if `target` is faster.
+    """
+
+    if len(baseline) != len(target):
+        raise ValueError('the numbers of measurements differ: {} and {}'.format(len(baseline), len(target)))
+    if any(value <= 0 for value in list(baseline) + list(target)):
+        raise ValueError('measurements must be positive')
+    return summarize_speedups([b / t for b, t in zip(baseline, target)], confidence=confidence)
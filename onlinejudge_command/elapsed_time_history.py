@@ -0,0 +1,105 @@
+"""This module records the elapsed time of each test case to schedule the next run of `test` subcommand.
+"""
+
+import json
+import os
+import pathlib
+import tempfile
+import time
+import traceback
+from logging import getLogger
+from typing import *
+
+from onlinejudge_command import utils
+
+logger = getLogger(__name__)
+
+
+class ElapsedTimeHistory:
+    def __init__(self, path: pathlib.Path = utils.user_cache_dir / 'elapsed-time-history.json', *, max_directories: int = 100):
+        self.path = path
+        self.max_directories = max_directories
+
+    def _load(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path) as fh:
+                return json.load(fh)
+        except (json.decoder.JSONDecodeError, OSError):
+            logger.warning('broken history of elapsed time found: %s', self.path)
+            logger.debug('%s', traceback.format_exc())
+            return {}
+
+    def get(self, *, directory: pathlib.Path) -> Dict[str, Dict[str, float]]:
+        """
+        :returns: a dict from names of test cases to records which have `elapsed` and `size` of the input.
+        """
+
+        data = self._load().get(str(directory.resolve()))
+        if data is None:
+            return {}
+        return data['cases']
+
+    def update(self, records: Dict[str, Dict[str, float]], *, directory: pathlib.Path, names: Iterable[str]) -> None:
+        """
+        :param names: the names of all test cases in the directory. Records of other cases are removed, and records of cases which are not run this time are kept.
+        """
+
+        data = self._load()
+        key = str(directory.resolve())
+        previous_cases = data.get(key, {}).get('cases', {})
+        cases = {name: previous_cases[name] for name in names if name in previous_cases}
+        cases.update(records)
+        data[key] = {
+            'timestamp': int(time.time()),
+            'cases': cases,
+        }
+
+        # forget old directories
+        if len(data) > self.max_directories:
+            keys = sorted(data.keys(), key=lambda key: data[key]['timestamp'], reverse=True)
+            data = {key: data[key] for key in keys[:self.max_directories]}
+
+        logger.debug('update the history of elapsed time: %s', self.path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write atomically, because other processes may run `test` subcommand at the same time
+        with tempfile.NamedTemporaryFile('w', dir=str(self.path.parent), delete=False) as fh:
+            json.dump(data, fh)
+        os.replace(fh.name, self.path)
+
+
+def predict_elapsed_times(sizes: Dict[str, int], *, records: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """predict_elapsed_times predicts the elapsed time of each test case from the history. Cases without history are estimated from the sizes of their inputs.
+
+    :param sizes: a dict from names of test cases to sizes of their inputs
+    """
+
+    # estimate seconds per byte from known cases
+    total_elapsed = 0.0
+    total_size = 0.0
+    for name, record in records.items():
+        if name in sizes:
+            total_elapsed += record['elapsed']
+            total_size += record['size']
+    if total_size and total_elapsed:
+        rate = total_elapsed / total_size
+    else:
+        rate = 1.0  # any positive value keeps the order of sizes
+
+    predicted: Dict[str, float] = {}
+    for name, size in sizes.items():
+        known = records.get(name)
+        if known is not None and known['size'] == size:
+            predicted[name] = known['elapsed']
+        else:
+            predicted[name] = size * rate
+    return predicted
+
+
+def sort_longest_first(sizes: Dict[str, int], *, records: Dict[str, Dict[str, float]]) -> List[str]:
+    """sort_longest_first returns names of test cases in the order of the LPT (longest-processing-time-first) scheduling.
+    """
+
+    predicted = predict_elapsed_times(sizes, records=records)
+    return sorted(sizes.keys(), key=lambda name: (-predicted[name], name))
@@ -1,11 +1,11 @@
 import collections
-import glob
+import functools
 import os
 import pathlib
 import re
 import sys
 from logging import getLogger
-from typing import Dict, Generator, List, Match, Optional, Set
+from typing import Dict, Generator, Iterator, List, Match, Optional, Pattern, Set, Tuple
 
 logger = getLogger(__name__)
 
@@ -47,27 +47,94 @@ def percentparse(s: str, format: str, table: Dict[str, str]) -> Optional[Dict[st
     return m.groupdict()
 
 
-def glob_with_format(directory: pathlib.Path, format: str) -> List[pathlib.Path]:
+@functools.lru_cache(maxsize=None)
+def compile_format(format: str) -> Pattern[str]:
+    """compile_format compiles a format like `%s.%e` to a regular expression for paths relative to the directory. The results are cached.
+    """
+
     if os.name == 'nt':
         format = format.replace('/', '\\')
     table = {}
-    table['s'] = '*'
-    table['e'] = '*'
-    pattern = (glob.escape(str(directory) + os.path.sep) + percentformat(glob.escape(format).replace(glob.escape('%'), '%'), table))
-    paths = list(map(pathlib.Path, glob.glob(pattern)))
-    for path in paths:
+    table['s'] = '(?P<name>.+)'
+    table['e'] = '(?P<ext>in|out)'
+    return re.compile(percentformat(re.escape(format).replace(re.escape('%'), '%'), table))
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_format_as_glob(format: str) -> List[Pattern[str]]:
+    """_compile_format_as_glob compiles each component of a format like `%s.%e` to a regular expression which works as `glob.glob` with `*` for `%s` and `%e`.
+    """
+
+    table = {}
+    table['s'] = '.*'
+    table['e'] = '.*'
+    return [re.compile(percentformat(re.escape(component).replace(re.escape('%'), '%'), table), re.DOTALL) for component in format.split('/')]
+
+
+def walk_with_format(directory: pathlib.Path, format: str, *, visited_directories: Optional[Dict[pathlib.Path, int]] = None) -> Iterator[Tuple[pathlib.Path, str]]:
+    """walk_with_format lists paths which match the format, walking only the needed depth of the directory with `os.scandir`.
+
+    :param visited_directories: the mtimes of the directories which are scanned are stored to this dict. They are read before scanning, so changes during the walk make them stale.
+    :returns: pairs of paths and their relative paths from the directory
+    """
+
+    patterns = _compile_format_as_glob(format)
+
+    def walk(path: pathlib.Path, relative: Optional[str], depth: int) -> Iterator[Tuple[pathlib.Path, str]]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns if visited_directories is not None else 0
+            entries = list(os.scandir(path))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return
+        if visited_directories is not None:
+            visited_directories[path] = mtime_ns
+        is_last = depth + 1 == len(patterns)
+        for entry in entries:
+            # `*` of glob doesn't match hidden files
+            if entry.name.startswith('.') and not patterns[depth].pattern.startswith(re.escape('.')):
+                continue
+            if not patterns[depth].fullmatch(entry.name):
+                continue
+            entry_relative = entry.name if relative is None else relative + os.path.sep + entry.name
+            if is_last:
+                yield path / entry.name, entry_relative
+            elif entry.is_dir():
+                yield from walk(path / entry.name, entry_relative, depth + 1)
+
+    yield from walk(directory, None, 0)
+
+
+def glob_with_format(directory: pathlib.Path, format: str) -> List[pathlib.Path]:
+    paths = []
+    for path, _ in walk_with_format(directory, format):
         logger.debug('testcase globbed: %s', path)
+        paths.append(path)
     return paths
 
 
+def _relative_path_from_directory(directory: pathlib.Path, path: pathlib.Path) -> Optional[str]:
+    """_relative_path_from_directory compares paths lexically if possible, to avoid syscalls of `resolve()` for each file.
+    """
+
+    if path.is_absolute() == directory.is_absolute():
+        normalized_directory = os.path.normpath(str(directory))
+        normalized_path = os.path.normpath(str(path))
+        if normalized_directory == os.curdir and not normalized_path.startswith(os.pardir):
+            return normalized_path
+        prefix = normalized_directory.rstrip(os.path.sep) + os.path.sep
+        if normalized_path.startswith(prefix):
+            return normalized_path[len(prefix):]
+    try:
+        return str(path.resolve().relative_to(directory.resolve()))
+    except ValueError:
+        return None
+
+
 def match_with_format(directory: pathlib.Path, format: str, path: pathlib.Path) -> Optional[Match[str]]:
-    if os.name == 'nt':
-        format = format.replace('/', '\\')
-    table = {}
-    table['s'] = '(?P<name>.+)'
-    table['e'] = '(?P<ext>in|out)'
-    pattern = re.compile(re.escape(str(directory.resolve()) + os.path.sep) + percentformat(re.escape(format).replace(re.escape('%'), '%'), table))
-    return pattern.match(str(path.resolve()))
+    relative = _relative_path_from_directory(directory, path)
+    if relative is None:
+        return None
+    return compile_format(format).match(relative)
 
 
 def path_from_format(directory: pathlib.Path, format: str, name: str, ext: str) -> pathlib.Path:
@@ -92,17 +159,39 @@ def drop_backup_or_hidden_files(paths: List[pathlib.Path]) -> List[pathlib.Path]
     return result
 
 
+def _add_file_to_relationship(tests: Dict[str, Dict[str, pathlib.Path]], path: pathlib.Path, m: Optional[Match[str]]) -> None:
+    if not m:
+        logger.error('unrecognizable file found: %s', path)
+        sys.exit(1)
+    name = m.groupdict()['name']
+    ext = m.groupdict()['ext']
+    assert ext not in tests[name]
+    tests[name][ext] = path
+
+
 def construct_relationship_of_files(paths: List[pathlib.Path], directory: pathlib.Path, format: str) -> Dict[str, Dict[str, pathlib.Path]]:
     tests: Dict[str, Dict[str, pathlib.Path]] = collections.defaultdict(dict)
     for path in paths:
-        m = match_with_format(directory, format, path.resolve())
-        if not m:
-            logger.error('unrecognizable file found: %s', path)
-            sys.exit(1)
-        name = m.groupdict()['name']
-        ext = m.groupdict()['ext']
-        assert ext not in tests[name]
-        tests[name][ext] = path
+        _add_file_to_relationship(tests, path, match_with_format(directory, format, path))
+    return check_relationship_of_files(tests)
+
+
+def find_test_cases(directory: pathlib.Path, format: str, *, ignore_backup: bool) -> Dict[str, Dict[str, pathlib.Path]]:
+    """find_test_cases works as `glob_with_format`, `drop_backup_or_hidden_files` and `construct_relationship_of_files`, but walks the directory only once and pairs `.in` and `.out` files in the same pass.
+    """
+
+    pattern = compile_format(format)
+    tests: Dict[str, Dict[str, pathlib.Path]] = collections.defaultdict(dict)
+    for path, relative in walk_with_format(directory, format):
+        logger.debug('testcase globbed: %s', path)
+        if ignore_backup and is_backup_or_hidden_file(path):
+            logger.warning('ignore a backup file: %s', path)
+            continue
+        _add_file_to_relationship(tests, path, pattern.match(relative))
+    return check_relationship_of_files(tests)
+
+
+def check_relationship_of_files(tests: Dict[str, Dict[str, pathlib.Path]]) -> Dict[str, Dict[str, pathlib.Path]]:
     for name in tests:
         if 'in' not in tests[name]:
             assert 'out' in tests[name]
@@ -15,7 +15,7 @@ import onlinejudge_command.subcommand.login as subcommand_login
 import onlinejudge_command.subcommand.submit as subcommand_submit
 import onlinejudge_command.subcommand.test as subcommand_test
 import onlinejudge_command.subcommand.test_reactive as subcommand_test_reactive
-from onlinejudge_command import log_formatter, update_checking, utils
+from onlinejudge_command import log_formatter, profiling, update_checking, utils
 
 logger = getLogger(__name__)
 
@@ -88,12 +88,19 @@ def main(args: Optional[List[str]] = None) -> 'NoReturn':
     level = INFO
     if parsed.verbose:
         level = DEBUG
-    handler = StreamHandler(sys.stdout)
+    # Logs go to stderr when stdout is used for data, e.g. `oj test --report jsonl`
+    _, report_path = getattr(parsed, 'report', None) or (None, None)
+    handler = StreamHandler(sys.stderr if report_path == '-' else sys.stdout)
     handler.setFormatter(log_formatter.LogFormatter())
     basicConfig(level=level, handlers=[handler])
 
+    # profile oj itself from here, e.g. `oj test --profile-runner`
+    if getattr(parsed, 'profile_runner', False) or getattr(parsed, 'profile_runner_trace', None) is not None:
+        profiling.enable()
+
     # check update
-    is_updated = update_checking.run()
+    with profiling.phase('update check'):
+        is_updated = update_checking.run()
 
     try:
         sys.exit(run_program(parsed, parser=parser))
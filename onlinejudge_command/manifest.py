@@ -0,0 +1,241 @@
+"""This module has the manifest of test cases, which makes it fast to find cases in a large directory.
+
+The manifest is a JSON file in the directory of test cases. It records the cases with the sizes, mtimes and SHA-256 hashes of their files, and the mtimes of the directories.
+Adding, removing or renaming files changes the mtimes of their directories, so the manifest is trusted only while the mtimes of the directories are unchanged.
+The mtime of a directory is recorded as `null` when the directory is changed by other processes while the manifest is used. Such a manifest is stale and the directory is walked again.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+import traceback
+from logging import getLogger
+from typing import *
+
+import onlinejudge_command.format_utils as fmtutils
+from onlinejudge_command import result_cache
+
+logger = getLogger(__name__)
+
+MANIFEST_FILE_NAME = '.oj-manifest.json'  # a hidden file is never recognized as a test case
+_VERSION = 1
+
+# The resolution of mtimes is coarse on some file systems, e.g. 2 seconds on FAT. The manifest is not trusted if directories are modified within this time before it is saved.
+_RACY_MARGIN_NS = 2 * 10**9
+
+
+class Manifest:
+    """Manifest keeps the relationship of test cases. Use `open_manifest()` to make this.
+
+    `add_file()` and `hash_file()` are thread-safe. Changes are written by `save()`.
+    """
+    def __init__(self, *, directory: pathlib.Path, format: str) -> None:
+        self.directory = directory
+        self.format = format
+        self._lock = threading.Lock()
+        self._cases: Dict[str, Dict[str, Dict[str, Any]]] = {}  # name -> ext -> {path, size, mtime_ns, sha256}
+        self._directories: Dict[str, Optional[int]] = {os.curdir: None}  # relative paths of directories which can have cases -> their mtimes which the cases are consistent with. None if unknown.
+        self._is_modified = False
+        self._is_stale = False
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.directory / MANIFEST_FILE_NAME
+
+    def update(self, data: Optional[Dict[str, Any]]) -> bool:
+        """update uses the content of the manifest file if the directory is unchanged, and walks the directory otherwise.
+
+        :returns: False if there are files which are not recognized as cases. They should be reported in the usual way.
+        """
+
+        if data is not None and data['format'] == self.format and self._is_fresh(data):
+            logger.debug('use the manifest: %s', self.path)
+            self._cases = data['cases']
+            self._directories = dict(data['directories'])
+            return True
+        logger.info('update the manifest: %s', self.path)
+        return self._rebuild(data['cases'] if data is not None else {})
+
+    def _is_fresh(self, data: Dict[str, Any]) -> bool:
+        for relative, mtime_ns in data['directories'].items():
+            try:
+                current_mtime_ns = os.stat(self.directory / relative).st_mtime_ns
+            except OSError:
+                return False
+            if mtime_ns is None or current_mtime_ns != mtime_ns or mtime_ns >= data['saved_at_ns'] - _RACY_MARGIN_NS:
+                return False
+        return True
+
+    def _rebuild(self, previous_cases: Dict[str, Dict[str, Dict[str, Any]]]) -> bool:
+        """_rebuild walks the directory. Hashes are kept only for unchanged files.
+        """
+
+        previous_entries = {entry['path']: entry for exts in previous_cases.values() for entry in exts.values()}
+        pattern = fmtutils.compile_format(self.format)
+        visited_directories: Dict[pathlib.Path, int] = {}
+        for path, relative in fmtutils.walk_with_format(self.directory, self.format, visited_directories=visited_directories):
+            if fmtutils.is_backup_or_hidden_file(path):
+                continue
+            m = pattern.match(relative)
+            if not m or m.group('ext') in self._cases.get(m.group('name'), {}):
+                return False
+            stat = path.stat()
+            entry: Dict[str, Any] = {'path': relative, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            previous_entry = previous_entries.get(relative)
+            if previous_entry is not None and previous_entry['size'] == entry['size'] and previous_entry['mtime_ns'] == entry['mtime_ns'] and 'sha256' in previous_entry:
+                entry['sha256'] = previous_entry['sha256']
+            self._cases.setdefault(m.group('name'), {})[m.group('ext')] = entry
+        self._directories = {os.curdir: None, **{os.path.relpath(path, self.directory): mtime_ns for path, mtime_ns in visited_directories.items()}}
+        self._is_modified = True
+        return True
+
+    def get_names(self) -> Set[str]:
+        with self._lock:
+            return set(self._cases.keys())
+
+    def get_test_cases(self) -> Dict[str, Dict[str, pathlib.Path]]:
+        """get_test_cases works as `format_utils.find_test_cases` with `ignore_backup=True`, without walking the directory.
+        """
+
+        with self._lock:
+            tests = {name: {ext: self.directory / entry['path'] for ext, entry in exts.items()} for name, exts in self._cases.items()}
+        return fmtutils.check_relationship_of_files(tests)
+
+    def add_file(self, path: pathlib.Path, data: bytes) -> None:
+        """add_file records a file which has just been written.
+        """
+
+        m = fmtutils.match_with_format(self.directory, self.format, path)
+        with self._lock:
+            if not m or fmtutils.is_backup_or_hidden_file(path):
+                # The directory has a file which is not a case now. Let the next command find it by walking the directory.
+                self._is_stale = True
+                return
+            stat = path.stat()
+            relative = m.string
+            exts = self._cases.setdefault(m.group('name'), {})
+            previous_entry = exts.get(m.group('ext'))
+            exts[m.group('ext')] = {
+                'path': relative,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+            if previous_entry is None or previous_entry['path'] != relative:
+                self._record_created_path(relative)
+            self._is_modified = True
+
+    def _record_created_path(self, relative: str) -> None:
+        """_record_created_path takes the mtimes of directories which are changed by creating the file (and its directories) in this process.
+        """
+
+        parent = os.path.dirname(relative) or os.curdir
+        while True:
+            is_created = parent not in self._directories
+            self._directories[parent] = self._get_mtime_ns(parent)
+            if not is_created or parent == os.curdir:
+                break
+            parent = os.path.dirname(parent) or os.curdir
+
+    def _get_mtime_ns(self, relative: str) -> Optional[int]:
+        try:
+            return os.stat(self.directory / relative).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def hash_file(self, path: pathlib.Path) -> str:
+        """hash_file works as `result_cache.hash_file`, but reuses the recorded hash if the size and mtime of the file are unchanged.
+        """
+
+        m = fmtutils.match_with_format(self.directory, self.format, path)
+        if m is not None:
+            with self._lock:
+                entry = self._cases.get(m.group('name'), {}).get(m.group('ext'))
+            if entry is not None and entry['path'] == m.string:
+                stat = path.stat()
+                if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    if 'sha256' not in entry:
+                        sha256 = result_cache.hash_file(path)
+                        with self._lock:
+                            entry['sha256'] = sha256
+                            self._is_modified = True
+                    return entry['sha256']
+        return result_cache.hash_file(path)
+
+    def save(self) -> None:
+        with self._lock:
+            if self._is_stale:
+                self.path.unlink(missing_ok=True)
+                return
+            if not self._is_modified:
+                return
+
+            # Only changes made by this process advance the mtimes. Creating the manifest file changes the mtime of its directory, but overwriting doesn't.
+            if not self.directory.exists():
+                self.directory.mkdir(parents=True)
+                self._directories[os.curdir] = self._get_mtime_ns(os.curdir)
+            if not self.path.exists():
+                mtime_ns = self._get_mtime_ns(os.curdir)
+                self.path.touch()
+                if mtime_ns == self._directories.get(os.curdir):
+                    self._directories[os.curdir] = self._get_mtime_ns(os.curdir)
+
+            # Directories changed by others, e.g. files added by another command since the manifest is loaded, are written as stale.
+            directories: Dict[str, Optional[int]] = {}
+            for relative, mtime_ns in sorted(self._directories.items()):
+                current_mtime_ns = self._get_mtime_ns(relative)
+                if current_mtime_ns is not None:
+                    directories[relative] = mtime_ns if mtime_ns == current_mtime_ns else None
+            data = {
+                'version': _VERSION,
+                'format': self.format,
+                'saved_at_ns': time.time_ns(),
+                'directories': directories,
+                'cases': self._cases,
+            }
+            with self.path.open('w') as fh:
+                json.dump(data, fh)
+            self._is_modified = False
+
+
+def _read_manifest_file(path: pathlib.Path) -> Optional[Dict[str, Any]]:
+    try:
+        with path.open() as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except (json.decoder.JSONDecodeError, OSError):
+        logger.warning('broken manifest found: %s', path)
+        logger.debug('%s', traceback.format_exc())
+        return None
+    if not isinstance(data, dict) or data.get('version') != _VERSION:
+        return None
+    return data
+
+
+def open_manifest(directory: pathlib.Path, format: Optional[str] = None, *, create: bool = False) -> Optional[Manifest]:
+    """open_manifest loads the manifest in the directory, and rebuilds it if the directory is changed.
+
+    :param format: the format of cases. If None, the format of the existing manifest is used, e.g. for `download` subcommand which uses another format.
+    :param create: create a manifest if it doesn't exist.
+    :returns: None if the manifest is not used, or if it cannot be built because of unrecognizable files.
+    """
+
+    path = directory / MANIFEST_FILE_NAME
+    if not create and not path.exists():
+        return None
+    data = _read_manifest_file(path)
+    if format is None:
+        if data is None:
+            return None
+        format = data['format']
+    assert format is not None
+
+    manifest = Manifest(directory=directory, format=format)
+    if not manifest.update(data):
+        logger.warning('failed to make the manifest because of unrecognizable files: %s', path)
+        return None
+    return manifest
@@ -3,9 +3,13 @@
 
 import abc
 import enum
+import functools
+import itertools
 import math
+import re
 from logging import getLogger
 from typing import *
+from typing import BinaryIO  # It seems we cannot import BinaryIO with wildcard-import
 
 logger = getLogger(__name__)
 
@@ -18,11 +22,32 @@ class OutputComparator(abc.ABC):
         """
         raise NotImplementedError
 
+    def find_first_mismatch(self, actual: Sequence[bytes], expected: Sequence[bytes]) -> Optional[int]:
+        """find_first_mismatch compares many pairs of words at once. Subclasses may override this to make it faster.
+
+        :param actual: words of the same length to `expected`
+        :returns: `None` if all pairs are matched. Otherwise, the index of the first mismatched pair.
+        """
+
+        for i, (x, y) in enumerate(zip(actual, expected)):
+            if not self(x, y):
+                return i
+        return None
+
 
 class ExactComparator(OutputComparator):
     def __call__(self, actual: bytes, expected: bytes) -> bool:
         return actual == expected
 
+    def find_first_mismatch(self, actual: Sequence[bytes], expected: Sequence[bytes]) -> Optional[int]:
+        if list(actual) == list(expected):
+            return None
+        return super().find_first_mismatch(actual, expected)
+
+
+# The minimum number of words to use NumPy in FloatingPointNumberComparator. Small inputs are faster without NumPy.
+_MIN_VECTORIZED_WORDS = 16
+
 
 class FloatingPointNumberComparator(OutputComparator):
     def __init__(self, *, rel_tol: float, abs_tol: float):
@@ -48,6 +73,60 @@ class FloatingPointNumberComparator(OutputComparator):
         else:
             return actual == expected
 
+    def find_first_mismatch(self, actual: Sequence[bytes], expected: Sequence[bytes]) -> Optional[int]:
+        """find_first_mismatch parses all words at once, with NumPy if available. Only words which are not numbers are compared one by one.
+        """
+
+        if len(actual) < _MIN_VECTORIZED_WORDS:
+            return super().find_first_mismatch(actual, expected)
+        numpy = _import_numpy()
+        # NumPy's bytes arrays drop trailing NULs, which float() rejects
+        if numpy is not None and (b'\0' in b''.join(actual) or b'\0' in b''.join(expected)):
+            numpy = None
+
+        try:
+            if numpy is not None:
+                # astype() parses bytes in the same way to float()
+                x = numpy.array(actual, dtype=bytes).astype(numpy.float64)
+                y = numpy.array(expected, dtype=bytes).astype(numpy.float64)
+            else:
+                xs = list(map(float, actual))
+                ys = list(map(float, expected))
+        except ValueError:
+            # Some words are not numbers. Split the words to parse the other words at once.
+            mid = len(actual) // 2
+            i = self.find_first_mismatch(actual[:mid], expected[:mid])
+            if i is not None:
+                return i
+            j = self.find_first_mismatch(actual[mid:], expected[mid:])
+            return None if j is None else mid + j
+
+        if numpy is None:
+            for i, (a, b) in enumerate(zip(xs, ys)):
+                if not math.isclose(a, b, rel_tol=self.rel_tol, abs_tol=self.abs_tol):
+                    return i
+            return None
+
+        # the same to math.isclose(), which is different from numpy.isclose()
+        with numpy.errstate(invalid='ignore', over='ignore'):
+            tol = numpy.maximum(self.rel_tol * numpy.maximum(numpy.abs(x), numpy.abs(y)), self.abs_tol)
+            close = (x == y) | (numpy.isfinite(x) & numpy.isfinite(y) & (numpy.abs(x - y) <= tol))
+        if close.all():
+            return None
+        return int(numpy.argmin(close))
+
+
+@functools.lru_cache(maxsize=None)
+def _import_numpy() -> Any:
+    """_import_numpy returns the numpy module, or `None` if it is not installed. NumPy is an optional dependency.
+    """
+
+    try:
+        import numpy  # pylint: disable=import-error,import-outside-toplevel
+    except ImportError:
+        return None
+    return numpy
+
 
 class SplitComparator(OutputComparator):
     def __init__(self, word_comparator: OutputComparator):
@@ -59,10 +138,7 @@ class SplitComparator(OutputComparator):
         expected_words = expected.split()
         if len(actual_words) != len(expected_words):
             return False
-        for x, y in zip(actual_words, expected_words):
-            if not self.word_comparator(x, y):
-                return False
-        return True
+        return self.word_comparator.find_first_mismatch(actual_words, expected_words) is None
 
 
 class SplitLinesComparator(OutputComparator):
@@ -108,3 +184,547 @@ def check_lines_match(a: str, b: str, *, compare_mode: CompareMode) -> bool:
     else:
         assert False
     return comparator(a.encode(), b.encode())
+
+
+# The default size of chunks to read outputs for streaming comparators.
+CHUNK_SIZE = 1024 * 1024  # byte
+
+# The whitespace characters are the same to bytes.split()
+_TOKEN_PATTERN = re.compile(rb'(?P<WORD>[^ \t\n\r\x0b\x0c]+)|(?P<NEWLINES>\n+)|(?P<SPACES>[ \t\r\x0b\x0c]+)')
+
+
+class ComparisonResult(NamedTuple):
+    """ComparisonResult is the result of `compare_outputs`. The positions are 0-based and of the first mismatch in the actual output.
+    """
+
+    matched: bool
+    offset: Optional[int] = None  # in bytes
+    lineno: Optional[int] = None
+    word_index: Optional[int] = None  # the index of the word which has the mismatch, in the words split with whitespaces. A word which ends just at the mismatch has it.
+    is_whitespace_only: bool = False  # True if the outputs are matched when spaces and newlines are ignored. This is checked only for exact comparison without errors, where --ignore-spaces may help.
+
+
+class _TokenType(enum.Enum):
+    WORD = 'WORD'
+    NEWLINES = 'NEWLINES'
+    SPACES = 'SPACES'
+
+
+_TOKEN_TYPES = {typ.value: typ for typ in _TokenType}
+
+
+class _Token(NamedTuple):
+    type: _TokenType
+    value: bytes  # Runs of newlines keep `\r`s skipped by _remove_cr_of_crlf, to keep the offsets of the newlines.
+    offset: int  # in the original output
+    lineno: int  # the position of the token as `ComparisonResult`
+    word_index: int
+
+
+def _iterate_chunks(fh: BinaryIO, *, chunk_size: int) -> Iterator[Tuple[int, bytes]]:
+    offset = 0
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            return
+        yield offset, chunk
+        offset += len(chunk)
+
+
+def _remove_cr_of_crlf(chunks: Iterator[Tuple[int, bytes]]) -> Iterator[Tuple[int, bytes]]:
+    """_remove_cr_of_crlf works as `.replace(b'\\r\\n', b'\\n')` for chunks. The results are split at removed `\\r`s to keep the offsets in the original output.
+    """
+
+    pending_cr: Optional[int] = None  # the offset of `\r` at the end of the previous chunk
+    for offset, chunk in chunks:
+        if pending_cr is not None:
+            if not chunk.startswith(b'\n'):
+                yield pending_cr, b'\r'
+            pending_cr = None
+        if chunk.endswith(b'\r'):
+            pending_cr = offset + len(chunk) - 1
+            chunk = chunk[:-1]
+        l = 0
+        while True:
+            r = chunk.find(b'\r\n', l)
+            if r == -1:
+                break
+            if l < r:
+                yield offset + l, chunk[l:r]
+            l = r + 1
+        if l < len(chunk):
+            yield offset + l, chunk[l:]
+    if pending_cr is not None:
+        yield pending_cr, b'\r'
+
+
+def _tokenize_chunks(chunks: Iterator[Tuple[int, bytes]]) -> Iterator[_Token]:
+    """_tokenize_chunks splits chunks into words, runs of newlines and runs of other whitespaces. Tokens which straddle chunk boundaries are merged.
+
+    The positions of tokens are counted here, so finding the position of a mismatch needs no other scan.
+    """
+
+    carry: Optional[_Token] = None  # the last token of the previous chunk, which may continue
+    lineno = 0  # the number of newlines before the next token
+    words = 0  # the number of words before the next token
+    for offset, chunk in chunks:
+        for match in _TOKEN_PATTERN.finditer(chunk):
+            start = match.start()
+            typ = _TOKEN_TYPES[match.lastgroup]  # type: ignore
+            word_index = words
+            if carry is not None:
+                gap = 0  # the number of `\r`s skipped by _remove_cr_of_crlf. Tokens in a chunk have no gaps.
+                if start == 0:
+                    gap = offset - (carry.offset + len(carry.value))
+                    if carry.type is typ and (gap == 0 or typ is _TokenType.NEWLINES):
+                        carry = _Token(typ, carry.value + b'\r' * gap + match.group(), carry.offset, carry.lineno, carry.word_index)
+                        continue
+                yield carry
+                if carry.type is _TokenType.NEWLINES:
+                    lineno += carry.value.count(b'\n')
+                elif carry.type is _TokenType.WORD and gap == 0:
+                    word_index -= 1  # a word which ends just at this token has the mismatch at this token
+            if typ is _TokenType.WORD:
+                words += 1
+            carry = _Token(typ, match.group(), offset + start, lineno, word_index)
+    if carry is not None:
+        yield carry
+
+
+def _first_difference(a: memoryview, b: memoryview) -> int:
+    """_first_difference finds the index of the first different byte with binary search. The two must be different in their common length.
+    """
+
+    l = 0
+    r = min(len(a), len(b))
+    while l < r:
+        m = (l + r) // 2
+        if a[:m + 1] == b[:m + 1]:
+            l = m + 1
+        else:
+            r = m
+    return l
+
+
+# The number of pairs of words which streaming comparators compare at once.
+WORD_BATCH_SIZE = 4096
+
+
+class _WordBatch:
+    """_WordBatch buffers pairs of words to compare them with `OutputComparator.find_first_mismatch` at once.
+    """
+    def __init__(self, word_comparator: OutputComparator, *, size: int = WORD_BATCH_SIZE):
+        self.word_comparator = word_comparator
+        self.size = size
+        self.actual: List[bytes] = []
+        self.expected: List[bytes] = []
+        self.tokens: List[_Token] = []
+
+    def add(self, actual: _Token, expected: _Token) -> Optional[_Token]:
+        """
+        :returns: the token of the first mismatch in the actual output if the batch becomes full and has a mismatch
+        """
+
+        self.actual.append(actual.value)
+        self.expected.append(expected.value)
+        self.tokens.append(actual)
+        if len(self.actual) >= self.size:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[_Token]:
+        """
+        :returns: the token of the first mismatch in the batch
+        """
+
+        i = self.word_comparator.find_first_mismatch(self.actual, self.expected)
+        token = None if i is None else self.tokens[i]
+        self.actual.clear()
+        self.expected.clear()
+        self.tokens.clear()
+        return token
+
+
+class _Mismatch(NamedTuple):
+    """_Mismatch is the first mismatch which streaming comparators find.
+    """
+
+    result: ComparisonResult
+    expected_offset: Optional[int]  # the offset to resume the expected output to check `is_whitespace_only`. `None` if the mismatch is of words.
+    is_in_word: bool = False  # True if both outputs are in the same word at the mismatch
+
+
+def _result_at(token: _Token) -> ComparisonResult:
+    return ComparisonResult(matched=False, offset=token.offset, lineno=token.lineno, word_index=token.word_index)
+
+
+def _end_of(token: Optional[_Token], *, words: int) -> ComparisonResult:
+    """_end_of makes the result for the mismatch just after the token.
+
+    :param words: the number of words before the token
+    """
+
+    if token is None:
+        return ComparisonResult(matched=False, offset=0, lineno=0, word_index=0)
+    if token.type == _TokenType.WORD:
+        return ComparisonResult(matched=False, offset=token.offset + len(token.value), lineno=token.lineno, word_index=token.word_index)
+    return ComparisonResult(matched=False, offset=token.offset + len(token.value), lineno=token.lineno + token.value.count(b'\n'), word_index=words)
+
+
+_WHITESPACES = (b' ', b'\t', b'\n', b'\r', b'\x0b', b'\x0c')
+_WORD_OR_NEWLINE_PATTERN = re.compile(rb'[^ \t\n\r\x0b\x0c]+|\n')
+
+# The maximum number of tokens which match_chunks() keeps after the other output ends.
+_MAX_PENDING_WORDS = 1 << 20
+
+
+def _iterate_blocks(chunks: Iterator[Tuple[int, bytes]]) -> Iterator[bytes]:
+    """_iterate_blocks rejoins chunks into blocks which end with whitespaces, so that no words straddle blocks. The last block may end with a word.
+    """
+
+    carry: List[bytes] = []
+    for _, chunk in chunks:
+        i = max(chunk.rfind(whitespace) for whitespace in _WHITESPACES)
+        if i == -1:
+            carry.append(chunk)
+            continue
+        carry.append(chunk[:i + 1])
+        yield b''.join(carry)
+        carry = [chunk[i + 1:]]
+    if any(carry):
+        yield b''.join(carry)
+
+
+# 0 for whitespaces of bytes.split() and 1 for the other bytes
+_WORD_BYTE_TABLE = bytes(0 if bytes([c]).isspace() else 1 for c in range(256))
+
+
+class _LineAndWordCounter:
+    """_LineAndWordCounter counts newlines and words in the fed bytes, to find the position of a mismatch without reading the output again.
+    """
+    def __init__(self) -> None:
+        self.lines = 0
+        self.words = 0  # including the word which may continue
+        self.last = b' '  # the last byte fed
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        self.lines += data.count(b'\n')
+        self.words += data.translate(_WORD_BYTE_TABLE).count(b'\0\1')  # the beginnings of words after whitespaces
+        if self.last.isspace() and not data[:1].isspace():
+            self.words += 1
+        self.last = data[-1:]
+
+    def get_position(self) -> Tuple[int, int]:
+        """
+        :returns: `lineno` and `word_index` of `ComparisonResult` for the next byte. A word which continues at the next byte is not counted.
+        """
+
+        return self.lines, self.words - (0 if self.last.isspace() else 1)
+
+
+class StreamingOutputComparator(abc.ABC):
+    """StreamingOutputComparator compares two outputs chunk by chunk with bounded memory, and stops at the first mismatch.
+    """
+    @abc.abstractmethod
+    def _find_mismatch(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> Optional[_Mismatch]:
+        """_find_mismatch stops at the first mismatch. Its position is counted while comparing, without reading the outputs again.
+        """
+        raise NotImplementedError
+
+    def compare_chunks(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> ComparisonResult:
+        """
+        :param actual: pairs of offsets in the original output and chunks
+        """
+
+        mismatch = self._find_mismatch(actual, expected)
+        if mismatch is None:
+            return ComparisonResult(matched=True)
+        return mismatch.result
+
+    def match_chunks(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> bool:
+        """match_chunks is a fast check which works on blocks of words instead of tokens with offsets. This may return False for matched outputs when it cannot decide it quickly.
+
+        :returns: True if the two are surely matched
+        """
+
+        return False
+
+    def compare_files(self, actual: BinaryIO, expected: BinaryIO, *, chunk_size: int = CHUNK_SIZE, whitespace_comparator: Optional['StreamingSplitComparator'] = None) -> ComparisonResult:
+        """compare_files runs `match_chunks` first if the files are seekable, and runs `compare_chunks` only to find the mismatch.
+
+        :param whitespace_comparator: the comparator to check `ComparisonResult.is_whitespace_only`. Only the rests of the files after the mismatch are read for it, because the files are matched until the mismatch.
+        """
+
+        if not actual.seekable() or not expected.seekable():
+            return self.compare_chunks(_iterate_chunks(actual, chunk_size=chunk_size), _iterate_chunks(expected, chunk_size=chunk_size))
+        start_a = actual.tell()
+        start_b = expected.tell()
+        if self.match_chunks(_iterate_chunks(actual, chunk_size=chunk_size), _iterate_chunks(expected, chunk_size=chunk_size)):
+            return ComparisonResult(matched=True)
+        actual.seek(start_a)
+        expected.seek(start_b)
+        mismatch = self._find_mismatch(_iterate_chunks(actual, chunk_size=chunk_size), _iterate_chunks(expected, chunk_size=chunk_size))
+        if mismatch is None:
+            return ComparisonResult(matched=True)
+        result = mismatch.result
+        if whitespace_comparator is not None and mismatch.expected_offset is not None:
+            assert result.offset is not None
+            actual.seek(start_a + result.offset)
+            expected.seek(start_b + mismatch.expected_offset)
+            head = [(0, b'_')] if mismatch.is_in_word else []  # represents the same head of the word at the mismatch
+            rest_a = itertools.chain(head, _iterate_chunks(actual, chunk_size=chunk_size))
+            rest_b = itertools.chain(head, _iterate_chunks(expected, chunk_size=chunk_size))
+            result = result._replace(is_whitespace_only=whitespace_comparator.match_chunks(rest_a, rest_b))
+        return result
+
+
+class StreamingExactComparator(StreamingOutputComparator):
+    def _find_mismatch(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> Optional[_Mismatch]:
+        counter = _LineAndWordCounter()
+        is_in_word = False  # whether the last compared byte is in a word
+        offset_a, buf_a = 0, memoryview(b'')
+        offset_b, buf_b = 0, memoryview(b'')
+        while True:
+            if not buf_a:
+                next_offset_a, chunk = next(actual, (offset_a, b''))
+                if next_offset_a > offset_a:
+                    counter.feed(b'\r')  # `\r` is skipped by _remove_cr_of_crlf
+                offset_a, buf_a = next_offset_a, memoryview(chunk)
+            if not buf_b:
+                offset_b, chunk = next(expected, (offset_b, b''))
+                buf_b = memoryview(chunk)
+            if not buf_a and not buf_b:
+                return None
+            if not buf_a or not buf_b:
+                break  # one is a prefix of the other
+            n = min(len(buf_a), len(buf_b))
+            head_a = bytes(buf_a[:n])  # comparing bytes is much faster than comparing memoryviews
+            is_mismatched = head_a != bytes(buf_b[:n])
+            if is_mismatched:
+                n = _first_difference(buf_a[:n], buf_b[:n])
+                head_a = head_a[:n]
+            counter.feed(head_a)
+            if head_a:
+                is_in_word = not head_a[-1:].isspace()
+            offset_a += n
+            buf_a = buf_a[n:]
+            offset_b += n
+            buf_b = buf_b[n:]
+            if is_mismatched:
+                break
+        lineno, word_index = counter.get_position()
+        return _Mismatch(ComparisonResult(matched=False, offset=offset_a, lineno=lineno, word_index=word_index), offset_b, is_in_word)
+
+
+class StreamingSplitComparator(StreamingOutputComparator):
+    """StreamingSplitComparator works as `SplitComparator`.
+    """
+    def __init__(self, word_comparator: OutputComparator):
+        self.word_comparator = word_comparator
+
+    def _find_mismatch(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> Optional[_Mismatch]:
+        words_a = (token for token in _tokenize_chunks(actual) if token.type == _TokenType.WORD)
+        words_b = (token for token in _tokenize_chunks(expected) if token.type == _TokenType.WORD)
+        batch = _WordBatch(self.word_comparator)
+        last_a: Optional[_Token] = None
+        while True:
+            x = next(words_a, None)
+            y = next(words_b, None)
+            if x is None or y is None:
+                mismatch = batch.flush()
+                if mismatch is not None:
+                    return _Mismatch(_result_at(mismatch), None)
+            if x is None and y is None:
+                return None
+            if x is None or y is None:
+                # The numbers of words are different, so it is not whitespace-only.
+                return _Mismatch(_end_of(last_a, words=0) if x is None else _result_at(x), None)
+            mismatch = batch.add(x, y)
+            if mismatch is not None:
+                return _Mismatch(_result_at(mismatch), None)
+            last_a = x
+
+    def match_chunks(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> bool:
+        """match_chunks of this class never returns False for matched outputs.
+        """
+
+        blocks_a = _iterate_blocks(actual)
+        blocks_b = _iterate_blocks(expected)
+        words_a: List[bytes] = []
+        words_b: List[bytes] = []
+        while True:
+            # read the side which is behind
+            blocks, words = (blocks_a, words_a) if len(words_a) <= len(words_b) else (blocks_b, words_b)
+            block = next(blocks, None)
+            if block is None:
+                break
+            words.extend(block.split())
+            n = min(len(words_a), len(words_b))
+            if self.word_comparator.find_first_mismatch(words_a[:n], words_b[:n]) is not None:
+                return False
+            del words_a[:n]
+            del words_b[:n]
+        # the rest of the other side must have no words
+        return not words_a and not words_b and not any(block.strip() for block in blocks_a) and not any(block.strip() for block in blocks_b)
+
+
+def _lines_of_tokens(tokens: Iterator[_Token]) -> Iterator[_Token]:
+    """_lines_of_tokens yields words and single newlines, as `.rstrip(b'\\n').split(b'\\n')` and `.split()` for each line.
+    """
+
+    pending: Optional[_Token] = None  # newlines which may be at the end
+    words = 0  # the number of words before `pending`
+    for token in tokens:
+        if pending is not None and pending.value == b'\n':
+            yield pending
+            pending = None
+        elif pending is not None:
+            i = pending.value.find(b'\n')
+            for k in range(pending.value.count(b'\n')):
+                yield _Token(_TokenType.NEWLINES, b'\n', pending.offset + i, pending.lineno + k, pending.word_index if k == 0 else words)
+                i = pending.value.find(b'\n', i + 1)
+            pending = None
+        if token.type == _TokenType.NEWLINES:
+            pending = token
+        elif token.type == _TokenType.WORD:
+            words = token.word_index + 1
+            yield token
+
+
+class StreamingSplitLinesComparator(StreamingOutputComparator):
+    """StreamingSplitLinesComparator works as `SplitLinesComparator(SplitComparator(word_comparator))`.
+    """
+    def __init__(self, word_comparator: OutputComparator):
+        self.word_comparator = word_comparator
+
+    def _find_mismatch(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> Optional[_Mismatch]:
+        tokens_a = _lines_of_tokens(_tokenize_chunks(actual))
+        tokens_b = _lines_of_tokens(_tokenize_chunks(expected))
+        batch = _WordBatch(self.word_comparator)
+        last_a: Optional[_Token] = None
+        last_b: Optional[_Token] = None
+        words = 0  # the number of words before the current token
+        while True:
+            x = next(tokens_a, None)
+            y = next(tokens_b, None)
+            if x is None or y is None or x.type != y.type:
+                # words before this position may have a mismatch. A mismatch of words is not whitespace-only.
+                mismatch = batch.flush()
+                if mismatch is not None:
+                    return _Mismatch(_result_at(mismatch), None)
+            if x is None and y is None:
+                return None
+            if x is None or y is None or x.type != y.type:
+                # The words until here are matched, and the rests are checked from the beginnings of the tokens.
+                result = _end_of(last_a, words=words) if x is None else _result_at(x)
+                expected_offset = _end_of(last_b, words=words).offset if y is None else y.offset
+                return _Mismatch(result, expected_offset)
+            if x.type == _TokenType.WORD:
+                mismatch = batch.add(x, y)
+                if mismatch is not None:
+                    return _Mismatch(_result_at(mismatch), None)
+                words += 1
+            last_a = x
+            last_b = y
+
+    def _match_tokens(self, tokens_a: List[bytes], tokens_b: List[bytes]) -> bool:
+        if list(map(b'\n'.__eq__, tokens_a)) != list(map(b'\n'.__eq__, tokens_b)):
+            return False
+        words_a = list(filter(b'\n'.__ne__, tokens_a))
+        words_b = list(filter(b'\n'.__ne__, tokens_b))
+        return self.word_comparator.find_first_mismatch(words_a, words_b) is None
+
+    def match_chunks(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> bool:
+        blocks_a = _iterate_blocks(actual)
+        blocks_b = _iterate_blocks(expected)
+        tokens_a: List[bytes] = []  # words and newlines
+        tokens_b: List[bytes] = []
+        last_block_a: Optional[bytes] = None
+        last_block_b: Optional[bytes] = None
+        eof_a = False
+        eof_b = False
+        while not eof_a or not eof_b:
+            # read the side which is behind
+            if not eof_a and (eof_b or len(tokens_a) <= len(tokens_b)):
+                block = next(blocks_a, None)
+                if block is None:
+                    eof_a = True
+                    continue
+                tokens_a.extend(_WORD_OR_NEWLINE_PATTERN.findall(block))
+                last_block_a = block
+            else:
+                block = next(blocks_b, None)
+                if block is None:
+                    eof_b = True
+                    continue
+                tokens_b.extend(_WORD_OR_NEWLINE_PATTERN.findall(block))
+                last_block_b = block
+            n = min(len(tokens_a), len(tokens_b))
+            if not self._match_tokens(tokens_a[:n], tokens_b[:n]):
+                return False
+            del tokens_a[:n]
+            del tokens_b[:n]
+            if (eof_a or eof_b) and max(len(tokens_a), len(tokens_b)) >= _MAX_PENDING_WORDS:
+                return False
+
+        # Trailing newlines are ignored as `.rstrip(b'\n')`, but a line of spaces after them is not ignored.
+        for last_block in (last_block_a, last_block_b):
+            if last_block is not None:
+                trailing = last_block[len(last_block.rstrip()):]
+                if trailing == last_block or trailing.lstrip(b' \t\r\x0b\x0c').strip(b'\n'):
+                    return False
+        while tokens_a and tokens_a[-1] == b'\n':
+            tokens_a.pop()
+        while tokens_b and tokens_b[-1] == b'\n':
+            tokens_b.pop()
+        return len(tokens_a) == len(tokens_b) and self._match_tokens(tokens_a, tokens_b)
+
+
+class StreamingCRLFInsensitiveComparator(StreamingOutputComparator):
+    def __init__(self, file_comparator: StreamingOutputComparator):
+        self.file_comparator = file_comparator
+
+    def _find_mismatch(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> Optional[_Mismatch]:
+        return self.file_comparator._find_mismatch(_remove_cr_of_crlf(actual), _remove_cr_of_crlf(expected))  # pylint: disable=protected-access
+
+    def match_chunks(self, actual: Iterator[Tuple[int, bytes]], expected: Iterator[Tuple[int, bytes]]) -> bool:
+        return self.file_comparator.match_chunks(_remove_cr_of_crlf(actual), _remove_cr_of_crlf(expected))
+
+
+def _build_word_comparator(*, error: Optional[float]) -> OutputComparator:
+    if error is not None:
+        return FloatingPointNumberComparator(rel_tol=error, abs_tol=error)
+    return ExactComparator()
+
+
+def build_streaming_comparator(compare_mode: CompareMode, *, error: Optional[float]) -> StreamingOutputComparator:
+    """build_streaming_comparator builds the comparator for the given `--compare-mode` and `--error`.
+    """
+
+    if compare_mode == CompareMode.EXACT_MATCH and error is None:
+        return StreamingExactComparator()
+    if compare_mode == CompareMode.CRLF_INSENSITIVE_EXACT_MATCH and error is None:
+        return StreamingCRLFInsensitiveComparator(StreamingExactComparator())
+
+    word_comparator = _build_word_comparator(error=error)
+    if compare_mode in (CompareMode.EXACT_MATCH, CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, CompareMode.IGNORE_SPACES):
+        file_comparator: StreamingOutputComparator = StreamingSplitLinesComparator(word_comparator)
+    elif compare_mode == CompareMode.IGNORE_SPACES_AND_NEWLINES:
+        file_comparator = StreamingSplitComparator(word_comparator)
+    else:
+        assert False
+    return StreamingCRLFInsensitiveComparator(file_comparator)
+
+
+def compare_outputs(actual: BinaryIO, expected: BinaryIO, *, compare_mode: CompareMode, error: Optional[float], chunk_size: int = CHUNK_SIZE) -> ComparisonResult:
+    """compare_outputs compares two seekable files from their current positions, and collects information about the first mismatch for hints and diffs.
+
+    The information is collected while finding the mismatch, and the rests of the files after the mismatch are read only to check `is_whitespace_only`.
+    """
+
+    whitespace_comparator: Optional[StreamingSplitComparator] = None
+    if compare_mode in (CompareMode.EXACT_MATCH, CompareMode.CRLF_INSENSITIVE_EXACT_MATCH) and error is None:
+        whitespace_comparator = StreamingSplitComparator(_build_word_comparator(error=None))
+    return build_streaming_comparator(compare_mode, error=error).compare_files(actual, expected, chunk_size=chunk_size, whitespace_comparator=whitespace_comparator)
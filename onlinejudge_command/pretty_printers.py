@@ -1,5 +1,10 @@
+import codecs
 import difflib
 import enum
+import itertools
+import mmap
+import os
+import pathlib
 import shutil
 from logging import getLogger
 from typing import *
@@ -10,6 +15,13 @@ from onlinejudge_command.output_comparators import CompareMode, check_lines_matc
 
 logger = getLogger(__name__)
 
+MAX_DIFF_LINES = 500  # the number of deleted and added lines to give up making line diffs, because it takes O((N + M) D) time
+
+LARGE_FILE_CONTENT_SIZE = 1024 * 1024  # bytes. Larger contents are previewed from their heads and tails without decoding the whole.
+_SCANNING_CHUNK_SIZE = 16 * 1024 * 1024  # bytes
+
+BytesLike = Union[bytes, bytearray, memoryview, mmap.mmap]
+
 
 class _PrettyTokenType(enum.Enum):
     BODY = 'BODY'
@@ -78,13 +90,13 @@ def _tokenize_line(line: str) -> List[_PrettyToken]:
     return tokens
 
 
-def _decode_with_recovery(content: bytes) -> Tuple[List[_PrettyToken], str]:
+def _decode_with_recovery(content: BytesLike) -> Tuple[List[_PrettyToken], str]:
     tokens = []
     try:
-        text = content.decode()
+        text = str(content, 'utf-8')
     except UnicodeDecodeError as e:
         tokens.append(_PrettyToken(_PrettyTokenType.HINT, str(e)))
-        text = content.decode(errors='replace')
+        text = str(content, 'utf-8', 'replace')
     return tokens, text
 
 
@@ -98,7 +110,128 @@ def _warn_if_empty(tokens: List[_PrettyToken]) -> List[_PrettyToken]:
     return tokens
 
 
-def _tokenize_large_file_content(*, content: bytes, limit: int, head: int, tail: int, char_in_line: int) -> List[_PrettyToken]:
+def _count_size(tokens: Iterable[_PrettyToken]) -> int:
+    size = 0
+    for _, s in tokens:
+        size += len(s)
+    return size
+
+
+def _scan_large_file_content(content: Union[bytes, mmap.mmap], *, chunk_size: int = _SCANNING_CHUNK_SIZE) -> Optional[Tuple[int, int]]:
+    """_scan_large_file_content counts characters and newlines chunk by chunk, without decoding ASCII chunks.
+
+    :returns: the numbers of characters and `\\n`. `None` if the content is not valid UTF-8 or has line boundaries other than `\\n` and `\\r\\n`, e.g. `\\r` and `\\u2028`.
+    """
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chars = 0
+    newlines = 0
+    carriage_returns = 0
+    crlfs = 0
+    previous_chunk = b''
+    for i in range(0, len(content), chunk_size):
+        chunk = content[i:i + chunk_size]
+        assert isinstance(chunk, bytes)
+        if chunk.isascii() and not decoder.getstate()[0]:
+            if any(boundary in chunk for boundary in (b'\v', b'\f', b'\x1c', b'\x1d', b'\x1e')):
+                return None
+            chars += len(chunk)
+        else:
+            try:
+                text = decoder.decode(chunk)
+            except UnicodeDecodeError:
+                return None
+            if any(boundary in text for boundary in '\v\f\x1c\x1d\x1e\x85\u2028\u2029'):
+                return None
+            chars += len(text)
+        newlines += chunk.count(b'\n')
+        carriage_returns += chunk.count(b'\r')
+        crlfs += chunk.count(b'\r\n') + int(previous_chunk.endswith(b'\r') and chunk.startswith(b'\n'))
+        previous_chunk = chunk
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return None
+    if carriage_returns != crlfs:
+        return None
+    return chars, newlines
+
+
+def _decode_head(content: Union[bytes, mmap.mmap], *, chars: int) -> str:
+    """_decode_head decodes the first `chars` characters of valid UTF-8.
+    """
+
+    data = content[:4 * chars]
+    return codecs.getincrementaldecoder('utf-8')().decode(data)[:chars]
+
+
+def _decode_tail(content: Union[bytes, mmap.mmap], *, chars: int) -> str:
+    """_decode_tail decodes the last `chars` characters of valid UTF-8.
+    """
+
+    data = content[max(0, len(content) - 4 * chars):]
+    begin = 0
+    while begin < len(data) and 0x80 <= data[begin] < 0xc0:  # skip the rest of a character
+        begin += 1
+    text = data[begin:].decode()
+    return text[len(text) - chars:]
+
+
+def _tokenize_large_file_content_with_windows(*, content: Union[bytes, mmap.mmap], limit: int, head: int, tail: int, char_in_line: int) -> Optional[List[_PrettyToken]]:
+    """_tokenize_large_file_content_with_windows works as `_tokenize_large_file_content` for large contents, but decodes and tokenizes only the head and the tail.
+
+    :returns: `None` if the same result cannot be decided only from the head and the tail.
+    """
+
+    scanned = _scan_large_file_content(content)
+    if scanned is None:
+        return None
+    chars, newlines = scanned
+    if chars < char_in_line * limit:
+        return None
+
+    # the char-based candidate
+    head_text = _decode_head(content, chars=char_in_line * head)
+    l = len(head_text.rstrip())
+    r = chars - char_in_line * tail
+    char_based: List[_PrettyToken] = []
+    for line in head_text[:l].splitlines(keepends=True):
+        char_based += _tokenize_line(line)
+    char_based.append(_PrettyToken(_PrettyTokenType.HINT, '... ({} chars) ...'.format(r - l)))
+    for line in _decode_tail(content, chars=char_in_line * tail).splitlines(keepends=True):
+        char_based += _tokenize_line(line)
+
+    # the line-based candidate. This is skipped if its lines are obviously longer than the char-based candidate, because a character has at most 4 bytes.
+    # When `tail` is 0, the candidate has all lines because `lines[-0:]` is `lines`, so it is never chosen.
+    line_based: Optional[List[_PrettyToken]] = None
+    ends_with_newline = content[-1:] == b'\n'
+    lines = newlines + int(not ends_with_newline)
+    if lines >= limit and tail:
+        head_end = 0
+        for _ in range(head):
+            head_end = content.find(b'\n', head_end) + 1
+        tail_begin = len(content) - int(ends_with_newline)
+        for _ in range(tail):
+            tail_begin = content.rfind(b'\n', 0, tail_begin)
+        tail_begin += 1
+        if head_end + (len(content) - tail_begin) <= 4 * _count_size(char_based):
+            line_based = []
+            for line in content[:head_end].decode().splitlines(keepends=True):
+                line_based += _tokenize_line(line)
+            line_based.append(_PrettyToken(_PrettyTokenType.HINT, '... ({} lines) ...\n'.format(lines - head - tail)))
+            for line in content[tail_begin:].decode().splitlines(keepends=True):
+                line_based += _tokenize_line(line)
+
+    # Choose the shortest one as `_tokenize_large_file_content`. The candidate to do nothing is at least as long as the number of characters.
+    tokens = char_based
+    if line_based is not None and _count_size(line_based) <= _count_size(char_based):
+        tokens = line_based
+    if chars <= _count_size(tokens):
+        return None
+    return tokens
+
+
+def _tokenize_large_file_content(*, content: BytesLike, limit: int, head: int, tail: int, char_in_line: int) -> List[_PrettyToken]:
     """`_tokenize_large_file_content` constructs the intermediate representations. They have no color infomation.
     """
 
@@ -137,11 +270,11 @@ def _tokenize_large_file_content(*, content: bytes, limit: int, head: int, tail:
             tokens += _tokenize_line(line)
         return tokens
 
-    def count_size(tokens: Iterable[_PrettyToken]) -> int:
-        size = 0
-        for _, s in tokens:
-            size += len(s)
-        return size
+    # Use only the head and the tail of large contents if possible.
+    if len(content) >= LARGE_FILE_CONTENT_SIZE and isinstance(content, (bytes, mmap.mmap)):
+        windowed_tokens = _tokenize_large_file_content_with_windows(content=content, limit=limit, head=head, tail=tail, char_in_line=char_in_line)
+        if windowed_tokens is not None:
+            return _warn_if_empty(windowed_tokens)
 
     # Choose the shortest one from the three candidates.
     tokens, text = _decode_with_recovery(content)
@@ -151,7 +284,7 @@ def _tokenize_large_file_content(*, content: bytes, limit: int, head: int, tail:
             candidate_line_based(text),
             candidate_char_based(text),
         ]
-        tokens.extend(min(candidates, key=count_size))
+        tokens.extend(min(candidates, key=_count_size))
     tokens = _warn_if_empty(tokens)
     return tokens
 
@@ -212,12 +345,23 @@ def _get_terminal_size() -> int:
     return max(char_in_line, 40)  # shutil.get_terminal_size() may return too small values (e.g. (0, 0) on Circle CI) successfully (i.e. fallback is not used). see https://github.com/kmyk/online-judge-tools/pull/611
 
 
-def make_pretty_large_file_content(content: bytes, limit: int, head: int, tail: int) -> str:
+def make_pretty_large_file_content(content: BytesLike, limit: int, head: int, tail: int) -> str:
     char_in_line = _get_terminal_size()
     tokens = _tokenize_large_file_content(content=content, limit=limit, head=head, tail=tail, char_in_line=char_in_line)
     return _render_tokens(tokens=tokens)
 
 
+def make_pretty_large_file_content_of_file(path: pathlib.Path, limit: int, head: int, tail: int) -> str:
+    """make_pretty_large_file_content_of_file works as `make_pretty_large_file_content`, but maps the file with `mmap` instead of reading it into memory.
+    """
+
+    with path.open('rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return make_pretty_large_file_content(b'', limit=limit, head=head, tail=tail)  # mmap cannot map empty files
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            return make_pretty_large_file_content(content, limit=limit, head=head, tail=tail)
+
+
 def _tokenize_file_content_without_snipping(content: bytes) -> List[_PrettyToken]:
     tokens, text = _decode_with_recovery(content)
     for line in text.splitlines(keepends=True):
@@ -347,35 +491,56 @@ class _LineDiffOp(NamedTuple):
     right: Optional[List[_PrettyToken]]
 
 
+class _LineDiffPosition(NamedTuple):
+    """_LineDiffPosition is a _LineDiffOp without tokens. Tokens are made later only for lines to be printed.
+    """
+
+    lineno: int  # 0-based, the same to _LineDiffOp
+    left: bool
+    right: bool
+
+
+_LineDiffTokenizer = Callable[[_LineDiffPosition], _LineDiffOp]
+
+
 # This function assumes that the two strings have the same number of lines.
-def _make_diff_between_file_and_file_by_comparing_line_by_line(a: str, b: str, *, compare_mode: CompareMode) -> List[_LineDiffOp]:
+def _find_diff_lines_by_comparing_line_by_line(a: str, b: str, *, compare_mode: CompareMode, matched_lines: int = 0) -> Tuple[List[_LineDiffPosition], _LineDiffTokenizer]:
+    """_find_diff_lines_by_comparing_line_by_line compares lines at the same line numbers. This is used also as the fallback when the numbers of lines differ too much to find the shortest diff.
+    """
+
     assert compare_mode != CompareMode.IGNORE_SPACES_AND_NEWLINES
-    assert len(a.rstrip().splitlines()) == len(b.rstrip().splitlines())
 
-    ops = []
+    positions = []
     lines_a = a.splitlines(keepends=True)
     lines_b = b.splitlines(keepends=True)
-    i = 0
+    i = matched_lines
 
     # compare line by line
     while i < min(len(lines_a), len(lines_b)):
         if not check_lines_match(lines_a[i], lines_b[i], compare_mode=compare_mode):
-            tokens_a, tokens_b = _make_diff_between_line_and_line(lines_a[i], lines_b[i])
-            ops.append(_LineDiffOp(i, tokens_a, tokens_b))
+            positions.append(_LineDiffPosition(i, True, True))
         i += 1
 
     # put diff of trailing newlines
     if compare_mode in (CompareMode.EXACT_MATCH, CompareMode.CRLF_INSENSITIVE_EXACT_MATCH):
         while i < len(lines_a):
-            tokens_a = _tokenize_line(lines_a[i])
-            ops.append(_LineDiffOp(i, tokens_a, None))
+            positions.append(_LineDiffPosition(i, True, False))
             i += 1
         while i < len(lines_b):
-            tokens_b = _tokenize_line(lines_b[i])
-            ops.append(_LineDiffOp(i, None, tokens_b))
+            positions.append(_LineDiffPosition(i, False, True))
             i += 1
 
-    return ops
+    def tokenize(position: _LineDiffPosition) -> _LineDiffOp:
+        i = position.lineno
+        if position.left and position.right:
+            tokens_a, tokens_b = _make_diff_between_line_and_line(lines_a[i], lines_b[i])
+            return _LineDiffOp(i, tokens_a, tokens_b)
+        elif position.left:
+            return _LineDiffOp(i, _tokenize_line(lines_a[i]), None)
+        else:
+            return _LineDiffOp(i, None, _tokenize_line(lines_b[i]))
+
+    return positions, tokenize
 
 
 def _tokenize_line_with_highlight(line: str, *, is_right: bool) -> List[_PrettyToken]:
@@ -389,52 +554,166 @@ def _tokenize_line_with_highlight(line: str, *, is_right: bool) -> List[_PrettyT
     return tokens
 
 
+class _TooManyDiffLinesError(Exception):
+    pass
+
+
+def _count_runs(ids: List[int]) -> List[int]:
+    """_count_runs returns the numbers of the same consecutive values which start at each position.
+    """
+
+    runs = [1] * len(ids)
+    for i in reversed(range(len(ids) - 1)):
+        if ids[i] == ids[i + 1]:
+            runs[i] = runs[i + 1] + 1
+    return runs
+
+
+def _find_shortest_edit_script(a: List[int], b: List[int], *, max_diff_lines: int) -> List[Tuple[str, int]]:
+    """_find_shortest_edit_script finds the shortest edit script with Myers' O((N + M) D) algorithm.
+
+    :returns: the moves from the beginnings. Each move is `('equal', length)`, `('delete', 1)` or `('insert', 1)`.
+    :raises _TooManyDiffLinesError: if more than `max_diff_lines` lines are deleted or inserted
+    """
+
+    n = len(a)
+    m = len(b)
+    runs_a = _count_runs(a)
+    runs_b = _count_runs(b)
+
+    def follow_snake(x: int, y: int) -> int:
+        while x < n and y < m and a[x] == b[y]:
+            step = min(runs_a[x], runs_b[y])  # consecutive same lines, which are typical in outputs, are matched at once
+            x += step
+            y += step
+        return x
+
+    # v[offset + k] is the furthest x on the diagonal k = x - y, or -1 if unreachable
+    offset = max_diff_lines + 1
+    v = [-1] * (2 * offset + 1)
+    trace: List[List[int]] = []  # the snapshots of v[offset - d : offset + d + 1]
+    choices: List[List[bool]] = []  # whether the last edit is an insertion, for each k = -d, -d + 2, ..., d
+    for d in range(max_diff_lines + 1):
+        choice = []
+        is_found = False
+        for k in range(-d, d + 1, 2):
+            if d == 0:
+                x, is_insertion = 0, False
+            else:
+                x_by_insertion = v[offset + k + 1]
+                x_by_deletion = v[offset + k - 1] + 1 if v[offset + k - 1] != -1 else -1
+                if x_by_insertion == -1 or x_by_insertion - k > m:
+                    x_by_insertion = -1
+                if x_by_deletion > n:
+                    x_by_deletion = -1
+                is_insertion = x_by_insertion >= x_by_deletion
+                x = x_by_insertion if is_insertion else x_by_deletion
+            choice.append(is_insertion)
+            if x != -1:
+                x = follow_snake(x, x - k)
+            v[offset + k] = x
+            if x == n and x - k == m:
+                is_found = True
+        trace.append(v[offset - d:offset + d + 1])
+        choices.append(choice)
+        if is_found:
+            break
+    else:
+        raise _TooManyDiffLinesError('(too many differences: more than {} lines are deleted or added)'.format(max_diff_lines))
+
+    # backtrack the path
+    moves: List[Tuple[str, int]] = []
+    x = n
+    y = m
+    for d in reversed(range(1, len(trace))):
+        k = x - y
+        is_insertion = choices[d][(k + d) // 2]
+        prev_k = k + 1 if is_insertion else k - 1
+        prev_x = trace[d - 1][prev_k + d - 1]
+        start_x = prev_x if is_insertion else prev_x + 1
+        if x != start_x:
+            moves.append(('equal', x - start_x))
+        moves.append(('insert' if is_insertion else 'delete', 1))
+        x = prev_x
+        y = prev_x - prev_k
+    if x:
+        moves.append(('equal', x))
+    moves.reverse()
+    return moves
+
+
+def _get_line_opcodes(lines_a: List[str], lines_b: List[str], *, max_diff_lines: int = MAX_DIFF_LINES) -> List[Tuple[str, int, int, int, int]]:
+    """_get_line_opcodes works as `difflib.SequenceMatcher.get_opcodes()`, but finds the shortest diff in linear time for small numbers of differences.
+
+    Unlike SequenceMatcher, this function doesn't take quadratic time for repetitive lines.
+
+    :raises _TooManyDiffLinesError: if more than `max_diff_lines` lines are deleted or inserted
+    """
+
+    # compare integers instead of strings
+    ids: Dict[str, int] = {}
+    a = [ids.setdefault(line, len(ids)) for line in lines_a]
+    b = [ids.setdefault(line, len(ids)) for line in lines_b]
+    moves = _find_shortest_edit_script(a, b, max_diff_lines=max_diff_lines)
+
+    # make opcodes
+    opcodes: List[Tuple[str, int, int, int, int]] = []
+    i_a = 0
+    i_b = 0
+    for tag, length in moves:
+        if tag == 'equal':
+            opcodes.append(('equal', i_a, i_a + length, i_b, i_b + length))
+            i_a += length
+            i_b += length
+        else:
+            if not opcodes or opcodes[-1][0] == 'equal':
+                opcodes.append((tag, i_a, i_a, i_b, i_b))
+            _, l_a, _, l_b, _ = opcodes[-1]
+            if tag == 'delete':
+                i_a += 1
+            else:
+                i_b += 1
+            replaced = l_a < i_a and l_b < i_b
+            opcodes[-1] = ('replace' if replaced else tag, l_a, i_a, l_b, i_b)
+    return opcodes
+
+
 # This function works as --compare-mode=exact-match.
-def _make_diff_between_file_and_file_by_difflib(a: str, b: str) -> List[_LineDiffOp]:
+def _find_diff_lines_by_myers(a: str, b: str, *, matched_lines: int = 0) -> Tuple[List[_LineDiffPosition], _LineDiffTokenizer]:
     lines_a = a.splitlines(keepends=True)
     lines_b = b.splitlines(keepends=True)
-    ops = []
+    positions = []
 
-    # https://docs.python.org/ja/3/library/difflib.html#difflib.SequenceMatcher.get_opcodes
-    matcher: difflib.SequenceMatcher = difflib.SequenceMatcher()
-    matcher.set_seqs(lines_a, lines_b)
-    for (tag, l_a, r_a, l_b, r_b) in matcher.get_opcodes():
+    for (tag, l_a, r_a, l_b, r_b) in _get_line_opcodes(lines_a[matched_lines:], lines_b[matched_lines:]):
+        l_a, r_a, l_b, r_b = l_a + matched_lines, r_a + matched_lines, l_b + matched_lines, r_b + matched_lines
         if tag == 'replace':
             while l_a < r_a and l_a < l_b:
-                tokens = _tokenize_line_with_highlight(lines_a[l_a], is_right=False)
-                ops.append(_LineDiffOp(l_a, tokens, None))
+                positions.append(_LineDiffPosition(l_a, True, False))
                 l_a += 1
             while l_b < r_b and l_b < l_a:
-                tokens = _tokenize_line_with_highlight(lines_b[l_b], is_right=True)
-                ops.append(_LineDiffOp(l_b, None, tokens))
+                positions.append(_LineDiffPosition(l_b, False, True))
                 l_b += 1
             while l_a < r_a and l_b < r_b:
                 assert l_a == l_b
-                tokens_a = _tokenize_line_with_highlight(lines_a[l_a], is_right=False)
-                tokens_b = _tokenize_line_with_highlight(lines_b[l_b], is_right=True)
-                ops.append(_LineDiffOp(l_a, tokens_a, tokens_b))
+                positions.append(_LineDiffPosition(l_a, True, True))
                 l_a += 1
                 l_b += 1
             while l_a < r_a:
-                tokens = _tokenize_line_with_highlight(lines_a[l_a], is_right=False)
-                ops.append(_LineDiffOp(l_a, tokens, None))
+                positions.append(_LineDiffPosition(l_a, True, False))
                 l_a += 1
             while l_b < r_b:
-                tokens = _tokenize_line_with_highlight(lines_b[l_b], is_right=True)
-                ops.append(_LineDiffOp(l_b, None, tokens))
+                positions.append(_LineDiffPosition(l_b, False, True))
                 l_b += 1
 
         elif tag == 'delete':
             assert l_b == r_b
             for i in range(l_a, r_a):
-                tokens = _tokenize_line_with_highlight(lines_a[i], is_right=False)
-                ops.append(_LineDiffOp(i, tokens, None))
+                positions.append(_LineDiffPosition(i, True, False))
 
         elif tag == 'insert':
             assert l_a == r_a
             for i in range(l_b, r_b):
-                tokens = _tokenize_line_with_highlight(lines_b[i], is_right=True)
-                ops.append(_LineDiffOp(i, None, tokens))
+                positions.append(_LineDiffPosition(i, False, True))
 
         elif tag == 'equal':
             pass
@@ -442,13 +721,24 @@ def _make_diff_between_file_and_file_by_difflib(a: str, b: str) -> List[_LineDif
         else:
             assert False
 
-    return ops
+    def tokenize(position: _LineDiffPosition) -> _LineDiffOp:
+        i = position.lineno
+        tokens_a = _tokenize_line_with_highlight(lines_a[i], is_right=False) if position.left else None
+        tokens_b = _tokenize_line_with_highlight(lines_b[i], is_right=True) if position.right else None
+        return _LineDiffOp(i, tokens_a, tokens_b)
+
+    return positions, tokenize
 
 
-def _make_diff_between_file_and_file(a: str, b: str, *, compare_mode: CompareMode) -> List[_LineDiffOp]:
+def _find_diff_lines(a: str, b: str, *, compare_mode: CompareMode, matched_lines: int = 0) -> Tuple[List[_LineDiffPosition], _LineDiffTokenizer]:
+    """_find_diff_lines finds the lines which differ. They are tokenized later with the returned function.
+
+    :param matched_lines: the number of leading lines which are already known to be matched, e.g. `ComparisonResult.lineno`
+    """
+
     assert compare_mode != CompareMode.IGNORE_SPACES_AND_NEWLINES
     if len(a.rstrip().splitlines()) == len(b.rstrip().splitlines()):
-        return _make_diff_between_file_and_file_by_comparing_line_by_line(a, b, compare_mode=compare_mode)
+        return _find_diff_lines_by_comparing_line_by_line(a, b, compare_mode=compare_mode, matched_lines=matched_lines)
     else:
         if compare_mode in (CompareMode.IGNORE_SPACES, CompareMode.IGNORE_SPACES_AND_NEWLINES):
             logger.warning('ignoring --compare-mode=%s and using --compare-mode=%s (default) instead for generating diff...', str(compare_mode), str(CompareMode.CRLF_INSENSITIVE_EXACT_MATCH))
@@ -458,7 +748,16 @@ def _make_diff_between_file_and_file(a: str, b: str, *, compare_mode: CompareMod
                 logger.warning("carriage return '\\r' is removed from diff")
                 a = a.replace('\r\n', '\n')
                 b = b.replace('\r\n', '\n')
-        return _make_diff_between_file_and_file_by_difflib(a, b)
+        return _find_diff_lines_by_myers(a, b, matched_lines=matched_lines)
+
+
+def _make_diff_between_file_and_file(a: str, b: str, *, compare_mode: CompareMode, matched_lines: int = 0) -> List[_LineDiffOp]:
+    """
+    :param matched_lines: the number of leading lines which are already known to be matched, e.g. `ComparisonResult.lineno`
+    """
+
+    positions, tokenize = _find_diff_lines(a, b, compare_mode=compare_mode, matched_lines=matched_lines)
+    return [tokenize(position) for position in positions]
 
 
 class _MergedDiffOp(NamedTuple):
@@ -472,101 +771,99 @@ class _MergedDiffOp(NamedTuple):
 _MergedDiffOpDots = _MergedDiffOp(None, [], None, [], False)  # This represents insertion of "...".
 
 
-def _reconstruct_entire_diff(a: str, b: str, *, ops: List[_LineDiffOp]) -> List[_MergedDiffOp]:
-    lines_a = a.splitlines(keepends=True)
-    lines_b = b.splitlines(keepends=True)
+class _DiffRow(NamedTuple):
+    """_DiffRow is a _MergedDiffOp without tokens.
+    """
+
+    left_lineno: Optional[int]  # 0-based
+    right_lineno: Optional[int]  # 0-based
+    position: Optional[_LineDiffPosition]  # None if the lines are matched
+
+
+_DiffRowDots = _DiffRow(None, None, None)  # This represents insertion of "...".
+
+
+def _iterate_rows_around_diff_lines(positions: List[_LineDiffPosition], *, lines_a: int, lines_b: int, size: int) -> Iterator[_DiffRow]:
+    """_iterate_rows_around_diff_lines aligns lines of the both sides, and yields rows of diff lines and at most `size` matched lines around them.
+
+    Matched lines far from diff lines are skipped without iteration, so the time is proportional to the number of yielded rows.
+
+    :param lines_a: the number of lines of the left side
+    :param lines_b: the number of lines of the right side
+    """
+    def matched_rows(i_a: int, i_b: int, count: int) -> Iterator[_DiffRow]:
+        for i in range(count):
+            yield _DiffRow(i_a + i, i_b + i, None)
+
     i_a = 0
     i_b = 0
-    stk = list(reversed(ops))
-    result = []
-
-    while i_a < len(lines_a) and i_b < len(lines_b):
-        if stk and stk[-1].left is not None and stk[-1].right is not None and i_a == stk[-1].lineno:
-            assert i_b == stk[-1].lineno
-            result.append(_MergedDiffOp(i_a, stk[-1].left, i_b, stk[-1].right, True))
-            stk.pop()
+    for k, position in enumerate(positions):
+        gap = position.lineno - (i_a if position.left else i_b)
+        assert not (position.left and position.right) or position.lineno - i_b == gap
+        after = min(gap, size) if k else 0  # after the previous diff line
+        before = min(gap - after, size)  # before this diff line
+        yield from matched_rows(i_a, i_b, after)
+        yield from matched_rows(i_a + gap - before, i_b + gap - before, before)
+        i_a += gap
+        i_b += gap
+        yield _DiffRow(i_a if position.left else None, i_b if position.right else None, position)
+        if position.left:
             i_a += 1
+        if position.right:
             i_b += 1
-        elif stk and stk[-1].left is not None and stk[-1].right is None and i_a == stk[-1].lineno:
-            result.append(_MergedDiffOp(i_a, stk[-1].left, None, [], True))
-            stk.pop()
-            i_a += 1
-        elif stk and stk[-1].left is None and stk[-1].right is not None and i_b == stk[-1].lineno:
-            result.append(_MergedDiffOp(None, [], i_b, stk[-1].right, True))
-            stk.pop()
-            i_b += 1
-        else:
-            tokens_a = _tokenize_line(lines_a[i_a])
-            tokens_b = _tokenize_line(lines_b[i_b])
-            result.append(_MergedDiffOp(i_a, tokens_a, i_b, tokens_b, False))
-            i_a += 1
-            i_b += 1
-    while stk:
-        if stk[-1].left is not None and stk[-1].right is None and i_a == stk[-1].lineno:
-            result.append(_MergedDiffOp(i_a, stk[-1].left, None, [], True))
-            stk.pop()
-            i_a += 1
-        elif stk[-1].left is None and stk[-1].right is not None and i_b == stk[-1].lineno:
-            result.append(_MergedDiffOp(None, [], i_b, stk[-1].right, True))
-            stk.pop()
-            i_b += 1
-        else:
-            assert False
-    assert i_a == len(lines_a) and i_b == len(lines_b)
-
-    return result
+    if positions:
+        yield from matched_rows(i_a, i_b, min(lines_a - i_a, lines_b - i_b, size))
 
 
-def _add_lines_around_diff_lines(a: str, b: str, *, ops: List[_LineDiffOp], size: int) -> List[_MergedDiffOp]:
-    result: List[_MergedDiffOp] = []
-    unused: List[_MergedDiffOp] = []
-    use = 0
-    for op in _reconstruct_entire_diff(a, b, ops=ops):
-        if op.has_diff:
-            result += unused[-size:]
-            unused = []
-            result.append(op)
-            use = size
-        else:
-            if use:
-                result.append(op)
-                use -= 1
-            else:
-                unused.append(op)
-    return result
-
+def _iterate_rows_with_dots(rows: Iterator[_DiffRow], *, lines_a: int, lines_b: int) -> Iterator[_DiffRow]:
+    """_iterate_rows_with_dots inserts dots between gaps of rows, and before and after rows if they don't reach the first or last lines.
+    """
 
-def _add_dots_between_gaps(a: str, b: str, *, ops: List[_MergedDiffOp]) -> List[_MergedDiffOp]:
-    result: List[_MergedDiffOp] = []
+    # look ahead until the first line numbers of the both sides are found, for the header
+    buffer: List[_DiffRow] = []
+    min_left_lineno: Optional[int] = None
+    min_right_lineno: Optional[int] = None
+    for row in rows:
+        buffer.append(row)
+        if min_left_lineno is None:
+            min_left_lineno = row.left_lineno
+        if min_right_lineno is None:
+            min_right_lineno = row.right_lineno
+        if min_left_lineno is not None and min_right_lineno is not None:
+            break
+    if (min_left_lineno if min_left_lineno is not None else lines_a) != 0 or (min_right_lineno if min_right_lineno is not None else lines_b) != 0:
+        yield _DiffRowDots
 
     # body
-    for op in ops:
-        if result and result[-1].left_lineno is not None and result[-1].right_lineno is not None:
-            if op.left_lineno is not None and op.right_lineno is not None:
-                if op.left_lineno - result[-1].left_lineno >= 2 and op.right_lineno - result[-1].right_lineno >= 2:
-                    result.append(_MergedDiffOpDots)
-        result.append(op)
-
-    # header and footer
-    lines_a = a.splitlines(keepends=True)
-    lines_b = b.splitlines(keepends=True)
-    min_left_lineno = len(lines_a)
+    previous: Optional[_DiffRow] = None
     max_left_lineno = -1
-    min_right_lineno = len(lines_b)
     max_right_lineno = -1
-    for op in ops:
-        if op.left_lineno is not None:
-            min_left_lineno = min(min_left_lineno, op.left_lineno)
-            max_left_lineno = op.left_lineno
-        if op.right_lineno is not None:
-            min_right_lineno = min(min_right_lineno, op.right_lineno)
-            max_right_lineno = op.right_lineno
-    if min_left_lineno != 0 or min_right_lineno != 0:
-        result = [_MergedDiffOpDots] + result
-    if max_left_lineno != len(lines_a) - 1 or max_right_lineno != len(lines_b) - 1:
-        result += [_MergedDiffOpDots]
-
-    return result
+    for row in itertools.chain(buffer, rows):
+        if previous is not None and previous.left_lineno is not None and previous.right_lineno is not None:
+            if row.left_lineno is not None and row.right_lineno is not None:
+                if row.left_lineno - previous.left_lineno >= 2 and row.right_lineno - previous.right_lineno >= 2:
+                    yield _DiffRowDots
+        yield row
+        previous = row
+        if row.left_lineno is not None:
+            max_left_lineno = row.left_lineno
+        if row.right_lineno is not None:
+            max_right_lineno = row.right_lineno
+
+    # footer
+    if max_left_lineno != lines_a - 1 or max_right_lineno != lines_b - 1:
+        yield _DiffRowDots
+
+
+def _tokenize_diff_row(row: _DiffRow, *, lines_a: List[str], lines_b: List[str], tokenize: _LineDiffTokenizer) -> _MergedDiffOp:
+    if row == _DiffRowDots:
+        return _MergedDiffOpDots
+    if row.position is None:
+        assert row.left_lineno is not None
+        assert row.right_lineno is not None
+        return _MergedDiffOp(row.left_lineno, _tokenize_line(lines_a[row.left_lineno]), row.right_lineno, _tokenize_line(lines_b[row.right_lineno]), False)
+    op = tokenize(row.position)
+    return _MergedDiffOp(row.left_lineno, op.left or [], row.right_lineno, op.right or [], True)
 
 
 def _len_of_tokens(tokens: List[_PrettyToken]) -> int:
@@ -629,36 +926,56 @@ def _tokens_from_line_diff_ops(ops: List[_MergedDiffOp], *, char_in_line: int) -
     return tokens
 
 
-def _summary_token_of_diff_ops(ops: List[_MergedDiffOp]) -> List[_PrettyToken]:
+def _summary_token_of_diff_positions(positions: List[_LineDiffPosition]) -> List[_PrettyToken]:
     removed = 0
     added = 0
-    for op in ops:
-        if op.has_diff:
-            if op.left_lineno is not None:
-                removed += 1
-            if op.right_lineno is not None:
-                added += 1
+    for position in positions:
+        if position.left:
+            removed += 1
+        if position.right:
+            added += 1
     if not removed and not added:
         return []
     else:
         return [_PrettyToken(_PrettyTokenType.HINT, '(also {} lines are deleted and {} lines are added...)'.format(removed, added))]
 
 
-def _tokenize_pretty_diff(output: str, *, expected: str, compare_mode: CompareMode, char_in_line: int, limit: int) -> List[_PrettyToken]:
+def _tokenize_pretty_diff(output: str, *, expected: str, compare_mode: CompareMode, char_in_line: int, limit: int, matched_lines: int = 0) -> List[_PrettyToken]:
+    """_tokenize_pretty_diff makes tokens of at most `limit` rows of the diff. Only the lines in the rows are tokenized.
+    """
+
     if compare_mode == CompareMode.IGNORE_SPACES_AND_NEWLINES:
         logger.warning('ignoring --compare-mode=%s and using --compare-mode=%s instead for generating diff...', str(compare_mode), str(CompareMode.IGNORE_SPACES))
         compare_mode = CompareMode.IGNORE_SPACES
-    ops = _make_diff_between_file_and_file(output, expected, compare_mode=compare_mode)
-    merged_ops = _add_lines_around_diff_lines(output, expected, ops=ops, size=4)
-    merged_ops = _add_dots_between_gaps(output, expected, ops=merged_ops)
-    tokens = _tokens_from_line_diff_ops(merged_ops[:limit] if limit != -1 else merged_ops, char_in_line=char_in_line)
+        matched_lines = 0  # lines are not matched one by one in this mode
+    tokens: List[_PrettyToken] = []
+    try:
+        positions, tokenize = _find_diff_lines(output, expected, compare_mode=compare_mode, matched_lines=matched_lines)
+    except _TooManyDiffLinesError as e:
+        # Print lines at the same line numbers side by side instead. This is not the shortest diff, but still shows the first differences.
+        tokens.append(_PrettyToken(_PrettyTokenType.HINT, str(e) + '\n'))
+        fallback_compare_mode = CompareMode.EXACT_MATCH if compare_mode == CompareMode.EXACT_MATCH else CompareMode.CRLF_INSENSITIVE_EXACT_MATCH
+        positions, tokenize = _find_diff_lines_by_comparing_line_by_line(output, expected, compare_mode=fallback_compare_mode, matched_lines=matched_lines)
+    lines_a = output.splitlines(keepends=True)
+    lines_b = expected.splitlines(keepends=True)
+    rows = _iterate_rows_around_diff_lines(positions, lines_a=len(lines_a), lines_b=len(lines_b), size=4)
+    rows = _iterate_rows_with_dots(rows, lines_a=len(lines_a), lines_b=len(lines_b))
+    printed_rows = list(rows) if limit == -1 else list(itertools.islice(rows, limit))
+    merged_ops = [_tokenize_diff_row(row, lines_a=lines_a, lines_b=lines_b, tokenize=tokenize) for row in printed_rows]
+    tokens += _tokens_from_line_diff_ops(merged_ops, char_in_line=char_in_line)
     if limit != -1:
-        tokens += _summary_token_of_diff_ops(merged_ops[limit:])
+        # the rest is only counted
+        printed_positions = sum(1 for row in printed_rows if row.position is not None)
+        tokens += _summary_token_of_diff_positions(positions[printed_positions:])
     return tokens
 
 
-def make_pretty_diff(output_bytes: bytes, *, expected: str, compare_mode: CompareMode, limit: int) -> str:
+def make_pretty_diff(output_bytes: bytes, *, expected: str, compare_mode: CompareMode, limit: int, matched_lines: int = 0) -> str:
+    """
+    :param matched_lines: the number of leading lines which are already known to be matched. Comparison of them is skipped.
+    """
+
     tokens, output = _decode_with_recovery(output_bytes)
     char_in_line = _get_terminal_size()
-    tokens += _tokenize_pretty_diff(output, expected=expected, compare_mode=compare_mode, char_in_line=char_in_line, limit=limit)
+    tokens += _tokenize_pretty_diff(output, expected=expected, compare_mode=compare_mode, char_in_line=char_in_line, limit=limit, matched_lines=matched_lines)
     return _render_tokens(tokens=tokens)
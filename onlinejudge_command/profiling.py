@@ -0,0 +1,147 @@
+"""This module measures how long oj itself takes for each phase, e.g. `--profile-runner` of `test` subcommand.
+
+Phases are recorded only after `enable()` is called, so `phase()` costs almost nothing by default.
+"""
+
+import contextlib
+import os
+import threading
+import time
+from typing import *
+
+
+class Event(NamedTuple):
+    name: str
+    case: Optional[str]
+    begin: float  # time.perf_counter()
+    end: float  # time.perf_counter()
+    pid: int
+    tid: int
+
+
+class Profiler:
+    """Profiler keeps events from threads. Events from other processes can be added with `extend()`, because `time.perf_counter()` is a system-wide clock.
+    """
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events: List[Event] = []
+
+    def extend(self, events: Iterable[Event]) -> None:
+        with self._lock:
+            self._events.extend(events)
+
+    def get_events(self) -> List[Event]:
+        with self._lock:
+            return list(self._events)
+
+    def take_events(self) -> List[Event]:
+        """take_events returns the events and forgets them.
+        """
+
+        with self._lock:
+            events = self._events
+            self._events = []
+            return events
+
+
+_profiler: Optional[Profiler] = None
+_local = threading.local()
+
+
+def enable() -> None:
+    global _profiler  # pylint: disable=global-statement
+    if _profiler is None:
+        _profiler = Profiler()
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+@contextlib.contextmanager
+def case(name: str) -> Iterator[None]:
+    """case labels the phases in this thread with the name of a test case.
+    """
+
+    previous = getattr(_local, 'case', None)
+    _local.case = name
+    try:
+        yield
+    finally:
+        _local.case = previous
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """phase records the time of the block if profiling is enabled.
+    """
+
+    if _profiler is None:
+        yield
+        return
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profiler.extend([Event(name=name, case=getattr(_local, 'case', None), begin=begin, end=time.perf_counter(), pid=os.getpid(), tid=threading.get_native_id())])
+
+
+def summarize(events: List[Event]) -> List[Dict[str, Any]]:
+    """summarize aggregates events for each phase, in the order of their first appearances.
+
+    :returns: a list of dicts which have `name`, `count`, `total`, `mean` and `max`. Times are in second.
+    """
+
+    durations: Dict[str, List[float]] = {}
+    for event in sorted(events, key=lambda event: event.begin):
+        durations.setdefault(event.name, []).append(event.end - event.begin)
+    return [{
+        'name': name,
+        'count': len(values),
+        'total': sum(values),
+        'mean': sum(values) / len(values),
+        'max': max(values),
+    } for name, values in durations.items()]
+
+
+def make_summary_table(events: List[Event]) -> List[str]:
+    """make_summary_table makes the lines of a table of the time for each phase.
+    """
+
+    columns = ['count', 'total', 'mean', 'max']
+    rows = [['phase'] + columns]
+    for summary in summarize(events):
+        rows.append([summary['name'], str(summary['count'])] + ['{:.6f}'.format(summary[column]) for column in columns[1:]])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ['time of oj itself (sec):']
+    for row in rows:
+        lines.append('  '.join([row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]).rstrip())
+    return lines
+
+
+def make_chrome_trace(events: List[Event], *, origin: float) -> Dict[str, Any]:
+    """make_chrome_trace makes a JSON object in the trace event format, which chrome://tracing and Perfetto can open.
+
+    :param origin: the time of `time.perf_counter()` to be the zero of timestamps
+    """
+
+    trace_events = []
+    for event in sorted(events, key=lambda event: event.begin):
+        trace_event: Dict[str, Any] = {
+            'name': event.name,
+            'cat': 'oj',
+            'ph': 'X',  # a complete event, which has its duration
+            'ts': (event.begin - origin) * 10**6,  # in microsecond
+            'dur': (event.end - event.begin) * 10**6,
+            'pid': event.pid,
+            'tid': event.tid,
+        }
+        if event.case is not None:
+            trace_event['args'] = {'case': event.case}
+        trace_events.append(trace_event)
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
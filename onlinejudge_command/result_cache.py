@@ -0,0 +1,87 @@
+"""This module stores the results of `test` subcommand to skip the cases whose solution, input and expected output are unchanged.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import shlex
+import shutil
+import tempfile
+import traceback
+from logging import getLogger
+from typing import *
+
+from onlinejudge_command import utils
+
+logger = getLogger(__name__)
+
+
+def hash_file(path: pathlib.Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_files_in_command(command: str) -> Dict[str, str]:
+    """hash_files_in_command computes hashes of files which the given command uses, e.g. `./a.out` of `./a.out`, and `/usr/bin/python3` and `main.py` of `python3 main.py`.
+
+    :returns: a dict from paths to hashes
+    """
+
+    hashes: Dict[str, str] = {}
+    for i, word in enumerate(shlex.split(command)):
+        path = pathlib.Path(word)
+        if i == 0 and not path.is_file():
+            resolved = shutil.which(word)
+            if resolved is None:
+                continue
+            path = pathlib.Path(resolved)
+        if path.is_file():
+            hashes[word] = hash_file(path)
+    return hashes
+
+
+class ResultCache:
+    def __init__(self, *, config: Dict[str, Any], directory: pathlib.Path = utils.user_cache_dir / 'test-result-cache', file_hasher: Callable[[pathlib.Path], str] = hash_file):
+        """
+        :param config: everything except test cases which may change the results, e.g. the command and the compare mode.
+        :param file_hasher: a function to compute hashes of cases, e.g. `Manifest.hash_file` which reuses recorded hashes.
+        """
+
+        self.directory = directory
+        self.file_hasher = file_hasher
+        self.config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+    def make_key(self, *, input_path: pathlib.Path, output_path: Optional[pathlib.Path]) -> str:
+        hasher = hashlib.sha256()
+        hasher.update(self.config_hash.encode())
+        hasher.update(self.file_hasher(input_path).encode())
+        if output_path is not None:
+            hasher.update(self.file_hasher(output_path).encode())
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / key[:2] / (key + '.json')
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (json.decoder.JSONDecodeError, OSError):
+            logger.warning('broken cache of a test result found: %s', path)
+            logger.debug('%s', traceback.format_exc())
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write atomically, because other threads or processes may read the same entry
+        with tempfile.NamedTemporaryFile('w', dir=str(path.parent), delete=False) as fh:
+            json.dump(result, fh)
+        os.replace(fh.name, path)
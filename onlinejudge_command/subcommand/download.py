@@ -9,6 +9,7 @@ from typing import *
 import requests.exceptions
 
 import onlinejudge_command.download_history
+import onlinejudge_command.manifest as manifestutils
 from onlinejudge import dispatch
 from onlinejudge.service.atcoder import AtCoderProblem
 from onlinejudge.service.yukicoder import YukicoderProblem
@@ -159,7 +160,8 @@ def run(args: argparse.Namespace) -> bool:
                 logger.info(utils.HINT + 'We recommend adding your own test cases to test/ directory, and using one directory per one problem. Please see also https://github.com/online-judge-tools/oj/blob/master/docs/getting-started.md#random-testing. If you wanted to keep using one directory per one contest, you can run like `$ rm -rf test/ && oj d https://...`.')
                 return False
 
-    # write samples to files
+    # write samples to files. The manifest of cases is updated only if it exists, because the format of `test` subcommand is unknown here.
+    manifest = manifestutils.open_manifest(args.directory) if not args.dry_run else None
     for i, sample in enumerate(samples):
         logger.info('')
         logger.info('sample %d', i)
@@ -172,7 +174,11 @@ def run(args: argparse.Namespace) -> bool:
                 path.parent.mkdir(parents=True, exist_ok=True)
                 with path.open('wb') as fh:
                     fh.write(data)
+                if manifest is not None:
+                    manifest.add_file(path, data)
                 logger.info(utils.SUCCESS + 'saved to: %s', path)
+    if manifest is not None:
+        manifest.save()
 
     if args.log_file:
         with args.log_file.open(mode='w') as fhs:
@@ -5,12 +5,13 @@ import hashlib
 import itertools
 import os
 import pathlib
-import subprocess
+import re
 import threading
 from logging import getLogger
 from typing import *
 
 import onlinejudge_command.format_utils as fmtutils
+import onlinejudge_command.manifest as manifestutils
 from onlinejudge_command import pretty_printers, utils
 
 logger = getLogger(__name__)
@@ -41,6 +42,7 @@ tips:
     subparser.add_argument('-j', '--jobs', type=int, help='run tests in parallel')
     subparser.add_argument('--width', type=int, default=3, help='specify the width of indices of cases. (default: 3)')
     subparser.add_argument('--name', help='specify the base name of cases. (default: "random")')
+    subparser.add_argument('--manifest', action='store_true', help='make a manifest file in the directory to find cases fast. An existing manifest is always used and updated.')
     subparser.add_argument('-c', '--command', help='specify your solution to generate output')
     subparser.add_argument('--hack-expected', dest='command', help='alias of --command. If this is not given, --hack runs until the actual solution fails with RE or TLE.')
     subparser.add_argument('--hack', '--hack-actual', dest='hack', help='specify your wrong solution to be compared with the reference solution given by --hack-expected')
@@ -68,7 +70,7 @@ def BufferedExecutor(lock: Optional[threading.Lock]):
     return result
 
 
-def write_result(input_data: bytes, output_data: Optional[bytes], *, input_path: pathlib.Path, output_path: pathlib.Path, print_data: bool, lock: Optional[threading.Lock] = None) -> None:
+def write_result(input_data: bytes, output_data: Optional[bytes], *, input_path: pathlib.Path, output_path: pathlib.Path, print_data: bool, lock: Optional[threading.Lock] = None, manifest: Optional[manifestutils.Manifest] = None) -> None:
     # acquire lock to print logs properly, if in parallel
     nullcontext = contextlib.nullcontext()
     with lock or nullcontext:
@@ -81,6 +83,8 @@ def write_result(input_data: bytes, output_data: Optional[bytes], *, input_path:
             logger.info(utils.NO_HEADER + '%s', pretty_printers.make_pretty_large_file_content(input_data, limit=40, head=20, tail=10))
         with input_path.open('wb') as fh:
             fh.write(input_data)
+        if manifest is not None:
+            manifest.add_file(input_path, input_data)
         logger.info(utils.SUCCESS + 'saved to: %s', input_path)
 
         if output_data is not None:
@@ -89,20 +93,22 @@ def write_result(input_data: bytes, output_data: Optional[bytes], *, input_path:
                 logger.info(pretty_printers.make_pretty_large_file_content(output_data, limit=40, head=20, tail=10))
             with output_path.open('wb') as fh:
                 fh.write(output_data)
+            if manifest is not None:
+                manifest.add_file(output_path, output_data)
             logger.info(utils.SUCCESS + 'saved to: %s', output_path)
 
 
-def check_status(info: Dict[str, Any], proc: subprocess.Popen, *, submit: Callable[..., None], input_data: Optional[bytes]) -> bool:
+def check_status(info: Dict[str, Any], *, submit: Callable[..., None], input_data: Optional[bytes]) -> bool:
     submit(logger.info, 'time: %f sec', info['elapsed'])
-    if proc.returncode is None:
+    if info['returncode'] is None:
         submit(logger.info, utils.FAILURE + utils.red('TLE'))
         if input_data is not None:
             submit(logger.info, utils.NO_HEADER + 'input:')
             submit(logger.info, utils.NO_HEADER + '%s', pretty_printers.make_pretty_large_file_content(input_data, limit=40, head=20, tail=10))
         submit(logger.info, 'skipped.')
         return False
-    elif proc.returncode != 0:
-        submit(logger.info, utils.FAILURE + utils.red('RE') + ': return code %d', proc.returncode)
+    elif info['returncode'] != 0:
+        submit(logger.info, utils.FAILURE + utils.red('RE') + ': return code %d', info['returncode'])
         if input_data is not None:
             submit(logger.info, utils.NO_HEADER + 'input:')
             submit(logger.info, utils.NO_HEADER + '%s', pretty_printers.make_pretty_large_file_content(input_data, limit=40, head=20, tail=10))
@@ -136,7 +142,7 @@ def check_randomness_of_generator(input_data: bytes, *, name: str, lock: Optiona
     return None
 
 
-def generate_input_single_case(generator: str, *, input_path: pathlib.Path, output_path: pathlib.Path, command: Optional[str], tle: Optional[float], name: str, lock: Optional[threading.Lock] = None, generated_input_hashes: Dict[bytes, str]) -> None:
+def generate_input_single_case(generator: str, *, input_path: pathlib.Path, output_path: pathlib.Path, command: Optional[str], tle: Optional[float], name: str, lock: Optional[threading.Lock] = None, generated_input_hashes: Dict[bytes, str], manifest: Optional[manifestutils.Manifest] = None) -> None:
     with BufferedExecutor(lock) as submit:
 
         # print the header
@@ -145,9 +151,9 @@ def generate_input_single_case(generator: str, *, input_path: pathlib.Path, outp
 
         # generate input
         submit(logger.info, 'generate input...')
-        info, proc = utils.exec_command(generator, timeout=tle)
+        info, _ = utils.exec_command(generator, timeout=tle)
         input_data: bytes = info['answer']
-        if not check_status(info, proc, submit=submit, input_data=input_data):
+        if not check_status(info, submit=submit, input_data=input_data):
             return
 
         # check the randomness of generator
@@ -160,13 +166,13 @@ def generate_input_single_case(generator: str, *, input_path: pathlib.Path, outp
             output_data: Optional[bytes] = None
         else:
             submit(logger.info, 'generate output...')
-            info, proc = utils.exec_command(command, input=input_data, timeout=tle)
+            info, _ = utils.exec_command(command, input=input_data, timeout=tle)
             output_data = info['answer']
-            if not check_status(info, proc, submit=submit, input_data=input_data):
+            if not check_status(info, submit=submit, input_data=input_data):
                 return
 
         # write result
-        submit(write_result, input_data=input_data, output_data=output_data, input_path=input_path, output_path=output_path, print_data=True)
+        submit(write_result, input_data=input_data, output_data=output_data, input_path=input_path, output_path=output_path, print_data=True, manifest=manifest)
 
 
 def simple_match(a: str, b: str) -> bool:
@@ -187,9 +193,9 @@ def try_hack_once(generator: str, command: Optional[str], hack: str, *, tle: Opt
 
         # generate input
         submit(logger.info, 'generate input...')
-        info, proc = utils.exec_command(generator, stdin=None, timeout=tle)
+        info, _ = utils.exec_command(generator, stdin=None, timeout=tle)
         input_data: Optional[bytes] = info['answer']
-        if not check_status(info, proc, submit=submit, input_data=input_data):
+        if not check_status(info, submit=submit, input_data=input_data):
             return None
         assert input_data is not None
 
@@ -205,24 +211,24 @@ def try_hack_once(generator: str, command: Optional[str], hack: str, *, tle: Opt
         output_data: Optional[bytes] = None
         if command is not None:
             submit(logger.info, 'generate output...')
-            info, proc = utils.exec_command(command, input=input_data, timeout=tle)
+            info, _ = utils.exec_command(command, input=input_data, timeout=tle)
             output_data = info['answer']
-            if not check_status(info, proc, submit=submit, input_data=input_data):
+            if not check_status(info, submit=submit, input_data=input_data):
                 return None
             assert output_data is not None
 
         # hack
         submit(logger.info, 'hack...')
-        info, proc = utils.exec_command(hack, input=input_data, timeout=tle)
+        info, _ = utils.exec_command(hack, input=input_data, timeout=tle)
         answer: str = (info['answer'] or b'').decode()
 
         # compare
         status = 'AC'
-        if proc.returncode is None:
+        if info['returncode'] is None:
             submit(logger.info, 'FAILURE: ' + utils.red('TLE'))
             status = 'TLE'
-        elif proc.returncode != 0:
-            logger.info(utils.FAILURE + '' + utils.red('RE') + ': return code %d', proc.returncode)
+        elif info['returncode'] != 0:
+            logger.info(utils.FAILURE + '' + utils.red('RE') + ': return code %d', info['returncode'])
             status = 'RE'
         if output_data is not None:
             expected = output_data.decode()
@@ -255,12 +261,25 @@ def run(args: argparse.Namespace) -> None:
         else:
             args.count = 100
 
+    manifest = manifestutils.open_manifest(args.directory, args.format, create=args.manifest)
+
     def iterate_path():
-        for i in itertools.count():
+        # With the manifest, start from the next of the largest used index without checking files.
+        start = 0
+        used_names: Set[str] = set()
+        if manifest is not None:
+            used_names = manifest.get_names()
+            pattern = re.compile(re.escape(args.name) + r'-([0-9]+)')
+            start = max((int(m.group(1)) for m in map(pattern.fullmatch, used_names) if m), default=-1) + 1
+
+        for i in itertools.count(start):
             name = '{}-{}'.format(args.name, str(i).zfill(args.width))
             input_path = fmtutils.path_from_format(args.directory, args.format, name=name, ext='in')
             output_path = fmtutils.path_from_format(args.directory, args.format, name=name, ext='out')
-            if not input_path.exists() and not output_path.exists():
+            if manifest is not None:
+                if name not in used_names:
+                    yield (name, input_path, output_path)
+            elif not input_path.exists() and not output_path.exists():
                 yield (name, input_path, output_path)
 
     # generate cases
@@ -269,14 +288,14 @@ def run(args: argparse.Namespace) -> None:
         for name, input_path, output_path in itertools.islice(iterate_path(), args.count):
             if not args.hack:
                 # generate serially
-                generate_input_single_case(args.generator, input_path=input_path, output_path=output_path, command=args.command, tle=args.tle, name=name, generated_input_hashes=generated_input_hashes)
+                generate_input_single_case(args.generator, input_path=input_path, output_path=output_path, command=args.command, tle=args.tle, name=name, generated_input_hashes=generated_input_hashes, manifest=manifest)
 
             else:
                 # hack serially
                 for attempt in itertools.count(1):
                     data = try_hack_once(args.generator, command=args.command, hack=args.hack, tle=args.tle, attempt=attempt, generated_input_hashes=generated_input_hashes)
                     if data is not None:
-                        write_result(*data, input_path=input_path, output_path=output_path, print_data=False)
+                        write_result(*data, input_path=input_path, output_path=output_path, print_data=False, manifest=manifest)
                         break
     else:
         with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
@@ -286,7 +305,7 @@ def run(args: argparse.Namespace) -> None:
             if not args.hack:
                 # generate concurrently
                 for name, input_path, output_path in itertools.islice(iterate_path(), args.count):
-                    futures += [executor.submit(generate_input_single_case, args.generator, input_path=input_path, output_path=output_path, command=args.command, tle=args.tle, name=name, lock=lock, generated_input_hashes=generated_input_hashes)]
+                    futures += [executor.submit(generate_input_single_case, args.generator, input_path=input_path, output_path=output_path, command=args.command, tle=args.tle, name=name, lock=lock, generated_input_hashes=generated_input_hashes, manifest=manifest)]
                 for future in futures:
                     future.result()
 
@@ -308,4 +327,7 @@ def run(args: argparse.Namespace) -> None:
                             futures[i] = executor.submit(try_hack_once, args.generator, command=args.command, hack=args.hack, tle=args.tle, attempt=attempt, lock=lock, generated_input_hashes=generated_input_hashes)
                             if data is not None:
                                 break
-                    write_result(*data, input_path=input_path, output_path=output_path, print_data=False, lock=lock)
+                    write_result(*data, input_path=input_path, output_path=output_path, print_data=False, lock=lock, manifest=manifest)
+
+    if manifest is not None:
+        manifest.save()
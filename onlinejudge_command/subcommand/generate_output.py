@@ -8,6 +8,7 @@ from logging import getLogger
 from typing import *
 
 import onlinejudge_command.format_utils as fmtutils
+import onlinejudge_command.manifest as manifestutils
 from onlinejudge_command import pretty_printers, utils
 
 logger = getLogger(__name__)
@@ -33,9 +34,10 @@ tips:
     subparser.add_argument('test', nargs='*', type=pathlib.Path, help='paths of input cases. (if empty: globbed from --format)')
     subparser.add_argument('--no-ignore-backup', action='store_false', dest='ignore_backup')
     subparser.add_argument('--ignore-backup', action='store_true', help='ignore backup files and hidden files (i.e. files like "*~", "\\#*\\#" and ".*") (default)')
+    subparser.add_argument('--manifest', action='store_true', help='make a manifest file in the directory to find cases fast. An existing manifest is always used and updated.')
 
 
-def generate_output_single_case(test_name: str, test_input_path: pathlib.Path, *, lock: Optional[threading.Lock] = None, args: argparse.Namespace) -> None:
+def generate_output_single_case(test_name: str, test_input_path: pathlib.Path, *, lock: Optional[threading.Lock] = None, manifest: Optional[manifestutils.Manifest] = None, args: argparse.Namespace) -> None:
 
     # print the header
     if lock is None:
@@ -44,7 +46,7 @@ def generate_output_single_case(test_name: str, test_input_path: pathlib.Path, *
 
     # run the command
     with test_input_path.open('rb') as inf:
-        info, proc = utils.exec_command(args.command, stdin=inf, timeout=args.tle)
+        info, _ = utils.exec_command(args.command, stdin=inf, timeout=args.tle)
         answer: Optional[bytes] = info['answer']
         elapsed: float = info['elapsed']
 
@@ -57,12 +59,12 @@ def generate_output_single_case(test_name: str, test_input_path: pathlib.Path, *
 
         # check the result
         logger.info('time: %f sec', elapsed)
-        if proc.returncode is None:
+        if info['returncode'] is None:
             logger.info(utils.red('TLE'))
             logger.info('skipped.')
             return
-        elif proc.returncode != 0:
-            logger.info('FIALURE: ' + utils.red('RE') + ': return code %d', proc.returncode)
+        elif info['returncode'] != 0:
+            logger.info('FIALURE: ' + utils.red('RE') + ': return code %d', info['returncode'])
             logger.info('skipped.')
             return
         assert answer is not None
@@ -81,10 +83,12 @@ def generate_output_single_case(test_name: str, test_input_path: pathlib.Path, *
             os.makedirs(str(test_output_path.parent), exist_ok=True)
         with test_output_path.open('wb') as fh:
             fh.write(answer)
+        if manifest is not None:
+            manifest.add_file(test_output_path, answer)
         logger.info(utils.SUCCESS + 'saved to: %s', test_output_path)
 
 
-def generate_output_single_case_exists_ok(test_name: str, test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], *, lock: Optional[threading.Lock] = None, args: argparse.Namespace) -> None:
+def generate_output_single_case_exists_ok(test_name: str, test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], *, lock: Optional[threading.Lock] = None, manifest: Optional[manifestutils.Manifest] = None, args: argparse.Namespace) -> None:
     if test_output_path is not None:
         nullcontext = contextlib.ExitStack()
         with lock or nullcontext:
@@ -93,26 +97,33 @@ def generate_output_single_case_exists_ok(test_name: str, test_input_path: pathl
             logger.info('output file already exists.')
             logger.info('skipped.')
     else:
-        generate_output_single_case(test_name, test_input_path, lock=lock, args=args)
+        generate_output_single_case(test_name, test_input_path, lock=lock, manifest=manifest, args=args)
 
 
 def run(args: argparse.Namespace) -> None:
-    # list tests
-    if not args.test:
-        args.test = fmtutils.glob_with_format(args.directory, args.format)  # by default
-    if args.ignore_backup:
-        args.test = fmtutils.drop_backup_or_hidden_files(args.test)
-    tests = fmtutils.construct_relationship_of_files(args.test, args.directory, args.format)
+    # list tests. The manifest is updated even if files are given, because outputs are written to the directory.
+    manifest = manifestutils.open_manifest(args.directory, args.format, create=args.manifest)
+    if manifest is not None and not args.test and args.ignore_backup:
+        tests = manifest.get_test_cases()
+    elif not args.test:
+        tests = fmtutils.find_test_cases(args.directory, args.format, ignore_backup=args.ignore_backup)  # by default
+    else:
+        if args.ignore_backup:
+            args.test = fmtutils.drop_backup_or_hidden_files(args.test)
+        tests = fmtutils.construct_relationship_of_files(args.test, args.directory, args.format)
 
     # generate cases
     if args.jobs is None:
         for name, paths in sorted(tests.items()):
-            generate_output_single_case_exists_ok(name, paths['in'], paths.get('out'), args=args)
+            generate_output_single_case_exists_ok(name, paths['in'], paths.get('out'), manifest=manifest, args=args)
     else:
         with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
             lock = threading.Lock()
             futures: List[concurrent.futures.Future] = []
             for name, paths in sorted(tests.items()):
-                futures += [executor.submit(generate_output_single_case_exists_ok, name, paths['in'], paths.get('out'), lock=lock, args=args)]
+                futures += [executor.submit(generate_output_single_case_exists_ok, name, paths['in'], paths.get('out'), lock=lock, manifest=manifest, args=args)]
             for future in futures:
                 future.result()
+
+    if manifest is not None:
+        manifest.save()
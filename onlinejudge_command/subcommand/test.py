@@ -1,21 +1,34 @@
 import argparse
+import atexit
 import concurrent.futures
 import contextlib
 import enum
+import importlib
+import importlib.util
+import io
 import json
+import logging
+import multiprocessing
 import os
 import pathlib
 import platform
+import queue
+import re
+import shlex
+import shutil
 import subprocess
+import sys
 import tempfile
 import threading
 import traceback
 from logging import getLogger
 from typing import *
+from typing import BinaryIO  # It seems we cannot import BinaryIO with wildcard-import
 
 import onlinejudge_command.format_utils as fmtutils
-from onlinejudge_command import output_comparators, pretty_printers, utils
-from onlinejudge_command.output_comparators import CompareMode
+import onlinejudge_command.manifest as manifestutils
+from onlinejudge_command import benchmark, elapsed_time_history, output_comparators, pretty_printers, profiling, result_cache, utils
+from onlinejudge_command.output_comparators import CompareMode, ComparisonResult
 
 logger = getLogger(__name__)
 
@@ -45,21 +58,43 @@ tips:
     subparser.add_argument('-s', '--silent', action='store_true', help='don\'t report output and correct answer even if not AC  (for --mode all)')
     subparser.add_argument('-e', '--error', type=float, help='check as floating point number: correct if its absolute or relative error doesn\'t exceed it')
     subparser.add_argument('-t', '--tle', type=float, help='set the time limit (in second) (default: inf)')
+    subparser.add_argument('--tle-mode', choices=[mode.value for mode in TimeLimitMode], default=TimeLimitMode.WALL.value, help='apply --tle to wall-clock time or CPU time. CPU time is stable even when the machine is loaded, e.g. with --jobs.  (default: wall)')
     subparser.add_argument('--mle', type=float, help='set the memory limit (in megabyte) (default: inf)')
+    subparser.add_argument('--mle-mode', choices=[mode.value for mode in MemoryLimitMode], default=MemoryLimitMode.MEASURE.value, help='how to apply --mle. "measure" judges MLE after the solution exits. "kill" kills the solution as soon as it exceeds --mle, to stop runaway solutions early (only on Linux).  (default: measure)')
     subparser.add_argument('-i', '--print-input', action='store_true', default=True, help='print input cases if not AC  (default)')
     subparser.add_argument('--no-print-input', action='store_false', dest='print_input')
     subparser.add_argument('-j', '--jobs', metavar='N', type=int, help='specifies the number of jobs to run simultaneously  (default: no parallelization)')
+    subparser.add_argument('--executor', choices=[executor.value for executor in Executor], default=Executor.THREAD.value, help='with --jobs, where outputs are compared and results are rendered. "process" uses processes to make it parallel even for large outputs.  (default: thread)')
+    subparser.add_argument('--cpus', metavar='LIST', type=parse_cpu_list, help='run solutions only on these CPUs, e.g. "2-15" or "0,2,4-7"  (default: all CPUs available)')
+    subparser.add_argument('--pin', action='store_true', help='run each solution on a dedicated CPU. With --jobs, each running case gets its own CPU from --cpus, and cases wait for a free CPU.')
+    subparser.add_argument('--isolate', action='store_true', help='with --pin, use only CPUs whose neighbors (the next CPU and hyper-threading siblings) are unused, to reduce the interference between parallel cases. This implies --pin.')
+    subparser.add_argument('--fail-fast', metavar='N', type=int, nargs='?', const=1, default=None, help='stop testing after N failures. Running cases are killed and remaining cases are skipped.  (default: 1 if no N is given)')
+    subparser.add_argument('--repeat', metavar='K', type=int, default=1, help='run each case K times to measure time and memory stably. The output of the last run is checked.  (default: 1)')
+    subparser.add_argument('--warmup', metavar='W', type=int, default=0, help='with --repeat, run each case W more times before measurement and discard them  (default: 0)')
+    subparser.add_argument('--compare-command', metavar='COMMAND', help='run also this baseline solution (e.g. `./old`) on each case in turn with your solution, and report how many times your solution is faster than it. The outputs of both are checked.')
+    subparser.add_argument('--profile-runner', action='store_true', help='measure how long oj itself takes for each phase (e.g. launching solutions, comparing outputs and printing results), and print a table of them')
+    subparser.add_argument('--profile-runner-trace', metavar='FILE', type=pathlib.Path, help='with --profile-runner, write the phases to FILE in the trace event format of Chrome, which chrome://tracing and Perfetto can open. This implies --profile-runner.')
     subparser.add_argument('--print-memory', action='store_true', help='print the amount of memory which your program used, even if it is small enough')
-    subparser.add_argument('--gnu-time', help='used to measure memory consumption (default: "time" on Linux, "gtime" on mac)', default=None)
+    subparser.add_argument('--gnu-time', help='use GNU time to measure memory consumption instead of wait4() (default: not used if wait4() is available, otherwise "time" on Linux and "gtime" on mac)', default=None)
     subparser.add_argument('--no-ignore-backup', action='store_false', dest='ignore_backup')
     subparser.add_argument('--ignore-backup', action='store_true', help='ignore backup files and hidden files (i.e. files like "*~", "\\#*\\#" and ".*") (default)')
+    subparser.add_argument('--manifest', action='store_true', help='make a manifest file in the directory to find cases fast. An existing manifest is always used and updated.')
+    subparser.add_argument('--cache', action='store_true', help='reuse the previous results for cases whose solution, input, expected output and options are unchanged')
+    subparser.add_argument('--no-cache', action='store_false', dest='cache', help='run all cases (default)')
+    subparser.add_argument('--rerun-failed', action='store_true', help='with --cache, reuse only the results of AC and run failed cases again')
+    subparser.add_argument('--report', metavar='FORMAT[:PATH]', type=parse_report_spec, help='write the result of each case to PATH as soon as the case finishes. FORMAT is only "jsonl" (a line of JSON for each case). PATH "-" or no PATH means stdout, and then logs are written to stderr.')
+    subparser.add_argument('--report-outputs', action='store_true', default=True, help='with --report, include the outputs of solutions  (default)')
+    subparser.add_argument('--no-report-outputs', action='store_false', dest='report_outputs', help='with --report, omit the outputs of solutions to keep the memory small for many cases')
     subparser.add_argument('--log-file', type=pathlib.Path, help=argparse.SUPPRESS)
-    subparser.add_argument('--judge-command', dest='judge', default=None, help='specify judge command instead of default diff judge. The given command (e.g. `./judge`) will be called as `$ ./judge input.txt actual-output.txt expected-output.txt` and should return the result with the exit code of its `main` function.')
+    subparser.add_argument('--judge-command', dest='judge', default=None, help='specify judge command instead of default diff judge. The given command (e.g. `./judge`) will be called as `$ ./judge input.txt actual-output.txt expected-output.txt` and should return the result with the exit code of its `main` function. A Python function can be also given as `module:function` (e.g. `judge:check` for `judge.py`). It is called as `check(input, actual_output, expected_output)` with bytes in the same process, and should return False or raise an exception for WA.')
+    subparser.add_argument('--judge-server', action='store_true', help='run the judge command only once and send test cases through its stdin. For each case, the judge reads three lines (paths of the input, the actual output and the expected output, which may be empty) and writes one line which starts with "AC" or "WA".')
+    subparser.add_argument('--judge-timeout', metavar='SECONDS', type=float, default=JUDGE_SERVER_RESPONSE_TIMEOUT, help='with --judge-server, the time to wait for the response to each case. If the judge doesn\'t respond in time, it is killed and restarted, and the case becomes WA.  (default: {0})'.format(JUDGE_SERVER_RESPONSE_TIMEOUT))
     subparser.add_argument('test', nargs='*', type=pathlib.Path, help='paths of test cases. (if empty: globbed from --format)')
 
 
 MEMORY_WARNING = 500  # megabyte
 MEMORY_PRINT = 100  # megabyte
+OUTPUT_SIZE_IN_MEMORY = 16 * 1024 * 1024  # byte. Larger outputs are not kept in memory and --log-file refers them by paths.
 
 
 class DisplayMode(enum.Enum):
@@ -69,83 +104,254 @@ class DisplayMode(enum.Enum):
     DIFF_ALL = 'diff-all'
 
 
+class Executor(enum.Enum):
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+
+class TimeLimitMode(enum.Enum):
+    WALL = 'wall'
+    CPU = 'cpu'
+
+
+class MemoryLimitMode(enum.Enum):
+    MEASURE = 'measure'
+    KILL = 'kill'
+
+
+# In --tle-mode=cpu, solutions which are blocked (e.g. sleep or waiting input) use no CPU time. We kill them with this factor of the wall-clock time.
+WALL_TIME_FACTOR_FOR_CPU_MODE = 3
+
+
+def get_wall_time_limit_for_cpu_mode(tle: float, *, jobs: Optional[int]) -> float:
+    oversubscription = max(1.0, (jobs or 1) / (os.cpu_count() or 1))
+    return tle * WALL_TIME_FACTOR_FOR_CPU_MODE * oversubscription
+
+
 class SpecialJudge:
     def __init__(self, judge_command: str, *, is_silent: bool):
         self.judge_command = judge_command  # already quoted and joined command
         self.is_silent = is_silent
 
-    def run(self, *, actual_output: bytes, input_path: pathlib.Path, expected_output_path: Optional[pathlib.Path]) -> bool:
-        with tempfile.TemporaryDirectory() as tempdir:
-            actual_output_path = pathlib.Path(tempdir) / 'actual.out'
-            with open(actual_output_path, 'wb') as fh:
-                fh.write(actual_output)
-
-            # if you use shlex.quote, it fails on Windows. why?
-            command = ' '.join([
-                self.judge_command,  # already quoted and joined command
-                str(input_path.resolve()),
-                str(actual_output_path.resolve()),
-                str(expected_output_path.resolve() if expected_output_path is not None else ''),
-            ])
-
-            logger.info('$ %s', command)
-            info, proc = utils.exec_command(command)
+    def run(self, *, actual_output_path: pathlib.Path, input_path: pathlib.Path, expected_output_path: Optional[pathlib.Path]) -> bool:
+        # if you use shlex.quote, it fails on Windows. why?
+        command = ' '.join([
+            self.judge_command,  # already quoted and joined command
+            str(input_path.resolve()),
+            str(actual_output_path.resolve()),
+            str(expected_output_path.resolve() if expected_output_path is not None else ''),
+        ])
+
+        logger.info('$ %s', command)
+        info, proc = utils.exec_command(command)
         if not self.is_silent:
             logger.info(utils.NO_HEADER + 'judge\'s output:\n%s', pretty_printers.make_pretty_large_file_content(info['answer'] or b'', limit=40, head=20, tail=10))
         return proc.returncode == 0
 
+    def close(self) -> None:
+        pass
+
+
+# The time to wait for the judge server to exit after its stdin is closed.
+JUDGE_SERVER_SHUTDOWN_TIMEOUT = 5  # second
+
+# The time to wait for the response of the judge server to each case.
+JUDGE_SERVER_RESPONSE_TIMEOUT = 60  # second
+
+
+class SpecialJudgeServer(SpecialJudge):
+    """SpecialJudgeServer runs the judge command only once for all test cases, so the startup of the judge (e.g. the interpreter of Python) is paid only once.
+
+    For each case, the judge reads three lines of paths from its stdin (the input, the actual output and the expected output, which may be an empty line), and writes a line which starts with `AC` or `WA` to its stdout. The rest of the line is printed as the judge's output.
+    """
+    def __init__(self, judge_command: str, *, is_silent: bool, timeout: Optional[float] = JUDGE_SERVER_RESPONSE_TIMEOUT):
+        super().__init__(judge_command, is_silent=is_silent)
+        self.timeout = timeout  # the time to wait for the response to each case
+        self.lock = threading.Lock()  # the judge process judges cases one by one
+        self.proc: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        logger.info('$ %s  (as a server)', self.judge_command)
+        command: Any = shlex.split(self.judge_command)
+        if os.name == 'nt':
+            command = self.judge_command
+        return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=sys.stderr)
+
+    @staticmethod
+    def _kill_for_timeout(proc: subprocess.Popen, is_timed_out: threading.Event) -> None:
+        is_timed_out.set()
+        proc.kill()
+
+    def run(self, *, actual_output_path: pathlib.Path, input_path: pathlib.Path, expected_output_path: Optional[pathlib.Path]) -> bool:
+        request = b''.join([
+            os.fsencode(input_path.resolve()) + b'\n',
+            os.fsencode(actual_output_path.resolve()) + b'\n',
+            (os.fsencode(expected_output_path.resolve()) if expected_output_path is not None else b'') + b'\n',
+        ])
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self.proc = self._start()
+            proc = self.proc
+            assert proc.stdin is not None
+            assert proc.stdout is not None
+            # Killing the judge makes readline() return, so this works also for pipes on Windows, where select() is unusable.
+            is_timed_out = threading.Event()
+            timer = threading.Timer(self.timeout, self._kill_for_timeout, args=(proc, is_timed_out)) if self.timeout is not None else None
+            if timer is not None:
+                timer.start()
+            try:
+                proc.stdin.write(request)
+                proc.stdin.flush()
+                response = proc.stdout.readline()
+            except OSError:  # e.g. BrokenPipeError
+                logger.debug('%s', traceback.format_exc())
+                response = b''
+            finally:
+                if timer is not None:
+                    timer.cancel()
+            if is_timed_out.is_set():
+                proc.wait()
+                self.proc = None  # restart it for the next case
+                if not response.endswith(b'\n'):
+                    logger.error('the judge server does not respond in %s seconds. it is killed and will be restarted', self.timeout)
+                    return False
+            elif not response:
+                logger.error('the judge server exited unexpectedly: return code %s', proc.wait())
+                return False
+
+        verdict, _, message = response.decode(errors='replace').rstrip('\r\n').partition(' ')
+        if message and not self.is_silent:
+            logger.info(utils.NO_HEADER + 'judge\'s output:\n%s', message)
+        if verdict not in ('AC', 'WA'):
+            logger.error('the judge server returned an invalid response: %s', repr(response))
+            return False
+        return verdict == 'AC'
+
+    def close(self) -> None:
+        with self.lock:
+            if self.proc is None:
+                return
+            assert self.proc.stdin is not None
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=JUDGE_SERVER_SHUTDOWN_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                logger.warning('the judge server does not exit. killing it...')
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+
+
+# e.g. "judge:check" and "checkers.geometry:check"
+_JUDGE_FUNCTION_PATTERN = re.compile(r'(?P<module>[A-Za-z_][0-9A-Za-z_]*(\.[A-Za-z_][0-9A-Za-z_]*)*):(?P<function>[A-Za-z_][0-9A-Za-z_]*)')
+
 
-def build_match_function(*, compare_mode: CompareMode, error: Optional[float], judge_command: Optional[str], silent: bool, test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path]) -> Callable[[bytes, bytes], bool]:
-    """build_match_function builds the function to compare actual outputs and expected outputs.
+def parse_judge_function_spec(judge: str) -> Optional[Tuple[str, str]]:
+    """parse_judge_function_spec parses `--judge-command` of the form `module:function`.
+
+    :returns: the pair of the module name and the function name. `None` if it is not a function but a command.
+    """
+
+    match = _JUDGE_FUNCTION_PATTERN.fullmatch(judge)
+    if match is None:
+        return None
+    return match.group('module'), match.group('function')
+
+
+def _add_current_directory_to_module_path() -> None:
+    # modules like judge.py in the current directory are importable, as `python3 -m`
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+
+def find_judge_module_file(module: str) -> Optional[pathlib.Path]:
+    """find_judge_module_file finds the file of the module without executing it.
+    """
+
+    _add_current_directory_to_module_path()
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None or not os.path.isfile(spec.origin):
+        return None
+    return pathlib.Path(spec.origin)
+
+
+class FunctionSpecialJudge(SpecialJudge):
+    """FunctionSpecialJudge calls a Python function given as `module:function` in the same process, instead of running a command for each case.
+
+    The function is called as `function(input, actual_output, expected_output)` with bytes. The expected output is empty if it doesn't exist. This is AC if the function returns True or None (e.g. when it checks with `assert`).
+    """
+    def __init__(self, judge_command: str, *, is_silent: bool):
+        super().__init__(judge_command, is_silent=is_silent)
+        spec = parse_judge_function_spec(judge_command)
+        assert spec is not None
+        module_name, function_name = spec
+        _add_current_directory_to_module_path()
+        module = importlib.import_module(module_name)
+        self.function: Callable[[bytes, bytes, bytes], Any] = getattr(module, function_name)
+
+    def run(self, *, actual_output_path: pathlib.Path, input_path: pathlib.Path, expected_output_path: Optional[pathlib.Path]) -> bool:
+        input_bytes = input_path.read_bytes()
+        actual_output = actual_output_path.read_bytes()
+        expected_output = expected_output_path.read_bytes() if expected_output_path is not None else b''
+        try:
+            result = self.function(input_bytes, actual_output, expected_output)
+        except Exception:  # pylint: disable=broad-except
+            if not self.is_silent:
+                logger.info(utils.NO_HEADER + 'judge\'s output:\n%s', traceback.format_exc())
+            return False
+        return result is None or bool(result)
+
+
+def make_special_judge(args: argparse.Namespace) -> Optional[SpecialJudge]:
+    if args.judge is None:
+        if args.judge_server:
+            logger.warning('--judge-server is ignored without --judge-command')
+        return None
+    if parse_judge_function_spec(args.judge) is not None:
+        if args.judge_server:
+            logger.warning('--judge-server is ignored for a judge function')
+        return FunctionSpecialJudge(args.judge, is_silent=args.silent)
+    if args.judge_server:
+        return SpecialJudgeServer(args.judge, is_silent=args.silent, timeout=args.judge_timeout)
+    return SpecialJudge(args.judge, is_silent=args.silent)
+
+
+def build_match_function(*, compare_mode: CompareMode, error: Optional[float], special_judge: Optional[SpecialJudge], test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path]) -> Callable[[pathlib.Path], ComparisonResult]:
+    """build_match_function builds the function to compare the file of the actual output and the expected output.
 
     This function doesn't any I/O.
     """
 
-    if judge_command is not None:
-        special_judge = SpecialJudge(judge_command=judge_command, is_silent=silent)
+    if special_judge is not None:
 
-        def run_judge_command(actual: bytes, expected: bytes) -> bool:
-            # the second argument is ignored
-            return special_judge.run(
-                actual_output=actual,
+        def run_judge_command(actual_output_path: pathlib.Path) -> ComparisonResult:
+            matched = special_judge.run(
+                actual_output_path=actual_output_path,
                 input_path=test_input_path,
                 expected_output_path=test_output_path,
             )
+            return ComparisonResult(matched=matched)
 
         return run_judge_command
 
-    is_exact = False
-    if compare_mode == CompareMode.EXACT_MATCH and error is None:
-        is_exact = True
-        file_comparator: output_comparators.OutputComparator = output_comparators.ExactComparator()
-    elif compare_mode == CompareMode.CRLF_INSENSITIVE_EXACT_MATCH and error is None:
-        is_exact = True
-        file_comparator = output_comparators.CRLFInsensitiveComparator(output_comparators.ExactComparator())
-    else:
-        if error is not None:
-            word_comparator: output_comparators.OutputComparator = output_comparators.FloatingPointNumberComparator(rel_tol=error, abs_tol=error)
-        else:
-            word_comparator = output_comparators.ExactComparator()
-        if compare_mode in (CompareMode.EXACT_MATCH, CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, CompareMode.IGNORE_SPACES):
-            file_comparator = output_comparators.SplitLinesComparator(output_comparators.SplitComparator(word_comparator))
-        elif compare_mode == CompareMode.IGNORE_SPACES_AND_NEWLINES:
-            file_comparator = output_comparators.SplitComparator(word_comparator)
-        else:
-            assert False
-        file_comparator = output_comparators.CRLFInsensitiveComparator(file_comparator)
-
-    def compare_outputs(actual: bytes, expected: bytes) -> bool:
-        result = file_comparator(actual, expected)
-        if not result and is_exact:
-            non_stcict_comparator = output_comparators.CRLFInsensitiveComparator(output_comparators.SplitComparator(output_comparators.ExactComparator()))
-            if non_stcict_comparator(actual, expected):
-                logger.warning('This was AC if spaces and newlines were ignored. Please use --ignore-spaces (-S) option or --ignore-spaces-and-newline (-N) option.')
-        return result
+    def compare_outputs(actual_output_path: pathlib.Path) -> ComparisonResult:
+        # outputs are compared chunk by chunk, so they are never loaded into memory entirely
+        with open_expected_output(test_output_path) as expected, actual_output_path.open('rb') as actual:
+            return output_comparators.compare_outputs(actual, expected, compare_mode=compare_mode, error=error)
 
     return compare_outputs
 
 
-def run_checking_output(*, answer: bytes, test_output_path: Optional[pathlib.Path], is_special_judge: bool, match_function: Callable[[bytes, bytes], bool]) -> Optional[bool]:
+def open_expected_output(test_output_path: Optional[pathlib.Path]) -> BinaryIO:
+    if test_output_path is None:
+        return io.BytesIO(b'')
+    return test_output_path.open('rb')
+
+
+def run_checking_output(*, output_path: pathlib.Path, test_output_path: Optional[pathlib.Path], is_special_judge: bool, match_function: Callable[[pathlib.Path], ComparisonResult]) -> Optional[ComparisonResult]:
     """run_checking_output executes matching of the actual output and the expected output.
 
     This function has file I/O including the execution of the judge command.
@@ -153,14 +359,10 @@ def run_checking_output(*, answer: bytes, test_output_path: Optional[pathlib.Pat
 
     if test_output_path is None and not is_special_judge:
         return None
-    if test_output_path is not None:
-        with test_output_path.open('rb') as outf:
-            expected = outf.read()
-    else:
+    if test_output_path is None:
         # only if --judge option
-        expected = b''
         logger.warning('expected output is not found')
-    return match_function(answer, expected)
+    return match_function(output_path)
 
 
 class JudgeStatus(enum.Enum):
@@ -171,7 +373,24 @@ class JudgeStatus(enum.Enum):
     MLE = 'MLE'
 
 
-def display_result(proc: subprocess.Popen, answer: str, memory: Optional[float], test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], *, mle: Optional[float], display_mode: DisplayMode, compare_mode: CompareMode, does_print_input: bool, silent: bool, match_result: Optional[bool]) -> JudgeStatus:
+def decide_runtime_status(returncode: Optional[int], *, memory: Optional[float], cpu: Optional[float], cpu_limit: Optional[float], mle: Optional[float], is_killed_by_memory_limit: bool = False) -> JudgeStatus:
+    """decide_runtime_status decides TLE, MLE, RE or not from the execution. This doesn't check outputs.
+
+    :param is_killed_by_memory_limit: whether the solution is killed for --mle-mode=kill
+    """
+
+    if returncode is None or (cpu is not None and cpu_limit is not None and cpu > cpu_limit):
+        return JudgeStatus.TLE
+    if is_killed_by_memory_limit:
+        return JudgeStatus.MLE
+    if memory is not None and mle is not None and memory > mle:
+        return JudgeStatus.MLE
+    if returncode != 0:
+        return JudgeStatus.RE
+    return JudgeStatus.AC
+
+
+def display_result(returncode: Optional[int], output_path: pathlib.Path, memory: Optional[float], test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], *, cpu: Optional[float] = None, cpu_limit: Optional[float] = None, mle: Optional[float], is_killed_by_memory_limit: bool = False, display_mode: DisplayMode, compare_mode: CompareMode, does_print_input: bool, silent: bool, match_result: Optional[ComparisonResult]) -> JudgeStatus:
     """display_result prints the result of the test and its statistics.
 
     This function prints many logs and does some I/O.
@@ -184,109 +403,574 @@ def display_result(proc: subprocess.Popen, answer: str, memory: Optional[float],
         nonlocal is_input_printed
         if does_print_input and not is_input_printed:
             is_input_printed = True
-            with test_input_path.open('rb') as inf:
-                logger.info(utils.NO_HEADER + 'input:\n%s', pretty_printers.make_pretty_large_file_content(inf.read(), limit=40, head=20, tail=10))
+            logger.info(utils.NO_HEADER + 'input:\n%s', pretty_printers.make_pretty_large_file_content_of_file(test_input_path, limit=40, head=20, tail=10))
 
     # check TLE, RE or not
-    status = JudgeStatus.AC
-    if proc.returncode is None:
+    status = decide_runtime_status(returncode, memory=memory, cpu=cpu, cpu_limit=cpu_limit, mle=mle, is_killed_by_memory_limit=is_killed_by_memory_limit)
+    if status == JudgeStatus.TLE:
         logger.info(utils.FAILURE + '' + utils.red('TLE'))
-        status = JudgeStatus.TLE
-        if not silent:
-            print_input()
-    elif memory is not None and mle is not None and memory > mle:
+    elif status == JudgeStatus.MLE and is_killed_by_memory_limit:
+        logger.info(utils.FAILURE + '' + utils.red('MLE') + ': killed by the memory limit')
+    elif status == JudgeStatus.MLE:
         logger.info(utils.FAILURE + '' + utils.red('MLE'))
-        status = JudgeStatus.MLE
-        if not silent:
-            print_input()
-    elif proc.returncode != 0:
-        logger.info(utils.FAILURE + '' + utils.red('RE') + ': return code %d', proc.returncode)
-        status = JudgeStatus.RE
-        if not silent:
-            print_input()
+    elif status == JudgeStatus.RE:
+        logger.info(utils.FAILURE + '' + utils.red('RE') + ': return code %d', returncode)
+    if status != JudgeStatus.AC and not silent:
+        print_input()
 
     # check WA or not
-    if match_result is not None and not match_result:
+    if match_result is not None and not match_result.matched:
         if status == JudgeStatus.AC:
             logger.info(utils.FAILURE + '' + utils.red('WA'))
         status = JudgeStatus.WA
+        if match_result.is_whitespace_only:
+            logger.warning('This was AC if spaces and newlines were ignored. Please use --ignore-spaces (-S) option or --ignore-spaces-and-newline (-N) option.')
         if not silent:
             print_input()
-            if test_output_path is not None:
-                with test_output_path.open('rb') as outf:
-                    expected = outf.read().decode()
-            else:
-                expected = ''
+            if match_result.offset is not None:
+                assert match_result.lineno is not None
+                assert match_result.word_index is not None
+                logger.info(utils.HINT + 'the first difference is at line %d, word %d (byte %d) of the output', match_result.lineno + 1, match_result.word_index + 1, match_result.offset)
             if display_mode == DisplayMode.SUMMARY:
-                logger.info(utils.NO_HEADER + 'output:\n%s', pretty_printers.make_pretty_large_file_content(answer.encode(), limit=40, head=20, tail=10))
-                logger.info(utils.NO_HEADER + 'expected:\n%s', pretty_printers.make_pretty_large_file_content(expected.encode(), limit=40, head=20, tail=10))
-            elif display_mode == DisplayMode.ALL:
-                logger.info(utils.NO_HEADER + 'output:\n%s', pretty_printers.make_pretty_all(answer.encode()))
+                logger.info(utils.NO_HEADER + 'output:\n%s', pretty_printers.make_pretty_large_file_content_of_file(output_path, limit=40, head=20, tail=10))
+                if test_output_path is not None:
+                    logger.info(utils.NO_HEADER + 'expected:\n%s', pretty_printers.make_pretty_large_file_content_of_file(test_output_path, limit=40, head=20, tail=10))
+                else:
+                    logger.info(utils.NO_HEADER + 'expected:\n%s', pretty_printers.make_pretty_large_file_content(b'', limit=40, head=20, tail=10))
+                return status
+
+            with profiling.phase('read outputs'):
+                answer = output_path.read_bytes()
+                if test_output_path is not None:
+                    with test_output_path.open('rb') as outf:
+                        expected = outf.read().decode()
+                else:
+                    expected = ''
+            if display_mode == DisplayMode.ALL:
+                logger.info(utils.NO_HEADER + 'output:\n%s', pretty_printers.make_pretty_all(answer))
                 logger.info(utils.NO_HEADER + 'expected:\n%s', pretty_printers.make_pretty_all(expected.encode()))
             elif display_mode == DisplayMode.DIFF:
-                logger.info(utils.NO_HEADER + pretty_printers.make_pretty_diff(answer.encode(), expected=expected, compare_mode=compare_mode, limit=40))
+                logger.info(utils.NO_HEADER + pretty_printers.make_pretty_diff(answer, expected=expected, compare_mode=compare_mode, limit=40, matched_lines=match_result.lineno or 0))
             elif display_mode == DisplayMode.DIFF_ALL:
-                logger.info(utils.NO_HEADER + pretty_printers.make_pretty_diff(answer.encode(), expected=expected, compare_mode=compare_mode, limit=-1))
+                logger.info(utils.NO_HEADER + pretty_printers.make_pretty_diff(answer, expected=expected, compare_mode=compare_mode, limit=-1, matched_lines=match_result.lineno or 0))
             else:
                 assert False
     if match_result is None:
         if not silent:
             print_input()
-            logger.info(utils.NO_HEADER + 'output:\n%s', pretty_printers.make_pretty_large_file_content(answer.encode(), limit=40, head=20, tail=10))
+            logger.info(utils.NO_HEADER + 'output:\n%s', pretty_printers.make_pretty_large_file_content_of_file(output_path, limit=40, head=20, tail=10))
     if status == JudgeStatus.AC:
         logger.info(utils.SUCCESS + '' + utils.green('AC'))
 
     return status
 
 
-def test_single_case(test_name: str, test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], *, lock: Optional[threading.Lock] = None, args: argparse.Namespace) -> Dict[str, Any]:
-    # print the header earlier if not in parallel
-    if lock is None:
-        logger.info('')
-        logger.info('%s', test_name)
+def display_cached_result(result: Dict[str, Any]) -> None:
+    logger.info('time: %f sec  (cached)', result['elapsed'])
+    if result['status'] == JudgeStatus.AC.value:
+        logger.info(utils.SUCCESS + '' + utils.green('AC'))
+    else:
+        logger.info(utils.FAILURE + '' + utils.red(result['status']))
+
+
+def check_and_display_result(*, returncode: Optional[int], output_path: pathlib.Path, memory: Optional[float], cpu: Optional[float], cpu_limit: Optional[float], is_killed_by_memory_limit: bool, test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], special_judge: Optional[SpecialJudge], args: argparse.Namespace) -> Tuple[JudgeStatus, Optional[ComparisonResult]]:
+    """check_and_display_result is the phase to compare outputs and render results, after running the solution.
+
+    :returns: the status and the result of comparison. The result of comparison is `None` if there is no expected output.
+    """
+
+    match_function = build_match_function(compare_mode=CompareMode(args.compare_mode), error=args.error, special_judge=special_judge, test_input_path=test_input_path, test_output_path=test_output_path)
+    with profiling.phase('compare'):
+        match_result = run_checking_output(output_path=output_path, test_output_path=test_output_path, is_special_judge=args.judge is not None, match_function=match_function)
+    with profiling.phase('render'):
+        status = display_result(returncode, output_path, memory, test_input_path, test_output_path, cpu=cpu, cpu_limit=cpu_limit, mle=args.mle, is_killed_by_memory_limit=is_killed_by_memory_limit, display_mode=DisplayMode(args.display_mode), compare_mode=CompareMode(args.compare_mode), does_print_input=args.print_input, silent=args.silent, match_result=match_result)
+    return status, match_result
+
+
+def check_baseline(*, returncode: Optional[int], is_killed_by_memory_limit: bool, output_path: pathlib.Path, measurements: Dict[str, List[Optional[float]]], target_measurements: Dict[str, List[Optional[float]]], cpu_limit: Optional[float], test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], special_judge: Optional[SpecialJudge], args: argparse.Namespace) -> Dict[str, Any]:
+    """check_baseline checks the output of --compare-command, and compares its time with the time of the solution.
+
+    :param measurements: the measurements of the baseline
+    :param target_measurements: the measurements of the solution, which are paired with `measurements`
+    :returns: the result of the baseline. Its `speedup` is `None` if the time is not measured.
+    """
+
+    elapsed, cpu, memory, statistics = summarize_measurements(measurements)
+    match_function = build_match_function(compare_mode=CompareMode(args.compare_mode), error=args.error, special_judge=special_judge, test_input_path=test_input_path, test_output_path=test_output_path)
+    with profiling.phase('compare'):
+        match_result = run_checking_output(output_path=output_path, test_output_path=test_output_path, is_special_judge=args.judge is not None, match_function=match_function)
+    status = decide_runtime_status(returncode, memory=memory, cpu=cpu, cpu_limit=cpu_limit, mle=args.mle, is_killed_by_memory_limit=is_killed_by_memory_limit)
+    if match_result is not None and not match_result.matched:
+        status = JudgeStatus.WA
+    if status == JudgeStatus.AC:
+        logger.info('baseline: %s  (time: %f sec)', status.value, elapsed)
+    else:
+        logger.warning('baseline: %s  (time: %f sec)', status.value, elapsed)
+
+    # compare the time
+    time_key = 'cpu' if TimeLimitMode(args.tle_mode) == TimeLimitMode.CPU else 'elapsed'
+    baseline_times = measurements[time_key]
+    times = target_measurements[time_key]
+    speedup: Optional[Dict[str, float]] = None
+    if all(value is not None and value > 0 for value in baseline_times + times):
+        speedup = benchmark.compare_speed(cast(List[float], baseline_times), cast(List[float], times))
+        logger.info('speedup: %.3fx  (95%% CI: %.3fx - %.3fx)', speedup['speedup'], speedup['lower'], speedup['upper'])
+
+    result: Dict[str, Any] = {
+        'status': status.value,
+        'exitcode': returncode,
+        'elapsed': elapsed,
+        'cpu': cpu,
+        'memory': memory,
+        'speedup': speedup,
+    }
+    if statistics is not None:
+        result['statistics'] = statistics
+    return result
+
+
+class _RecordingHandler(logging.Handler):
+    """_RecordingHandler keeps logs in worker processes to send them to the main process.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: List[Tuple[str, int, str]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if record.exc_info is not None:
+            message += '\n' + ''.join(traceback.format_exception(*record.exc_info))
+        self.records.append((record.name, record.levelno, message))
+
+
+# These variables are used only in worker processes of make_process_pool().
+_worker_handler: Optional[_RecordingHandler] = None
+_worker_special_judge: Optional[SpecialJudge] = None
+
+
+def _initialize_worker(level: int, args: argparse.Namespace) -> None:
+    global _worker_handler, _worker_special_judge  # pylint: disable=global-statement
+    _worker_handler = _RecordingHandler()
+    logging.basicConfig(level=level, handlers=[_worker_handler], force=True)
+    _worker_special_judge = make_special_judge(args)  # e.g. functions given with --judge-command are imported once for each worker
+    if _worker_special_judge is not None:
+        atexit.register(_worker_special_judge.close)  # e.g. a judge server of --judge-server is stopped when the pool is shut down
+    if args.profile_runner:
+        profiling.enable()
+
+
+def _check_and_display_result_in_worker(case: str, **kwargs: Any) -> Tuple[JudgeStatus, Optional[ComparisonResult], List[Tuple[str, int, str]], List[profiling.Event]]:
+    assert _worker_handler is not None
+    _worker_handler.records = []
+    with profiling.case(case):
+        status, match_result = check_and_display_result(special_judge=_worker_special_judge, **kwargs)
+    profiler = profiling.get_profiler()
+    return status, match_result, _worker_handler.records, (profiler.take_events() if profiler is not None else [])
+
+
+def make_process_pool(*, max_workers: int, args: argparse.Namespace) -> concurrent.futures.ProcessPoolExecutor:
+    """make_process_pool makes the pool of `--executor=process`. Special judges are also made in each worker, and closed when the worker exits.
+    """
+
+    # use "spawn" because forking processes with threads is unsafe
+    context = multiprocessing.get_context('spawn')
+    return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_initialize_worker, initargs=(logging.getLogger().getEffectiveLevel(), args))
+
+
+MEASUREMENT_KEYS = ('elapsed', 'cpu', 'memory')
+
+
+def parse_cpu_list(s: str) -> List[int]:
+    """parse_cpu_list parses a list of CPUs in the format of `taskset --cpu-list`, e.g. `0-3,8,10-11`.
+    """
+
+    cpus: List[int] = []
+    for item in s.split(','):
+        match = re.fullmatch(r'\s*(\d+)\s*(?:-\s*(\d+)\s*)?', item)
+        if match is None:
+            raise argparse.ArgumentTypeError('invalid list of CPUs: {}'.format(s))
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) is not None else first
+        if first > last:
+            raise argparse.ArgumentTypeError('invalid range of CPUs: {}'.format(item.strip()))
+        cpus += range(first, last + 1)
+    return sorted(set(cpus))
+
+
+def _get_thread_siblings(cpu: int) -> Set[int]:
+    path = pathlib.Path('/sys/devices/system/cpu/cpu{}/topology/thread_siblings_list'.format(cpu))
+    try:
+        return set(parse_cpu_list(path.read_text()))
+    except (OSError, argparse.ArgumentTypeError):
+        return set()
+
+
+def select_isolated_cpus(cpus: List[int]) -> List[int]:
+    """select_isolated_cpus selects CPUs for --isolate. For each selected CPU, the next CPU and its hyper-threading siblings are left unused.
+    """
+
+    selected: List[int] = []
+    used: Set[int] = set()
+    for cpu in sorted(cpus):
+        if cpu in used:
+            continue
+        selected.append(cpu)
+        used |= {cpu, cpu + 1} | _get_thread_siblings(cpu)
+    return selected
+
+
+class CPUSlots:
+    """CPUSlots lends dedicated CPUs to running cases for --pin.
+    """
+    def __init__(self, cpus: List[int]):
+        self._queue: 'queue.Queue[int]' = queue.Queue()
+        for cpu in cpus:
+            self._queue.put(cpu)
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[int]:
+        """acquire waits for a free CPU and lends it.
+        """
+
+        cpu = self._queue.get()
+        try:
+            yield cpu
+        finally:
+            self._queue.put(cpu)
+
+
+def make_cpu_slots(args: argparse.Namespace) -> Optional[CPUSlots]:
+    """make_cpu_slots checks --cpus, --pin and --isolate, and makes the CPUs for --pin.
+
+    :raises RuntimeError: if the options are unavailable
+    """
+
+    if args.isolate:
+        args.pin = True
+    if args.cpus is None and not args.pin:
+        return None
+    if not hasattr(os, 'sched_setaffinity'):
+        raise RuntimeError('--cpus, --pin and --isolate are available only on Linux')
+    available = os.sched_getaffinity(0)  # pylint: disable=no-member
+    if args.cpus is None:
+        args.cpus = sorted(available)
+    unavailable = sorted(set(args.cpus) - available)
+    if unavailable:
+        raise RuntimeError('CPUs are not available: {}'.format(', '.join(map(str, unavailable))))
+    if not args.pin:
+        return None
+
+    cpus = select_isolated_cpus(args.cpus) if args.isolate else args.cpus
+    logger.debug('CPUs for --pin: %s', cpus)
+    if args.jobs is not None and len(cpus) < args.jobs:
+        logger.warning('only %d CPUs are available for %d jobs. Cases wait for free CPUs.', len(cpus), args.jobs)
+    return CPUSlots(cpus)
+
+
+def parse_report_spec(s: str) -> Tuple[str, str]:
+    """parse_report_spec parses the value of --report, e.g. `jsonl:result.jsonl`.
+
+    :returns: the format and the path. The path `-` means stdout.
+    """
+
+    report_format, _, path = s.partition(':')
+    if report_format != 'jsonl':
+        raise argparse.ArgumentTypeError('unknown format of report: {}'.format(report_format))
+    return report_format, path or '-'
+
+
+class JSONLinesReporter:
+    """JSONLinesReporter writes a compact line of JSON for each case as soon as the case finishes, so other programs can watch long tests.
+    """
+    def __init__(self, fh: TextIO, *, with_outputs: bool, is_owned: bool):
+        """
+        :param is_owned: close `fh` with `close()`. This is `False` for stdout.
+        """
+
+        self.fh = fh
+        self.with_outputs = with_outputs
+        self.is_owned = is_owned
+        self.lock = threading.Lock()
+
+    def report(self, result: Dict[str, Any], *, cached: bool) -> None:
+        record = make_report_record(result, with_outputs=self.with_outputs, cached=cached)
+        line = json.dumps(record, separators=(',', ':'))
+        with self.lock:
+            self.fh.write(line + '\n')
+            self.fh.flush()
+
+    def close(self) -> None:
+        if self.is_owned:
+            self.fh.close()
+
+
+def open_reporter(spec: Tuple[str, str], *, with_outputs: bool) -> JSONLinesReporter:
+    _, path = spec
+    if path == '-':
+        return JSONLinesReporter(sys.stdout, with_outputs=with_outputs, is_owned=False)
+    return JSONLinesReporter(open(path, 'w'), with_outputs=with_outputs, is_owned=True)  # pylint: disable=consider-using-with
+
+
+def make_report_record(result: Dict[str, Any], *, with_outputs: bool, cached: bool) -> Dict[str, Any]:
+    """make_report_record makes a record of --report from a result. Sizes are in bytes, and the positions of `first_mismatch` are 0-based.
+    """
+
+    testcase = result['testcase']
+    record: Dict[str, Any] = {
+        'name': testcase['name'],
+        'status': result['status'],
+        'exitcode': result['exitcode'],
+        'elapsed': result['elapsed'],
+        'cpu': result['cpu'],
+        'memory': result['memory'],
+        'input': testcase['input'],
+        'input_size': pathlib.Path(testcase['input']).stat().st_size,
+        'expected': testcase.get('output'),
+        'expected_size': pathlib.Path(testcase['output']).stat().st_size if 'output' in testcase else None,
+        'output_size': result.get('output_size'),
+        'output_path': result.get('output_path'),
+        'first_mismatch': result.get('first_mismatch'),
+        'cached': cached,
+    }
+    if with_outputs:
+        record['output'] = result['output']
+    return record
+
+
+def run_solution(command: str, *, test_input_path: pathlib.Path, output_dir: Optional[pathlib.Path], timeout: Optional[float], cpu_limit: Optional[float], cpus: Optional[List[int]], processes: Optional[utils.RunningProcesses], args: argparse.Namespace) -> Tuple[Dict[str, Any], subprocess.Popen, pathlib.Path]:
+    """run_solution runs the command once with the input of a case.
+
+    :returns: the measurements, the finished process, and the path of the output file. The caller must remove the file.
+    """
 
-    # run the binary
     with test_input_path.open('rb') as inf:
-        info, proc = utils.exec_command(args.command, stdin=inf, timeout=args.tle, gnu_time=args.gnu_time)
-        # TODO: the `answer` should be bytes, not str
-        answer: str = (info['answer'] or b'').decode(errors='replace')
-        elapsed: float = info['elapsed']
-        memory: Optional[float] = info['memory']
-
-    # lock is required to avoid mixing logs if in parallel
-    nullcontext = contextlib.nullcontext()
-    with lock or nullcontext:
-        if lock is not None:
+        with tempfile.NamedTemporaryFile(dir=output_dir, prefix='output-', suffix='.txt', delete=False) as outf:
+            info, proc = utils.exec_command(command, stdin=inf, timeout=timeout, gnu_time=args.gnu_time, cpu_limit=cpu_limit, cpus=cpus, memory_limit=args.mle if MemoryLimitMode(args.mle_mode) == MemoryLimitMode.KILL else None, processes=processes, stdout=outf)
+    return info, proc, pathlib.Path(outf.name)
+
+
+def summarize_measurements(measurements: Dict[str, List[Optional[float]]]) -> Tuple[float, Optional[float], Optional[float], Optional[Dict[str, Dict[str, float]]]]:
+    """summarize_measurements summarizes the measurements of repeated runs of a case.
+
+    :param measurements: a dict from `MEASUREMENT_KEYS` to values of runs. Values may be `None` if they are not measured.
+    :returns: medians of elapsed time, CPU time and memory, and their statistics. The statistics are `None` for a single run.
+    """
+
+    medians: Dict[str, Optional[float]] = {}
+    statistics: Dict[str, Dict[str, float]] = {}
+    for key in MEASUREMENT_KEYS:
+        values = measurements[key]
+        if not values or any(value is None for value in values):
+            medians[key] = None
+            continue
+        summary = benchmark.summarize(cast(List[float], values))
+        medians[key] = summary['median']
+        statistics[key] = summary
+    elapsed = medians['elapsed']
+    assert elapsed is not None
+    if len(measurements['elapsed']) == 1:
+        return elapsed, medians['cpu'], medians['memory'], None
+    return elapsed, medians['cpu'], medians['memory'], statistics
+
+
+def test_single_case(test_name: str, test_input_path: pathlib.Path, test_output_path: Optional[pathlib.Path], *, lock: Optional[threading.Lock] = None, cache: Optional[result_cache.ResultCache] = None, processes: Optional[utils.RunningProcesses] = None, output_dir: Optional[pathlib.Path] = None, special_judge: Optional[SpecialJudge] = None, process_pool: Optional[concurrent.futures.Executor] = None, cpu_slots: Optional[CPUSlots] = None, reporter: Optional['JSONLinesReporter'] = None, case_index: int = 0, args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    """
+    :param output_dir: the directory to keep large outputs. If this is `None`, large outputs are not kept.
+    :param process_pool: the pool to compare outputs and render results. The pool must be made with `make_process_pool`.
+    :param cpu_slots: the CPUs for --pin
+    :param reporter: the destination of --report. The result is written as soon as it is decided.
+    :param case_index: the index of the case in the sorted cases. With --compare-command, which solution runs first alternates also between cases.
+    :returns: the result. `None` if the test is stopped by --fail-fast.
+    """
+
+    with profiling.case(test_name):
+        # print the header earlier if not in parallel
+        if lock is None:
             logger.info('')
             logger.info('%s', test_name)
-        logger.info('time: %f sec', elapsed)
-        if memory:
-            if memory < MEMORY_PRINT:
-                if args.print_memory:
-                    logger.info('memory: %f MB', memory)
-            elif memory < MEMORY_WARNING:
-                logger.info('memory: %f MB', memory)
+
+        testcase = {
+            'name': test_name,
+            'input': str(test_input_path.resolve()),
+        }
+        if test_output_path:
+            testcase['output'] = str(test_output_path.resolve())
+
+        # reuse the previous result if possible
+        nullcontext = contextlib.nullcontext()
+        cache_key: Optional[str] = None
+        if cache is not None:
+            with profiling.phase('cache'):
+                cache_key = cache.make_key(input_path=test_input_path, output_path=test_output_path)
+                cached = cache.get(cache_key)
+            if cached is not None and (cached['status'] == JudgeStatus.AC.value or not args.rerun_failed):
+                with lock or nullcontext:
+                    if lock is not None:
+                        logger.info('')
+                        logger.info('%s', test_name)
+                    display_cached_result(cached)
+                if reporter is not None:
+                    reporter.report({**cached, 'testcase': testcase}, cached=True)
+                return {**cached, 'testcase': testcase}
+
+        # decide the time limits
+        timeout: Optional[float] = args.tle
+        cpu_limit: Optional[float] = None
+        if args.tle is not None and TimeLimitMode(args.tle_mode) == TimeLimitMode.CPU:
+            timeout = get_wall_time_limit_for_cpu_mode(args.tle, jobs=args.jobs)
+            cpu_limit = args.tle
+
+        # run the binary. The output is directly written to a file instead of being buffered through a pipe in memory.
+        # With --repeat and --warmup, the binary is run repeatedly and only the output of the last run is kept. Repeating stops at the first failed run.
+        # With --compare-command, the baseline is also run in turn. Which runs first alternates between runs and between cases, to make the noise of the machine affect both equally even without --repeat.
+        # With --pin, a dedicated CPU is borrowed during the runs.
+        with cpu_slots.acquire() if cpu_slots is not None else nullcontext as pinned_cpu:
+            cpus: Optional[List[int]] = args.cpus if pinned_cpu is None else [pinned_cpu]
+            commands = [args.command] if args.compare_command is None else [args.command, args.compare_command]
+            measurements: List[Dict[str, List[Optional[float]]]] = [{key: [] for key in MEASUREMENT_KEYS} for _ in commands]
+            runs: Dict[int, Tuple[Dict[str, Any], subprocess.Popen, pathlib.Path]] = {}
+            for i in range(args.warmup + args.repeat):
+                for _, _, path in runs.values():
+                    path.unlink()
+                runs = {}
+                for j in (range(len(commands)) if (i + case_index) % 2 == 0 else reversed(range(len(commands)))):
+                    runs[j] = run_solution(commands[j], test_input_path=test_input_path, output_dir=output_dir, timeout=timeout, cpu_limit=cpu_limit, cpus=cpus, processes=processes, args=args)
+                    if processes is not None and processes.stopped:
+                        for _, _, path in runs.values():
+                            path.unlink()
+                        return None  # the result is meaningless because the process may be killed
+                is_last = i + 1 == args.warmup + args.repeat or any(info['returncode'] != 0 for info, _, _ in runs.values())
+                if i >= args.warmup or is_last:
+                    for j, (info, _, _) in runs.items():
+                        for key in MEASUREMENT_KEYS:
+                            measurements[j][key].append(info[key])
+                if is_last:
+                    break
+        info, _, output_path = runs[0]
+        elapsed, cpu, memory, statistics = summarize_measurements(measurements[0])
+
+        # keep only large outputs as files
+        is_output_kept = output_dir is not None and output_path.stat().st_size > OUTPUT_SIZE_IN_MEMORY
+
+        # compare and render in another process without the lock, and print the rendered logs later
+        records: Optional[List[Tuple[str, int, str]]] = None
+        if process_pool is not None:
+            future = process_pool.submit(_check_and_display_result_in_worker, test_name, returncode=info['returncode'], output_path=output_path, memory=memory, cpu=cpu, cpu_limit=cpu_limit, is_killed_by_memory_limit=info['killed_by_memory_limit'], test_input_path=test_input_path, test_output_path=test_output_path, args=args)
+            with profiling.phase('wait for worker'):
+                status, match_result, records, events = future.result()
+            profiler = profiling.get_profiler()
+            if profiler is not None:
+                profiler.extend(events)
+
+        # lock is required to avoid mixing logs if in parallel
+        with lock or nullcontext:
+            with profiling.phase('log'):
+                if lock is not None:
+                    logger.info('')
+                    logger.info('%s', test_name)
+                if cpu is not None:
+                    logger.info('time: %f sec  (cpu: %f sec)', elapsed, cpu)
+                else:
+                    logger.info('time: %f sec', elapsed)
+                if statistics is not None:
+                    logger.info('%d runs: min %f sec, median %f sec, mean %f sec, p95 %f sec, stddev %f sec', statistics['elapsed']['count'], statistics['elapsed']['min'], statistics['elapsed']['median'], statistics['elapsed']['mean'], statistics['elapsed']['p95'], statistics['elapsed']['stddev'])
+                if memory:
+                    if memory < MEMORY_PRINT:
+                        if args.print_memory:
+                            logger.info('memory: %f MB', memory)
+                    elif memory < MEMORY_WARNING:
+                        logger.info('memory: %f MB', memory)
+                    else:
+                        logger.warning('memory: %f MB', memory)
+
+            if records is None:
+                status, match_result = check_and_display_result(returncode=info['returncode'], output_path=output_path, memory=memory, cpu=cpu, cpu_limit=cpu_limit, is_killed_by_memory_limit=info['killed_by_memory_limit'], test_input_path=test_input_path, test_output_path=test_output_path, special_judge=special_judge, args=args)
             else:
-                logger.warning('memory: %f MB', memory)
+                with profiling.phase('log'):
+                    for name, level, message in records:
+                        getLogger(name).log(level, '%s', message)
 
-        match_function = build_match_function(compare_mode=CompareMode(args.compare_mode), error=args.error, judge_command=args.judge, silent=args.silent, test_input_path=test_input_path, test_output_path=test_output_path)
-        match_result = run_checking_output(answer=answer.encode(), test_output_path=test_output_path, is_special_judge=args.judge is not None, match_function=match_function)
-        status = display_result(proc, answer, memory, test_input_path, test_output_path, mle=args.mle, display_mode=DisplayMode(args.display_mode), compare_mode=CompareMode(args.compare_mode), does_print_input=args.print_input, silent=args.silent, match_result=match_result)
+            baseline: Optional[Dict[str, Any]] = None
+            if 1 in runs:
+                baseline_info, _, baseline_output_path = runs[1]
+                baseline = check_baseline(returncode=baseline_info['returncode'], is_killed_by_memory_limit=baseline_info['killed_by_memory_limit'], output_path=baseline_output_path, measurements=measurements[1], target_measurements=measurements[0], cpu_limit=cpu_limit, test_input_path=test_input_path, test_output_path=test_output_path, special_judge=special_judge, args=args)
+                baseline_output_path.unlink()
+
+        # return the result. Small outputs are read into memory only if they are used, to keep the memory small for many cases.
+        # The cache keeps only the hash of the output, because outputs may be large.
+        answer: Optional[str] = None
+        output_size = output_path.stat().st_size
+        output_sha256: Optional[str] = None
+        if cache is not None and cache_key is not None:
+            with profiling.phase('cache'):
+                output_sha256 = result_cache.hash_file(output_path)
+        if not is_output_kept:
+            if args.log_file is not None or (reporter is not None and reporter.with_outputs):
+                answer = output_path.read_bytes().decode(errors='replace')
+            output_path.unlink()
+        result: Dict[str, Any] = {
+            'status': status.value,
+            'testcase': testcase,
+            'output': answer,
+            'output_size': output_size,
+            'exitcode': info['returncode'],
+            'elapsed': elapsed,
+            'cpu': cpu,
+            'memory': memory,
+        }
+        if match_result is not None and match_result.offset is not None:
+            result['first_mismatch'] = {'offset': match_result.offset, 'lineno': match_result.lineno, 'word_index': match_result.word_index}
+        if status == JudgeStatus.MLE:
+            result['mle_reason'] = 'killed' if info['killed_by_memory_limit'] else 'exceeded'
+        if statistics is not None:
+            result['statistics'] = statistics
+        if baseline is not None:
+            result['baseline'] = baseline
+        if cpus is not None:
+            result['cpus'] = cpus
+        if is_output_kept:
+            result['output_path'] = str(output_path)
+        if cache is not None and cache_key is not None:
+            try:
+                with profiling.phase('cache'):
+                    cache.put(cache_key, {**{key: value for key, value in result.items() if key not in ('testcase', 'output', 'output_path')}, 'output': None, 'output_sha256': output_sha256})
+            except OSError as e:
+                logger.warning('failed to store the result to the cache: %s', e)
+        if reporter is not None:
+            reporter.report(result, cached=False)
+        return result
+
+
+def hash_judge_files(judge: str) -> Dict[str, str]:
+    spec = parse_judge_function_spec(judge)
+    if spec is None:
+        return result_cache.hash_files_in_command(judge)
+    path = find_judge_module_file(spec[0])
+    if path is None:
+        return {}
+    return {str(path): result_cache.hash_file(path)}
+
+
+def make_result_cache_config(args: argparse.Namespace) -> Dict[str, Any]:
+    """make_result_cache_config collects everything except test cases which may change the results of tests.
+    """
 
-    # return the result
-    testcase = {
-        'name': test_name,
-        'input': str(test_input_path.resolve()),
-    }
-    if test_output_path:
-        testcase['output'] = str(test_output_path.resolve())
     return {
-        'status': status.value,
-        'testcase': testcase,
-        'output': answer,
-        'exitcode': proc.returncode,
-        'elapsed': elapsed,
-        'memory': memory,
+        'command': args.command,
+        'command_files': result_cache.hash_files_in_command(args.command),
+        'judge': args.judge,
+        'judge_files': hash_judge_files(args.judge) if args.judge is not None else {},
+        'compare_mode': args.compare_mode,
+        'error': args.error,
+        'tle': args.tle,
+        'tle_mode': args.tle_mode,
+        'jobs': args.jobs if TimeLimitMode(args.tle_mode) == TimeLimitMode.CPU else None,  # the wall-time limit for --tle-mode cpu depends on --jobs
+        'mle': args.mle,
+        'mle_mode': args.mle_mode,
+        'gnu_time': args.gnu_time,  # how memory is measured
+        'cpus': args.cpus,  # the CPUs change the time, e.g. with other jobs on the same CPU
+        'pin': args.pin,
+        'isolate': args.isolate,
     }
 
 
@@ -307,45 +991,176 @@ def check_gnu_time(gnu_time: str) -> bool:
     return False
 
 
-def run(args: 'argparse.Namespace') -> int:
-    # list tests
-    if not args.test:
-        args.test = fmtutils.glob_with_format(args.directory, args.format)  # by default
-    if args.ignore_backup:
-        args.test = fmtutils.drop_backup_or_hidden_files(args.test)
-    tests = fmtutils.construct_relationship_of_files(args.test, args.directory, args.format)
-
-    # check wheather GNU time is available
-    if args.gnu_time is None:
-        if platform.system() == 'Darwin':
-            args.gnu_time = 'gtime'
-        else:
-            args.gnu_time = 'time'
-    if not check_gnu_time(args.gnu_time):
-        logger.warning('GNU time is not available: %s', args.gnu_time)
-        if platform.system() == 'Darwin':
-            logger.info(utils.HINT + 'You can install GNU time with: $ brew install gnu-time')
-        args.gnu_time = None
-    if args.mle is not None and args.gnu_time is None:
-        raise RuntimeError('--mle is used but GNU time does not exist')
-
-    # run tests
+def run_test_cases(tests: Dict[str, Dict[str, pathlib.Path]], *, cache: Optional[result_cache.ResultCache], output_dir: pathlib.Path, special_judge: Optional[SpecialJudge], cpu_slots: Optional[CPUSlots], reporter: Optional['JSONLinesReporter'], args: argparse.Namespace) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """
+    :returns: the results sorted by names, the number of failures, and whether the test is stopped by --fail-fast
+    """
+
     history: List[Dict[str, Any]] = []
+    failure_count = 0
+    is_stopped = False
     if args.jobs is None:
-        for name, paths in sorted(tests.items()):
-            history += [test_single_case(name, paths['in'], paths.get('out'), args=args)]
+        if Executor(args.executor) == Executor.PROCESS:
+            logger.warning('--executor=process is ignored without --jobs')
+        for case_index, (name, paths) in enumerate(sorted(tests.items())):
+            result = test_single_case(name, paths['in'], paths.get('out'), cache=cache, output_dir=output_dir, special_judge=special_judge, cpu_slots=cpu_slots, reporter=reporter, case_index=case_index, args=args)
+            assert result is not None
+            history += [result]
+            if result['status'] != JudgeStatus.AC.value:
+                failure_count += 1
+                if args.fail_fast is not None and failure_count >= args.fail_fast:
+                    is_stopped = True
+                    break
     else:
         if os.name == 'nt':
             logger.warning("-j/--jobs option is unstable on Windows environment")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        # Start the cases which are predicted to be slow first. This shortens the total time (LPT scheduling).
+        elapsed_history = elapsed_time_history.ElapsedTimeHistory()
+        sizes = {name: paths['in'].stat().st_size for name, paths in tests.items()}
+        order = elapsed_time_history.sort_longest_first(sizes, records=elapsed_history.get(directory=args.directory))
+        processes = utils.RunningProcesses()
+        with contextlib.ExitStack() as stack, concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+            if Executor(args.executor) == Executor.PROCESS:
+                process_pool = stack.enter_context(make_process_pool(max_workers=args.jobs, args=args))
             lock = threading.Lock()
-            futures: List[concurrent.futures.Future] = []
-            for name, paths in sorted(tests.items()):
-                futures += [executor.submit(test_single_case, name, paths['in'], paths.get('out'), lock=lock, args=args)]
-            for future in futures:
-                history += [future.result()]
+            futures: Dict[str, concurrent.futures.Future] = {}
+            case_indices = {name: case_index for case_index, name in enumerate(sorted(tests.keys()))}
+            for name in order:
+                paths = tests[name]
+                futures[name] = executor.submit(test_single_case, name, paths['in'], paths.get('out'), lock=lock, cache=cache, processes=processes, output_dir=output_dir, special_judge=special_judge, process_pool=process_pool, cpu_slots=cpu_slots, reporter=reporter, case_index=case_indices[name], args=args)
+            if args.fail_fast is not None:
+                for future in concurrent.futures.as_completed(futures.values()):
+                    result = future.result()
+                    if result is not None and result['status'] != JudgeStatus.AC.value:
+                        failure_count += 1
+                        if failure_count >= args.fail_fast:
+                            # cancel queued cases and kill running cases without waiting --tle
+                            is_stopped = True
+                            for queued in futures.values():
+                                queued.cancel()
+                            processes.kill_all()
+                            break
+            for name in sorted(tests.keys()):
+                if futures[name].cancelled():
+                    continue
+                result = futures[name].result()
+                if result is not None:
+                    history += [result]
+        try:
+            elapsed_history.update({result['testcase']['name']: {'elapsed': result['elapsed'], 'size': sizes[result['testcase']['name']]} for result in history}, directory=args.directory, names=tests.keys())
+        except OSError as e:
+            logger.warning('failed to update the history of elapsed time: %s', e)
+
+    return history, failure_count, is_stopped
+
+
+def make_statistics_table(history: List[Dict[str, Any]], *, time_key: str) -> List[str]:
+    """make_statistics_table makes the lines of a table of the statistics of time for --repeat.
+    """
+
+    columns = ['min', 'median', 'mean', 'p95', 'stddev']
+    unit = 'sec of CPU time' if time_key == 'cpu' else 'sec'
+    rows = [['case'] + columns]
+    for result in sorted(history, key=lambda result: result['testcase']['name']):
+        statistics = result.get('statistics', {}).get(time_key)
+        if statistics is None:
+            rows.append([result['testcase']['name']] + ['-'] * len(columns))
+        else:
+            rows.append([result['testcase']['name']] + ['{:.6f}'.format(statistics[column]) for column in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ['statistics of time ({}):'.format(unit)]
+    for row in rows:
+        lines.append('  '.join([row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]).rstrip())
+    return lines
+
+
+def run(args: 'argparse.Namespace') -> int:
+    if args.repeat < 1:
+        logger.error('--repeat must be positive: %d', args.repeat)
+        return 1
+    if args.warmup < 0:
+        logger.error('--warmup must be non-negative: %d', args.warmup)
+        return 1
+
+    if args.profile_runner_trace is not None:
+        args.profile_runner = True
+    if args.profile_runner:
+        profiling.enable()  # usually already enabled by main() to include the update check
+
+    # list tests
+    manifest: Optional[manifestutils.Manifest] = None
+    with profiling.phase('glob'):
+        if not args.test and args.ignore_backup:
+            manifest = manifestutils.open_manifest(args.directory, args.format, create=args.manifest)
+        if manifest is not None:
+            tests = manifest.get_test_cases()
+            manifest.save()
+        elif not args.test:
+            tests = fmtutils.find_test_cases(args.directory, args.format, ignore_backup=args.ignore_backup)  # by default
+        else:
+            if args.ignore_backup:
+                args.test = fmtutils.drop_backup_or_hidden_files(args.test)
+            tests = fmtutils.construct_relationship_of_files(args.test, args.directory, args.format)
+
+    # check wheather GNU time is available. We don't need it if wait4() is available.
+    if args.gnu_time is None and utils.is_wait4_available():
+        logger.debug('use wait4() to measure memory consumption')
+    else:
+        if args.gnu_time is None:
+            if platform.system() == 'Darwin':
+                args.gnu_time = 'gtime'
+            else:
+                args.gnu_time = 'time'
+        with profiling.phase('check GNU time'):
+            is_gnu_time_available = check_gnu_time(args.gnu_time)
+        if not is_gnu_time_available:
+            logger.warning('GNU time is not available: %s', args.gnu_time)
+            if platform.system() == 'Darwin':
+                logger.info(utils.HINT + 'You can install GNU time with: $ brew install gnu-time')
+            args.gnu_time = None
+        if args.mle is not None and args.gnu_time is None:
+            raise RuntimeError('--mle is used but GNU time does not exist')
+        if TimeLimitMode(args.tle_mode) == TimeLimitMode.CPU and args.gnu_time is None:
+            raise RuntimeError('--tle-mode=cpu is used but GNU time does not exist')
+    if MemoryLimitMode(args.mle_mode) == MemoryLimitMode.KILL:
+        if args.mle is None:
+            raise RuntimeError('--mle-mode=kill is used but --mle is not given')
+        if not utils.is_memory_watching_available():
+            raise RuntimeError('--mle-mode=kill is available only on Linux')
+
+    # prepare CPUs
+    cpu_slots = make_cpu_slots(args)
+
+    # prepare the cache of results
+    cache: Optional[result_cache.ResultCache] = None
+    if args.cache and (args.repeat >= 2 or args.compare_command is not None):
+        logger.warning('--cache is ignored with --repeat or --compare-command because cached results have no measurements to repeat or compare')
+    elif args.cache:
+        if manifest is not None:
+            cache = result_cache.ResultCache(config=make_result_cache_config(args), file_hasher=manifest.hash_file)
+        else:
+            cache = result_cache.ResultCache(config=make_result_cache_config(args))
+
+    # run tests. Large outputs are kept in a temporary directory.
+    special_judge = make_special_judge(args)
+    reporter = open_reporter(args.report, with_outputs=args.report_outputs) if args.report is not None else None
+    output_dir = pathlib.Path(tempfile.mkdtemp(prefix='oj-test-'))
+    try:
+        history, failure_count, is_stopped = run_test_cases(tests, cache=cache, output_dir=output_dir, special_judge=special_judge, cpu_slots=cpu_slots, reporter=reporter, args=args)
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    finally:
+        if special_judge is not None:
+            special_judge.close()
+        if reporter is not None:
+            reporter.close()
+        if manifest is not None:
+            manifest.save()  # for hashes computed by the cache
 
     # summarize
+    time_key = 'cpu' if TimeLimitMode(args.tle_mode) == TimeLimitMode.CPU else 'elapsed'
     slowest: float = -1.0
     slowest_name = ''
     heaviest: float = -1.0
@@ -354,8 +1169,8 @@ def run(args: 'argparse.Namespace') -> int:
     for result in history:
         if result['status'] == 'AC':
             ac_count += 1
-        if slowest < result['elapsed']:
-            slowest = result['elapsed']
+        if result[time_key] is not None and slowest < result[time_key]:
+            slowest = result[time_key]
             slowest_name = result['testcase']['name']
         if result['memory'] is not None and heaviest < result['memory']:
             heaviest = result['memory']
@@ -363,12 +1178,28 @@ def run(args: 'argparse.Namespace') -> int:
 
     # print the summary
     logger.info('')
-    logger.info('slowest: %f sec  (for %s)', slowest, slowest_name)
+    if args.repeat >= 2:
+        for line in make_statistics_table(history, time_key=time_key):
+            logger.info('%s', line)
+    elif time_key == 'cpu':
+        logger.info('slowest: %f sec of CPU time  (for %s)', slowest, slowest_name)
+    else:
+        logger.info('slowest: %f sec  (for %s)', slowest, slowest_name)
+    if args.compare_command is not None:
+        speedups = [result['baseline']['speedup']['speedup'] for result in history if result['baseline']['speedup'] is not None]
+        baseline_failure_count = sum(1 for result in history if result['baseline']['status'] != JudgeStatus.AC.value)
+        if speedups:
+            speedup = benchmark.summarize_speedups(speedups)
+            logger.info('speedup: %.3fx  (95%% CI: %.3fx - %.3fx, geometric mean of %d cases)', speedup['speedup'], speedup['lower'], speedup['upper'], len(speedups))
+        if baseline_failure_count:
+            logger.warning('the baseline failed on %d cases', baseline_failure_count)
     if heaviest >= 0:
         if heaviest < MEMORY_WARNING:
             logger.info('max memory: %f MB  (for %s)', heaviest, heaviest_name)
         else:
             logger.warning('max memory: %f MB  (for %s)', heaviest, heaviest_name)
+    if is_stopped:
+        logger.info('stopped after %d failures: %d cases are skipped', failure_count, len(tests) - len(history))
     if ac_count == len(tests):
         logger.info(utils.SUCCESS + 'test ' + utils.green('success') + ': %d cases', len(tests))
     else:
@@ -377,6 +1208,22 @@ def run(args: 'argparse.Namespace') -> int:
     if args.log_file:
         with args.log_file.open(mode='w') as fh:
             json.dump(history, fh)
+    if (args.log_file or args.report) and any('output_path' in result for result in history):
+        logger.info('large outputs are kept in: %s', output_dir)
+    else:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    # print the time of oj itself
+    profiler = profiling.get_profiler()
+    if args.profile_runner and profiler is not None:
+        events = profiler.get_events()
+        logger.info('')
+        for line in profiling.make_summary_table(events):
+            logger.info('%s', line)
+        if args.profile_runner_trace is not None:
+            with args.profile_runner_trace.open('w') as fh:
+                json.dump(profiling.make_chrome_trace(events, origin=profiler.origin), fh)
+            logger.info('the trace of oj itself is written to: %s', args.profile_runner_trace)
 
     # return the result
     return ac_count == len(tests)
@@ -2,6 +2,7 @@ import contextlib
 import datetime
 import functools
 import http.cookiejar
+import math
 import os
 import pathlib
 import platform
@@ -10,6 +11,7 @@ import signal
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import webbrowser
 from logging import getLogger
@@ -22,6 +24,7 @@ import requests
 import onlinejudge_command.__about__ as version
 from onlinejudge import utils
 from onlinejudge.type import *
+from onlinejudge_command import profiling
 
 logger = getLogger(__name__)
 
@@ -58,10 +61,241 @@ def textfile(s: str) -> str:  # should have trailing newline
         return s + '\n'
 
 
-def exec_command(command_str: str, *, stdin: Optional[BinaryIO] = None, input: Optional[bytes] = None, timeout: Optional[float] = None, gnu_time: Optional[str] = None) -> Tuple[Dict[str, Any], subprocess.Popen]:
+def is_wait4_available() -> bool:
+    """is_wait4_available checks whether we can measure resource usage of child processes with `os.wait4()`.
+    """
+
+    return hasattr(os, 'wait4')
+
+
+def _is_waitid_available() -> bool:
+    return hasattr(os, 'waitid') and hasattr(os, 'WNOWAIT')
+
+
+def _returncode_from_wait_status(status: int) -> int:
+    # os.waitstatus_to_exitcode() is from Python 3.9
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _memory_from_rusage(rusage: Any) -> float:
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    if platform.system() == 'Darwin':
+        return rusage.ru_maxrss / 1000 / 1000
+    return rusage.ru_maxrss / 1000
+
+
+def _cpu_time_from_rusage(rusage: Any) -> float:
+    return rusage.ru_utime + rusage.ru_stime
+
+
+def _make_preexec_fn(*, cpu_limit: Optional[float], cpus: Optional[Sequence[int]] = None) -> Optional[Callable[[], None]]:
+    """_make_preexec_fn makes a function which is called in the child process just before exec.
+
+    :returns: `None` if nothing is needed. Please avoid `preexec_fn` if possible, because it disables the fast path of `subprocess` (vfork or posix_spawn) and is unsafe with threads.
+    """
+
+    if cpu_limit is None and cpus is None:
+        return None
+
+    if cpu_limit is not None:
+        import resource  # pylint: disable=import-outside-toplevel  # resource is only for Unix. Import it here because imports in the child are unsafe with threads.
+
+    def preexec_fn() -> None:
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)  # pylint: disable=no-member
+        if cpu_limit is not None:
+            # RLIMIT_CPU is in seconds. The child gets SIGXCPU at the soft limit and SIGKILL at the hard limit.
+            soft = math.ceil(cpu_limit)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+
+    return preexec_fn
+
+
+MEMORY_POLLING_INTERVAL = 0.01  # in second
+
+
+def is_memory_watching_available() -> bool:
+    """is_memory_watching_available checks whether we can watch the memory of running processes with `/proc` of Linux.
+    """
+
+    return platform.system() == 'Linux' and os.path.exists('/proc/self/statm')
+
+
+def _get_resident_memory(pid: int) -> float:
+    """_get_resident_memory returns the total resident memory of the process and its descendants, in the same unit as the `memory` of `exec_command()`. Processes which have already exited are ignored.
+    """
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    stack = [pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open('/proc/{}/statm'.format(pid)) as fh:
+                total += int(fh.read().split()[1]) * page_size
+            tids = os.listdir('/proc/{}/task'.format(pid))
+        except (OSError, ValueError, IndexError):
+            continue
+        # Children are listed in the thread which started them, e.g. `subprocess.run()` in a thread of Python.
+        for tid in tids:
+            try:
+                with open('/proc/{}/task/{}/children'.format(pid, tid)) as fh:
+                    stack += map(int, fh.read().split())
+            except (OSError, ValueError):
+                pass
+    return total / 1024 / 1000
+
+
+def _watch_memory(proc: subprocess.Popen, *, memory_limit: float, is_group_leader: bool, killed: threading.Event, stopped: threading.Event) -> None:
+    """_watch_memory kills the process and its descendants with SIGKILL when their resident memory exceeds the limit, until `stopped` is set.
+    """
+
+    while not stopped.wait(MEMORY_POLLING_INTERVAL):
+        if _get_resident_memory(proc.pid) > memory_limit:
+            killed.set()
+            try:
+                if is_group_leader:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                else:
+                    proc.kill()
+            except ProcessLookupError:
+                pass
+            return
+
+
+def _communicate_with_wait4(proc: subprocess.Popen, *, timeout: Optional[float], before_reap: Optional[Callable[[], None]] = None) -> Tuple[Optional[bytes], Optional[Any]]:
+    """_communicate_with_wait4 works as `proc.communicate()`, but reaps the child with `os.wait4()` to get its resource usage without external commands.
+
+    :param before_reap: the function called after the child exits and before it is reaped. The PID of the child is not reused until it returns.
+
+    :raises subprocess.TimeoutExpired: if the child doesn't terminate in time. The child is killed and reaped, and `proc.returncode` is set also in this case, so `Popen` never waits for the PID which may be reused.
+    :returns: the output and the `resource.struct_rusage` of the child. The output is `None` if the stdout is not a pipe. The rusage is `None` if the child is reaped by someone else.
+    """
+
+    outputs: List[bytes] = []
+    waited: List[Any] = []
+
+    def drain() -> None:
+        assert proc.stdout is not None
+        outputs.append(proc.stdout.read())
+
+    def reap() -> None:
+        try:
+            if before_reap is not None:
+                os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)  # pylint: disable=no-member
+                before_reap()
+            _, status, rusage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            return  # already reaped by someone else, e.g. the cleanup of `subprocess.Popen`
+        proc.returncode = _returncode_from_wait_status(status)  # as soon as possible, not to signal the PID after this
+        waited.append(rusage)
+
+    reaper = threading.Thread(target=reap, daemon=True)
+    threads = [reaper]
+    if proc.stdout is not None:
+        threads.append(threading.Thread(target=drain, daemon=True))
+    for thread in threads:
+        thread.start()
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    for thread in threads:
+        thread.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        if thread.is_alive():
+            # Kill and reap the child before leaving. Otherwise the reaper is left blocked in wait4() and races with `Popen`, which may wait for the same PID later.
+            # Use os.kill() instead of proc.kill(), because proc.kill() calls waitpid() internally.
+            if reaper.is_alive():
+                try:
+                    os.kill(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                reaper.join()
+            if proc.returncode is None:
+                proc.returncode = -signal.SIGKILL  # the status is lost
+            raise subprocess.TimeoutExpired(proc.args, timeout)  # type: ignore
+
+    if not waited:
+        # The status is lost. `Popen` also assumes 0 in this case.
+        if proc.returncode is None:
+            proc.returncode = 0
+        return (outputs[0] if outputs else None), None
+    return (outputs[0] if outputs else None), waited[0]
+
+
+class RunningProcesses:
+    """RunningProcesses tracks running child processes of `exec_command()` to kill them from other threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes: Dict[int, Tuple[subprocess.Popen, bool]] = {}
+        self.stopped = False
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen, *, is_group_leader: bool) -> None:
+        if proc.returncode is not None:
+            return  # already reaped. The PID may be used by another process.
+        if is_group_leader:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.terminate()
+
+    def add(self, proc: subprocess.Popen, *, is_group_leader: bool) -> None:
+        with self._lock:
+            self._processes[proc.pid] = (proc, is_group_leader)
+            if self.stopped:
+                self._kill(proc, is_group_leader=is_group_leader)
+
+    def remove(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.pop(proc.pid, None)
+
+    def kill_all(self) -> None:
+        """kill_all kills all running processes, and also processes which will be started later.
+        """
+
+        with self._lock:
+            self.stopped = True
+            for proc, is_group_leader in self._processes.values():
+                self._kill(proc, is_group_leader=is_group_leader)
+
+
+def make_input_file(data: bytes) -> BinaryIO:
+    """make_input_file makes an anonymous file which has the data, to give it to child processes as their stdin directly. The file is positioned at the beginning.
+
+    The file is a memfd on Linux, i.e. it exists only in memory.
+    """
+
+    if hasattr(os, 'memfd_create'):
+        fh: BinaryIO = open(os.memfd_create('oj-input', os.MFD_CLOEXEC), 'w+b')  # pylint: disable=no-member,consider-using-with
+    else:
+        fh = cast(BinaryIO, tempfile.TemporaryFile())  # pylint: disable=consider-using-with
+    fh.write(data)
+    fh.flush()
+    fh.seek(0)
+    return fh
+
+
+def exec_command(command_str: str, *, stdin: Optional[BinaryIO] = None, input: Optional[bytes] = None, timeout: Optional[float] = None, gnu_time: Optional[str] = None, cpu_limit: Optional[float] = None, cpus: Optional[Sequence[int]] = None, memory_limit: Optional[float] = None, processes: Optional[RunningProcesses] = None, stdout: Optional[IO[bytes]] = None) -> Tuple[Dict[str, Any], subprocess.Popen]:
+    """
+    :param input: the input of the child. This is given through an anonymous file made with `make_input_file()`, not through a pipe.
+    :param stdout: the file to write the output of the child directly. If this is given, `info['answer']` is `None`.
+    :param cpu_limit: the limit of CPU time in seconds, enforced with RLIMIT_CPU. This is ignored on Windows.
+    :param cpus: the CPUs to run the child on, set with `sched_setaffinity()` before exec. This is available only on Linux.
+    :param memory_limit: the limit of resident memory in megabytes. The child and its descendants are killed when they exceed it, and then `info['killed_by_memory_limit']` is `True`. This is available only on Linux.
+    :param processes: the registry to make the child killable from other threads.
+    :returns: the measurements and the finished process. Use `info['returncode']` to detect timeouts, because `proc.returncode` is set also for killed children.
+    """
+
+    input_file: Optional[BinaryIO] = None
     if input is not None:
         assert stdin is None
-        stdin = subprocess.PIPE  # type: ignore
+        input_file = make_input_file(input)
+        stdin = input_file
+    # Use wait4() to measure the memory consumption when GNU time is not specified. This needs neither an extra process nor a temporary file.
+    use_wait4 = gnu_time is None and is_wait4_available()
     if gnu_time is not None:
         context: Any = tempfile.NamedTemporaryFile(delete=True)
     else:
@@ -69,51 +303,109 @@ def exec_command(command_str: str, *, stdin: Optional[BinaryIO] = None, input: O
     with context as fh:
         command = shlex.split(command_str)
         if gnu_time is not None:
-            command = [gnu_time, '-f', '%M', '-o', fh.name, '--'] + command
+            command = [gnu_time, '-f', '%U %S %M', '-o', fh.name, '--'] + command
         if os.name == 'nt':
             # HACK: without this encoding and decoding, something randomly fails with multithreading; see https://github.com/kmyk/online-judge-tools/issues/468
             command = command_str.encode().decode()  # type: ignore
         begin = time.perf_counter()
 
         # We need kill processes called from the "time" command using process groups. Without this, orphans spawn. see https://github.com/kmyk/online-judge-tools/issues/640
-        preexec_fn = None
-        if gnu_time is not None and os.name == 'posix':
-            preexec_fn = os.setsid
+        # The new session is made with start_new_session instead of os.setsid() in preexec_fn, to keep the fast path of launching processes.
+        is_group_leader = (gnu_time is not None or use_wait4 or cpu_limit is not None or cpus is not None or memory_limit is not None) and os.name == 'posix'
+        preexec_fn = _make_preexec_fn(cpu_limit=cpu_limit, cpus=cpus) if is_group_leader else None
 
         try:
-            proc = subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=sys.stderr, preexec_fn=preexec_fn)  # pylint: disable=subprocess-popen-preexec-fn
+            with profiling.phase('spawn'):
+                proc = subprocess.Popen(command, stdin=stdin, stdout=stdout if stdout is not None else subprocess.PIPE, stderr=sys.stderr, start_new_session=is_group_leader, preexec_fn=preexec_fn)  # pylint: disable=subprocess-popen-preexec-fn
         except FileNotFoundError:
             logger.error('No such file or directory: %s', command)
             sys.exit(1)
         except PermissionError:
             logger.error('Permission denied: %s', command)
             sys.exit(1)
+        finally:
+            if input_file is not None:
+                input_file.close()  # the child has its own file descriptor
+        logger.debug('launched the process in %f sec%s', time.perf_counter() - begin, ' (with preexec_fn)' if preexec_fn is not None else '')
+        if processes is not None:
+            processes.add(proc, is_group_leader=is_group_leader)
+
+        # The memory is watched from a thread, instead of the kernel with RLIMIT_AS, to know whether the child is killed by the limit.
+        # The watcher is stopped before the child is reaped, not to kill another process which reuses the PID.
+        killed_by_memory_limit = threading.Event()
+        watching_stopped = threading.Event()
+        watcher: Optional[threading.Thread] = None
+        if memory_limit is not None:
+            watcher = threading.Thread(target=_watch_memory, args=(proc, ), kwargs={'memory_limit': memory_limit, 'is_group_leader': is_group_leader, 'killed': killed_by_memory_limit, 'stopped': watching_stopped}, daemon=True)
+            watcher.start()
+
+        def stop_watching() -> None:
+            watching_stopped.set()
+            if watcher is not None:
+                watcher.join()
+
+        def kill_group() -> None:
+            try:
+                # The child is the leader of its own process group, so the ID of the group is the same to its PID. This kills also descendants left running.
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        def before_reap() -> None:
+            # The exited child still holds its PID here, so neither the PID nor the group is reused yet.
+            stop_watching()
+            if processes is not None:
+                processes.remove(proc)
+            if is_group_leader:
+                kill_group()
+
+        # Reap the child by ourselves if possible, to clean up before the PID is released.
+        use_reaper = (use_wait4 or watcher is not None or is_group_leader) and is_wait4_available()
         answer: Optional[bytes] = None
+        rusage: Optional[Any] = None
+        is_timeout = False
         try:
-            answer, _ = proc.communicate(input=input, timeout=timeout)
+            with profiling.phase('run'):
+                if use_reaper:
+                    answer, rusage = _communicate_with_wait4(proc, timeout=timeout, before_reap=before_reap if _is_waitid_available() else None)
+                else:
+                    answer, _ = proc.communicate(timeout=timeout)
         except subprocess.TimeoutExpired:
-            pass
+            is_timeout = True
         finally:
-            if preexec_fn is not None:
-                try:
-                    os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-                except ProcessLookupError:
-                    pass
-            else:
-                proc.terminate()
+            with profiling.phase('reap'):
+                stop_watching()
+                if proc.returncode is None:  # not reaped yet, e.g. when `proc.communicate()` times out
+                    if is_group_leader:
+                        kill_group()
+                    else:
+                        proc.terminate()
+                if processes is not None:
+                    processes.remove(proc)
 
         end = time.perf_counter()
+        cpu: Optional[float] = None
         memory: Optional[float] = None
         if gnu_time is not None:
-            with open(fh.name) as fh1:
-                reported = fh1.read()
+            with profiling.phase('read GNU time'):
+                with open(fh.name) as fh1:
+                    reported = fh1.read()
             logger.debug('GNU time says:\n%s', reported)
-            if reported.strip() and reported.splitlines()[-1].isdigit():
-                memory = int(reported.splitlines()[-1]) / 1000
+            if reported.strip():
+                fields = reported.splitlines()[-1].split()
+                if len(fields) == 3 and fields[2].isdigit():
+                    cpu = float(fields[0]) + float(fields[1])
+                    memory = int(fields[2]) / 1000
+        elif rusage is not None:
+            cpu = _cpu_time_from_rusage(rusage)
+            memory = _memory_from_rusage(rusage)
     info = {
         'answer': answer,  # Optional[byte]
+        'returncode': None if is_timeout else proc.returncode,  # Optional[int], None if the child is killed for the timeout
         'elapsed': end - begin,  # float, in second
+        'cpu': cpu,  # Optional[float], user + system time in second
         'memory': memory,  # Optional[float], in megabyte
+        'killed_by_memory_limit': killed_by_memory_limit.is_set(),  # bool
     }
     return info, proc
 
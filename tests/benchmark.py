@@ -0,0 +1,64 @@
+"""This module has unit tests for onlinejudge_command.benchmark module.
+"""
+
+import unittest
+
+from onlinejudge_command.benchmark import *
+
+
+class PercentileTest(unittest.TestCase):
+    def test_interpolation(self) -> None:
+        values = [4.0, 1.0, 3.0, 2.0, 5.0]
+
+        self.assertEqual(percentile(values, 0), 1.0)
+        self.assertEqual(percentile(values, 50), 3.0)
+        self.assertEqual(percentile(values, 100), 5.0)
+        self.assertAlmostEqual(percentile(values, 95), 4.8)
+
+    def test_single_value(self) -> None:
+        self.assertEqual(percentile([7.0], 95), 7.0)
+
+    def test_invalid(self) -> None:
+        self.assertRaises(ValueError, lambda: percentile([], 50))
+        self.assertRaises(ValueError, lambda: percentile([1.0], 101))
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_summarize(self) -> None:
+        summary = summarize([2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0])
+
+        self.assertEqual(summary['count'], 8)
+        self.assertEqual(summary['min'], 2.0)
+        self.assertEqual(summary['median'], 4.5)
+        self.assertEqual(summary['mean'], 5.0)
+        self.assertAlmostEqual(summary['p95'], 8.3)
+        self.assertAlmostEqual(summary['stddev'], 2.138089935299395)
+
+    def test_single_value(self) -> None:
+        summary = summarize([1.5])
+
+        self.assertEqual(summary['median'], 1.5)
+        self.assertEqual(summary['stddev'], 0.0)
+
+
+class CompareSpeedTest(unittest.TestCase):
+    def test_constant_speedup(self) -> None:
+        result = compare_speed([2.0, 4.0, 3.0], [1.0, 2.0, 1.5])
+
+        self.assertAlmostEqual(result['speedup'], 2.0)
+        self.assertAlmostEqual(result['lower'], 2.0)
+        self.assertAlmostEqual(result['upper'], 2.0)
+
+    def test_confidence_interval(self) -> None:
+        baseline = [1.0 + 0.1 * (i % 3) for i in range(30)]
+        target = [0.5 + 0.05 * (i % 5) for i in range(30)]
+        result = compare_speed(baseline, target)
+
+        self.assertLess(result['lower'], result['speedup'])
+        self.assertLess(result['speedup'], result['upper'])
+        self.assertGreater(result['lower'], 1.0)
+        self.assertEqual(compare_speed(baseline, target), result)  # deterministic
+
+    def test_invalid(self) -> None:
+        self.assertRaises(ValueError, lambda: compare_speed([1.0, 2.0], [1.0]))
+        self.assertRaises(ValueError, lambda: compare_speed([1.0], [0.0]))
@@ -143,3 +143,41 @@ class GenerateInputTest(unittest.TestCase):
             expected_values=[],
             disallowed_files=['test/random-{}.in'.format(str(i).zfill(3)) for i in range(3)],
         )
+
+    def test_call_generate_input_manifest(self):
+        # with the manifest, indices start from the next of the largest used one
+        self.snippet_call_generate_input(
+            args=[tests.utils.python_script('generate.py'), '2', '--manifest'],
+            input_files=[
+                {
+                    'path': 'generate.py',
+                    'data': 'import random\nprint(random.randrange(10 ** 9))\n'
+                },
+                {
+                    'path': 'test/random-000.in',
+                    'data': '1\n'
+                },
+                {
+                    'path': 'test/random-002.in',
+                    'data': '2\n'
+                },
+            ],
+            expected_values=[
+                {
+                    'path': 'test/random-003.in',
+                    'data': None,
+                },
+                {
+                    'path': 'test/random-004.in',
+                    'data': None,
+                },
+                {
+                    'path': 'test/.oj-manifest.json',
+                    'data': None,
+                },
+            ],
+            disallowed_files=[
+                'test/random-001.in',
+                'test/random-005.in',
+            ],
+        )
@@ -7,9 +7,11 @@ import signal
 import sys
 import tempfile
 import threading
+import time
 import unittest
 from typing import *
 
+import onlinejudge_command.utils
 import tests.utils
 from tests.utils import cat, sleep_1sec
 
@@ -362,6 +364,24 @@ class TestTest(unittest.TestCase):
             }],
         )
 
+    def test_call_test_whitespace_hint(self):
+        # The hint of -S and -N is printed only when they may help, i.e. not with --error
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': '1.0 2.0\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': '1.0\n2.0\n'
+            },
+        ]
+        hint = b'This was AC if spaces and newlines were ignored.'
+        result = tests.utils.run_in_sandbox(args=['test', '-c', cat()], files=files)
+        self.assertIn(hint, result['proc'].stdout)
+        result = tests.utils.run_in_sandbox(args=['test', '-c', cat(), '-e', '0.1'], files=files)
+        self.assertNotIn(hint, result['proc'].stdout)
+
     def test_call_test_special_judge(self):
         def assert_each_line_count(testcase_input: int, user_output: int, testcase_output: int) -> str:
             def assert_line_count(file_path: str, expected: int):
@@ -430,6 +450,312 @@ class TestTest(unittest.TestCase):
             }],
         )
 
+    def test_call_test_special_judge_server(self):
+        # The judge counts cases. If it were restarted for each case, the count would be always 1.
+        judge = tests.utils.python_c(os.linesep.join([
+            'import sys',
+            'count = 0',
+            'while True:',
+            '  input_path = sys.stdin.readline().rstrip()',
+            '  if not input_path:',
+            '    break',
+            '  sys.stdin.readline()',
+            '  sys.stdin.readline()',
+            '  count += 1',
+            '  ok = int(open(input_path).read()) == count',
+            "  print('AC' if ok else 'WA the count is ' + str(count), flush=True)",
+        ]))
+        files = []
+        for i in range(1, 4):
+            files += [
+                {
+                    'path': 'test/sample-{}.in'.format(i),
+                    'data': '{}\n'.format(i)
+                },
+                {
+                    'path': 'test/sample-{}.out'.format(i),
+                    'data': ''
+                },
+            ]
+        data = self.snippet_call_test(args=['-c', cat(), '--judge-command', judge, '--judge-server'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'AC', 'AC'])
+
+    def test_call_test_special_judge_server_timeout(self):
+        # The judge hangs on the second case. It is killed and restarted, and the third case is judged.
+        judge = tests.utils.python_c(os.linesep.join([
+            'import sys, time',
+            'while True:',
+            '  input_path = sys.stdin.readline().rstrip()',
+            '  if not input_path:',
+            '    break',
+            '  sys.stdin.readline()',
+            '  sys.stdin.readline()',
+            '  if int(open(input_path).read()) == 2:',
+            '    time.sleep(60)',
+            "  print('AC', flush=True)",
+        ]))
+        files = []
+        for i in range(1, 4):
+            files += [
+                {
+                    'path': 'test/sample-{}.in'.format(i),
+                    'data': '{}\n'.format(i)
+                },
+                {
+                    'path': 'test/sample-{}.out'.format(i),
+                    'data': ''
+                },
+            ]
+        data = self.snippet_call_test(args=['-c', cat(), '--judge-command', judge, '--judge-server', '--judge-timeout', '1'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'WA', 'AC'])
+
+    def test_call_test_special_judge_function(self):
+        judge = os.linesep.join([
+            'def check(input, actual, expected):',
+            '    return actual.split() == expected.split()',
+            '',
+            'def check_with_assert(input, actual, expected):',
+            '    assert int(actual) * 2 == int(input)',
+            '',
+        ])
+        files = [
+            {
+                'path': 'judge.py',
+                'data': judge
+            },
+            {
+                'path': 'test/sample-1.in',
+                'data': '4\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': '4 \n'
+            },
+            {
+                'path': 'test/sample-2.in',
+                'data': '6\n'
+            },
+            {
+                'path': 'test/sample-2.out',
+                'data': '3\n'
+            },
+        ]
+        data = self.snippet_call_test(args=['-c', cat(), '--judge-command', 'judge:check'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'WA'])
+        data = self.snippet_call_test(args=['-c', tests.utils.python_c('print(int(input()) // 2)'), '--judge-command', 'judge:check_with_assert'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'AC'])
+
+    def test_call_test_executor_process(self):
+        files = [{'path': 'test/sample-{}.in'.format(i), 'data': '{}\n'.format(i)} for i in range(4)] + [{'path': 'test/sample-{}.out'.format(i), 'data': '{}\n'.format(i if i % 2 == 0 else -i)} for i in range(4)]
+        with tempfile.TemporaryDirectory() as tempdir_:
+            log_file_path = pathlib.Path(tempdir_) / 'test.json'
+            result = tests.utils.run_in_sandbox(args=['test', '--jobs', '2', '--executor', 'process', '--log-file=' + str(log_file_path), '-c', cat()], files=files)
+            with log_file_path.open(mode='rb') as fh:
+                data = json.load(fh)
+        self.assertEqual([case['status'] for case in data], ['AC', 'WA', 'AC', 'WA'])
+        # logs rendered in worker processes are printed by the main process
+        self.assertEqual(result['proc'].stdout.count(b'WA'), 2)
+        self.assertEqual(result['proc'].stdout.count(b'the first difference is at line 1'), 2)
+
+    def test_call_test_executor_process_closes_judge_server(self):
+        # The judge writes a file after its stdin is closed. Workers must close their judges before oj exits.
+        judge = tests.utils.python_c(os.linesep.join([
+            'import os, sys, time',
+            'while True:',
+            '  input_path = sys.stdin.readline().rstrip()',
+            '  if not input_path:',
+            '    break',
+            '  sys.stdin.readline()',
+            '  sys.stdin.readline()',
+            "  print('AC', flush=True)",
+            'time.sleep(0.5)',
+            "open('closed-{}'.format(os.getpid()), 'w').close()",
+        ]))
+        files = [{'path': 'test/sample-{}.in'.format(i), 'data': '{}\n'.format(i)} for i in range(4)] + [{'path': 'test/sample-{}.out'.format(i), 'data': ''} for i in range(4)]
+        with tests.utils.sandbox(files) as tempdir:
+            proc = tests.utils.run(['test', '--jobs', '2', '--executor', 'process', '-c', cat(), '--judge-command', judge, '--judge-server'])
+            self.assertEqual(proc.returncode, 0)
+            self.assertTrue(list(pathlib.Path(tempdir).glob('closed-*')))
+
+    def test_call_test_repeat(self):
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'foo\n'
+            },
+        ]
+        data = self.snippet_call_test(args=['-c', cat(), '--repeat', '3', '--warmup', '1'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual(data[0]['status'], 'AC')
+        self.assertEqual(data[0]['statistics']['elapsed']['count'], 3)
+        self.assertEqual(data[0]['elapsed'], data[0]['statistics']['elapsed']['median'])
+        self.assertLessEqual(data[0]['statistics']['elapsed']['min'], data[0]['statistics']['elapsed']['p95'])
+
+        # a single run has no statistics
+        data = self.snippet_call_test(args=['-c', cat(), '--warmup', '1'], files=files, expected=None)
+        assert data is not None
+        self.assertNotIn('statistics', data[0])
+
+    def test_call_test_profile_runner(self):
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'bar\n'
+            },
+        ]
+        for args in [[], ['--jobs', '2', '--executor', 'process']]:
+            with tempfile.TemporaryDirectory() as tempdir:
+                trace_path = pathlib.Path(tempdir) / 'trace.json'
+                data = self.snippet_call_test(args=['-c', cat(), '--profile-runner-trace', str(trace_path)] + args, files=files, expected=None)
+                assert data is not None
+                self.assertEqual(data[0]['status'], 'WA')
+                with trace_path.open() as fh:
+                    trace = json.load(fh)
+            names = {event['name'] for event in trace['traceEvents']}
+            self.assertLessEqual({'glob', 'spawn', 'run', 'reap', 'compare', 'render', 'log'}, names)
+            self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in trace['traceEvents']))
+            self.assertIn('sample-1', {event.get('args', {}).get('case') for event in trace['traceEvents'] if event['name'] == 'compare'})
+
+    def test_call_test_report(self):
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\nbar\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'foo\nbar\n'
+            },
+            {
+                'path': 'test/sample-2.in',
+                'data': 'foo\nbar\n'
+            },
+            {
+                'path': 'test/sample-2.out',
+                'data': 'foo\nbaz\n'
+            },
+        ]
+        for args in [[], ['--no-report-outputs', '--jobs', '2']]:
+            with tempfile.TemporaryDirectory() as tempdir:
+                report_path = pathlib.Path(tempdir) / 'report.jsonl'
+                self.snippet_call_test(args=['-c', cat(), '--report', 'jsonl:' + str(report_path)] + args, files=files, expected=None)
+                with report_path.open() as fh:
+                    lines = fh.read().splitlines()
+            self.assertEqual(len(lines), 2)
+            records = {record['name']: record for record in map(json.loads, lines)}
+            self.assertEqual(records['sample-1']['status'], 'AC')
+            self.assertIsNone(records['sample-1']['first_mismatch'])
+            self.assertEqual(records['sample-2']['status'], 'WA')
+            self.assertEqual(records['sample-2']['first_mismatch'], {'offset': 6, 'lineno': 1, 'word_index': 1})
+            self.assertEqual(records['sample-2']['input_size'], 8)
+            self.assertEqual(records['sample-2']['output_size'], 8)
+            self.assertEqual(records['sample-2']['expected_size'], 8)
+            if args:
+                self.assertNotIn('output', records['sample-2'])
+            else:
+                self.assertEqual(records['sample-2']['output'], 'foo\nbar\n')
+
+    def test_call_test_report_to_stdout(self):
+        # stdout has only the report, and logs go to stderr
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'bar\n'
+            },
+        ]
+        for report in ['jsonl', 'jsonl:-']:
+            result = tests.utils.run_in_sandbox(args=['test', '-c', cat(), '--report', report], files=files, pipe_stderr=True)
+            lines = result['proc'].stdout.decode().splitlines()
+            self.assertEqual([json.loads(line)['status'] for line in lines], ['WA'])
+            self.assertIn(b'WA', result['proc'].stderr)
+
+    def test_call_test_compare_command(self):
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-2.in',
+                'data': 'bar\n'
+            },
+            {
+                'path': 'test/sample-2.out',
+                'data': 'bar\n'
+            },
+        ]
+        data = self.snippet_call_test(args=['-c', cat(), '--compare-command', tests.utils.python_c('print(input())'), '--repeat', '2'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'AC'])
+        self.assertEqual([result['baseline']['status'] for result in data], ['AC', 'AC'])
+        for result in data:
+            self.assertEqual(result['baseline']['statistics']['elapsed']['count'], 2)
+            self.assertLessEqual(result['baseline']['speedup']['lower'], result['baseline']['speedup']['speedup'])
+            self.assertLessEqual(result['baseline']['speedup']['speedup'], result['baseline']['speedup']['upper'])
+
+        # the output of the baseline is also checked
+        data = self.snippet_call_test(args=['-c', cat(), '--compare-command', tests.utils.python_c('print(1)')], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'AC'])
+        self.assertEqual([result['baseline']['status'] for result in data], ['WA', 'WA'])
+
+    def test_call_test_compare_command_order(self):
+        # Which solution runs first alternates between cases, even without --repeat.
+        files = [{'path': 'test/sample-{}.in'.format(i), 'data': 'foo\n'} for i in range(1, 5)]
+        command = "import sys; open('order.log', 'a').write('{}\\n'); sys.stdout.write(sys.stdin.read())"
+        with tests.utils.sandbox(files) as tempdir:
+            tests.utils.run(['test', '-c', tests.utils.python_c(command.format('target')), '--compare-command', tests.utils.python_c(command.format('baseline'))], check=True)
+            order = (pathlib.Path(tempdir) / 'order.log').read_text().split()
+        self.assertEqual(order, ['target', 'baseline', 'baseline', 'target'] * 2)
+
+    @unittest.skipIf(os.name != 'posix', 'sessions are only for POSIX')
+    def test_call_test_new_session(self):
+        # solutions run as leaders of their own sessions to be killed with their descendants
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': ''
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'True\n'
+            },
+        ]
+        command = tests.utils.python_c('import os; print(os.getsid(0) == os.getpid())')
+        for args in [[], ['--tle', '2', '--tle-mode', 'cpu']]:
+            data = self.snippet_call_test(args=['-c', command] + args, files=files, expected=None)
+            assert data is not None
+            self.assertEqual(data[0]['status'], 'AC')
+
+    @unittest.skipIf(not hasattr(os, 'sched_setaffinity'), 'sched_setaffinity() is available only on Linux')
+    def test_call_test_pin(self):
+        cpu = min(os.sched_getaffinity(0))
+        files = [{'path': 'test/sample-{}.in'.format(i), 'data': ''} for i in range(3)] + [{'path': 'test/sample-{}.out'.format(i), 'data': '[{}]\n'.format(cpu)} for i in range(3)]
+        data = self.snippet_call_test(args=['-c', tests.utils.python_c('import os; print(sorted(os.sched_getaffinity(0)))'), '--cpus', str(cpu), '--pin', '--jobs', '2'], files=files, expected=None)
+        assert data is not None
+        self.assertEqual([result['status'] for result in data], ['AC', 'AC', 'AC'])
+        self.assertEqual([result['cpus'] for result in data], [[cpu], [cpu], [cpu]])
+
     def test_call_test_multiline(self):
         self.snippet_call_test(
             args=['-c', cat()],
@@ -984,6 +1310,78 @@ class TestTest(unittest.TestCase):
         for case in data:
             self.assertEqual(case['status'], 'AC')
 
+    @unittest.skipIf(platform.system() == 'Windows', "CPU time is not measured on Windows environment")
+    def test_call_test_not_tle_with_cpu_mode(self):
+        # sleeping uses no CPU time
+        data = self.snippet_call_test(
+            args=['-c', sleep_1sec(), '-t', '0.5', '--tle-mode', 'cpu'],
+            files=[
+                {
+                    'path': 'test/sample-1.in',
+                    'data': 'foo\n'
+                },
+            ],
+            expected=None,
+        )
+        for case in data:
+            self.assertEqual(case['status'], 'AC')
+            self.assertGreater(case['elapsed'], 0.9)
+            self.assertLess(case['cpu'], 0.5)
+
+    @unittest.skipIf(platform.system() == 'Windows', "CPU time is not measured on Windows environment")
+    def test_call_test_tle_with_cpu_mode(self):
+        data = self.snippet_call_test(
+            args=['-c', tests.utils.python_c("while True: pass"), '-t', '0.5', '--tle-mode', 'cpu'],
+            files=[
+                {
+                    'path': 'test/sample-1.in',
+                    'data': 'foo\n'
+                },
+            ],
+            expected=None,
+        )
+        for case in data:
+            self.assertEqual(case['status'], 'TLE')
+
+    @unittest.skipIf(not hasattr(os, 'wait4'), 'wait4() is not available')
+    def test_call_test_wait4_memory_and_cpu(self):
+        # the default backend without --gnu-time measures the memory and the CPU time with wait4()
+        data = self.snippet_call_test(
+            args=['-c', tests.utils.python_c("import time; a = b'A' * 100000000; t = time.process_time(); [None for _ in iter(lambda: time.process_time() - t < 0.2, False)]; print(len(a))")],
+            files=[
+                {
+                    'path': 'test/sample-1.in',
+                    'data': 'foo\n'
+                },
+            ],
+            expected=None,
+        )
+        assert data is not None
+        for case in data:
+            self.assertEqual(case['status'], 'AC')
+            self.assertGreater(case['memory'], 100)
+            self.assertLess(case['memory'], 1000)
+            self.assertGreater(case['cpu'], 0.2)
+
+    @unittest.skipIf(not hasattr(os, 'wait4'), 'wait4() is not available')
+    def test_call_test_wait4_tle(self):
+        # TLE cases are killed and reaped without errors from the thread which waits for them
+        files = [{'path': 'test/sample-{}.in'.format(i), 'data': 'foo\n'} for i in range(8)]
+        with tempfile.TemporaryDirectory() as tempdir_:
+            log_file_path = pathlib.Path(tempdir_) / 'test.json'
+            result = tests.utils.run_in_sandbox(args=['test', '--log-file=' + str(log_file_path), '-c', sleep_1sec(), '-t', '0.1', '-j', '4'], files=files, pipe_stderr=True)
+            with log_file_path.open() as fh:
+                data = json.load(fh)
+        self.assertEqual([case['status'] for case in data], ['TLE'] * len(files))
+        self.assertEqual([case['exitcode'] for case in data], [None] * len(files))
+        self.assertNotIn(b'Traceback', result['proc'].stderr)
+        self.assertNotIn(b'ChildProcessError', result['proc'].stderr)
+
+        # The reaped child has its returncode, so `subprocess.Popen` never waits for its PID again. The timeout is told with `info['returncode']`.
+        info, proc = onlinejudge_command.utils.exec_command(sleep_1sec(), timeout=0.1)
+        self.assertIsNone(info['returncode'])
+        self.assertIsNotNone(proc.returncode)
+
     @unittest.skipIf(platform.system() == 'Darwin', 'GNU time is not installed on macOS')
     @unittest.skipIf(platform.system() == 'Windows', "memory checking is disabled on Windows environment")
     def test_call_test_large_memory(self):
@@ -1044,6 +1442,171 @@ class TestTest(unittest.TestCase):
             }],
         )
 
+    @unittest.skipIf(platform.system() != 'Linux', '--mle-mode=kill is available only on Linux')
+    def test_call_test_memory_limit_kill(self):
+        # allocate 10 MB each 10 msec up to 1 GB, and get killed at 50 MB
+        command = tests.utils.python_c("import time; a = [(b'A' * 10000000, time.sleep(0.01)) for _ in range(100)]; print(len(a))")
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\n'
+            },
+        ]
+        data = self.snippet_call_test(args=['--mle', '50', '--mle-mode', 'kill', '-c', command], files=files, expected=None)
+        assert data is not None
+        self.assertEqual(data[0]['status'], 'MLE')
+        self.assertEqual(data[0]['mle_reason'], 'killed')
+        self.assertEqual(data[0]['output'], '')
+        self.assertLess(data[0]['memory'], 500)
+
+        # MLE after the fact
+        data = self.snippet_call_test(args=['--mle', '50', '-c', tests.utils.python_c("print(len(b'A' * 100000000))")], files=files, expected=None)
+        assert data is not None
+        self.assertEqual(data[0]['status'], 'MLE')
+        self.assertEqual(data[0]['mle_reason'], 'exceeded')
+
+        # a process started from a thread other than the main thread is also watched
+        command = tests.utils.python_c("import subprocess, sys, threading; code = 'import time; a = [(bytes(range(256)) * 40000, time.sleep(0.01)) for _ in range(100)]'; thread = threading.Thread(target=subprocess.run, args=([sys.executable, '-c', code], )); thread.start(); thread.join()")
+        data = self.snippet_call_test(args=['--mle', '50', '--mle-mode', 'kill', '-c', command], files=files, expected=None)
+        assert data is not None
+        self.assertEqual(data[0]['status'], 'MLE')
+        self.assertEqual(data[0]['mle_reason'], 'killed')
+
+    def test_call_test_cache(self):
+        # the solution counts how many times it is executed
+        command = tests.utils.python_c("import sys; open('count.txt', 'a').write('.'); sys.stdout.write(sys.stdin.read())")
+        files = [
+            {
+                'path': 'test/sample-1.in',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-1.out',
+                'data': 'foo\n'
+            },
+            {
+                'path': 'test/sample-2.in',
+                'data': 'bar\n'
+            },
+            {
+                'path': 'test/sample-2.out',
+                'data': 'baz\n'
+            },
+        ]
+        with tempfile.TemporaryDirectory() as tempdir_:
+            cache_dir = pathlib.Path(tempdir_)
+            env = dict(os.environ)
+            env['XDG_CACHE_HOME'] = str(cache_dir)  # don't share the cache with other tests
+            with tests.utils.sandbox(files):
+                tests.utils.run(['test', '--cache', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '..')
+                tests.utils.run(['test', '--cache', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '..')
+
+                # the cache has hashes of outputs instead of outputs
+                entries = [json.loads(path.read_text()) for path in (cache_dir / 'online-judge-tools' / 'test-result-cache').glob('*/*.json')]
+                self.assertEqual(len(entries), 2)
+                for entry in entries:
+                    self.assertIsNone(entry['output'])
+                    self.assertIn('output_sha256', entry)
+
+                # the cache is not used if --jobs is changed with --tle-mode cpu, because the wall-time limit depends on it
+                tests.utils.run(['test', '--cache', '--tle', '2', '--tle-mode', 'cpu', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '....')
+                tests.utils.run(['test', '--cache', '--tle', '2', '--tle-mode', 'cpu', '-j', '2', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '......')
+                tests.utils.run(['test', '--cache', '--tle', '2', '--tle-mode', 'cpu', '-j', '2', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '......')
+                tests.utils.run(['test', '--cache', '--rerun-failed', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '.......')
+                tests.utils.run(['test', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '.........')
+
+                # the cache is not used if the expected output is changed
+                pathlib.Path('test/sample-2.out').write_text('bar\n')
+                proc = tests.utils.run(['test', '--cache', '-c', command], env=env)
+                self.assertEqual(pathlib.Path('count.txt').read_text(), '..........')
+                self.assertEqual(proc.returncode, 0)
+
+                # the cache is not used if CPUs are changed, because they change the time
+                if hasattr(os, 'sched_setaffinity'):
+                    tests.utils.run(['test', '--cache', '--pin', '-c', command], env=env)
+                    self.assertEqual(pathlib.Path('count.txt').read_text(), '............')
+                    tests.utils.run(['test', '--cache', '--pin', '-c', command], env=env)
+                    self.assertEqual(pathlib.Path('count.txt').read_text(), '............')
+
+    def test_call_test_fail_fast(self):
+        data = self.snippet_call_test(
+            args=['--fail-fast', '-c', cat()],
+            files=[
+                {
+                    'path': 'test/sample-1.in',
+                    'data': 'foo\n'
+                },
+                {
+                    'path': 'test/sample-1.out',
+                    'data': 'foo\n'
+                },
+                {
+                    'path': 'test/sample-2.in',
+                    'data': 'bar\n'
+                },
+                {
+                    'path': 'test/sample-2.out',
+                    'data': 'baz\n'
+                },
+                {
+                    'path': 'test/sample-3.in',
+                    'data': 'bar\n'
+                },
+                {
+                    'path': 'test/sample-3.out',
+                    'data': 'baz\n'
+                },
+            ],
+            expected=None,
+        )
+        self.assertEqual([case['status'] for case in data], ['AC', 'WA'])
+
+    def test_call_test_fail_fast_in_parallel(self):
+        files = [
+            {
+                'path': 'test/fail.in',
+                'data': 'fail\n'
+            },
+        ]
+        for i in range(4):
+            files += [{'path': 'test/slow-{}.in'.format(i), 'data': 'slow\n'}]
+        begin = time.perf_counter()
+        data = self.snippet_call_test(
+            args=['--jobs', '2', '--fail-fast', '--tle', '30', '-c', tests.utils.python_c("import sys, time; time.sleep(10) if 'slow' in sys.stdin.read() else exit(1)")],
+            files=files,
+            expected=None,
+        )
+        self.assertLess(time.perf_counter() - begin, 10)
+        self.assertIn('RE', [case['status'] for case in data])
+        self.assertLess(len(data), 5)
+
+    def test_call_test_large_output(self):
+        # outputs larger than 16 MiB are kept as files
+        data = self.snippet_call_test(
+            args=['-c', tests.utils.python_c("print('A' * 20000000)")],
+            files=[
+                {
+                    'path': 'test/sample-1.in',
+                    'data': 'foo\n'
+                },
+            ],
+            expected=None,
+        )
+        for case in data:
+            self.assertEqual(case['status'], 'AC')
+            self.assertIsNone(case['output'])
+            output_path = pathlib.Path(case['output_path'])
+            self.assertEqual(output_path.stat().st_size, 20000000 + len(os.linesep))
+            output_path.unlink()
+            output_path.parent.rmdir()
+
     def test_call_stderr(self):
         self.snippet_call_test(
             args=['-c', tests.utils.python_c("import sys; print('foo', file=sys.stderr)")],
@@ -0,0 +1,70 @@
+"""This module has unit tests for onlinejudge_command.elapsed_time_history module.
+"""
+
+import pathlib
+import tempfile
+import unittest
+
+from onlinejudge_command.elapsed_time_history import *
+
+
+class SortLongestFirstTest(unittest.TestCase):
+    def test_without_history(self) -> None:
+        sizes = {'a': 10, 'b': 1000, 'c': 100}
+        records: Dict[str, Dict[str, float]] = {}
+        expected = ['b', 'c', 'a']
+
+        self.assertEqual(sort_longest_first(sizes, records=records), expected)
+
+    def test_with_history(self) -> None:
+        sizes = {'a': 10, 'b': 1000, 'c': 100}
+        records = {
+            'a': {
+                'elapsed': 5.0,
+                'size': 10
+            },
+            'b': {
+                'elapsed': 0.1,
+                'size': 1000
+            },
+        }
+        expected = ['a', 'c', 'b']  # "c" is estimated as 100 * 5.1 / 1010 sec
+
+        self.assertEqual(sort_longest_first(sizes, records=records), expected)
+
+    def test_with_changed_input(self) -> None:
+        sizes = {'a': 10, 'b': 1000}
+        records = {
+            'a': {
+                'elapsed': 5.0,
+                'size': 20
+            },
+            'b': {
+                'elapsed': 1.0,
+                'size': 1000
+            },
+        }
+        expected = ['b', 'a']  # the history of "a" is ignored because its input is changed
+
+        self.assertEqual(sort_longest_first(sizes, records=records), expected)
+
+
+class ElapsedTimeHistoryTest(unittest.TestCase):
+    def test_update(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            history = ElapsedTimeHistory(pathlib.Path(tempdir) / 'history.json')
+            directory = pathlib.Path(tempdir) / 'test'
+            self.assertEqual(history.get(directory=directory), {})
+            history.update({'a': {'elapsed': 1.0, 'size': 10}}, directory=directory, names=['a', 'b'])
+            history.update({'b': {'elapsed': 2.0, 'size': 20}}, directory=directory, names=['a', 'b'])
+            self.assertEqual(history.get(directory=directory), {'a': {'elapsed': 1.0, 'size': 10}, 'b': {'elapsed': 2.0, 'size': 20}})
+            self.assertEqual(history.get(directory=pathlib.Path(tempdir)), {})
+
+    def test_update_removed_case(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            history = ElapsedTimeHistory(pathlib.Path(tempdir) / 'history.json')
+            directory = pathlib.Path(tempdir) / 'test'
+            history.update({'a': {'elapsed': 1.0, 'size': 10}, 'b': {'elapsed': 2.0, 'size': 20}}, directory=directory, names=['a', 'b'])
+            history.update({'c': {'elapsed': 3.0, 'size': 30}}, directory=directory, names=['b', 'c'])
+            self.assertEqual(history.get(directory=directory), {'b': {'elapsed': 2.0, 'size': 20}, 'c': {'elapsed': 3.0, 'size': 30}})
+            self.assertEqual(sorted(path.name for path in pathlib.Path(tempdir).iterdir()), ['history.json'])
@@ -1,3 +1,5 @@
+import pathlib
+import tempfile
 import unittest
 
 from onlinejudge_command.format_utils import *
@@ -13,3 +15,55 @@ class PercentFormatTest(unittest.TestCase):
         self.assertEqual(percentparse("foo AAAA bar 12345", "foo %a%a bar %b", {"a": "AA", "b": "12345"}), {'a': 'AA', 'b': '12345'})
         self.assertEqual(percentparse("123456789", "%x%y%z", {"x": r"\d+", "y": r"\d", "z": r"(\d\d\d)+"}), {'x': '12345', 'y': '6', 'z': '789'})
         self.assertRaises(KeyError, lambda: percentparse("foo", "%a", {}))
+
+
+class FindTestCasesTest(unittest.TestCase):
+    def test_find_test_cases(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir) / 'test'
+            for path in ['sample-1.in', 'sample-1.out', 'sample-2.in', 'sample-2.in~', '.hidden.in']:
+                (directory / path).parent.mkdir(parents=True, exist_ok=True)
+                (directory / path).write_text('')
+            expected = {
+                'sample-1': {
+                    'in': directory / 'sample-1.in',
+                    'out': directory / 'sample-1.out',
+                },
+                'sample-2': {
+                    'in': directory / 'sample-2.in',
+                },
+            }
+
+            self.assertEqual(find_test_cases(directory, '%s.%e', ignore_backup=True), expected)
+            self.assertEqual(construct_relationship_of_files(drop_backup_or_hidden_files(glob_with_format(directory, '%s.%e')), directory, '%s.%e'), expected)
+
+    def test_find_test_cases_with_subdirectories(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            for path in ['test_in/sample-1.txt', 'test_out/sample-1.txt', 'test_in/sample-2.txt', 'other/sample-3.txt']:
+                (directory / path).parent.mkdir(parents=True, exist_ok=True)
+                (directory / path).write_text('')
+            expected = {
+                'sample-1': {
+                    'in': directory / 'test_in' / 'sample-1.txt',
+                    'out': directory / 'test_out' / 'sample-1.txt',
+                },
+                'sample-2': {
+                    'in': directory / 'test_in' / 'sample-2.txt',
+                },
+            }
+
+            self.assertEqual(find_test_cases(directory, 'test_%e/%s.txt', ignore_backup=True), expected)
+
+
+class MatchWithFormatTest(unittest.TestCase):
+    def test_relative_path(self):
+        m = match_with_format(pathlib.Path('p/o/../../p/o'), 'sample-%s.%e', pathlib.Path('p/o/sample-1.in'))
+        self.assertIsNotNone(m)
+        self.assertEqual(m.groupdict(), {'name': '1', 'ext': 'in'})
+
+    def test_outside(self):
+        self.assertIsNone(match_with_format(pathlib.Path('test'), '%s.%e', pathlib.Path('other/sample-1.in')))
+
+    def test_compile_format_is_cached(self):
+        self.assertIs(compile_format('%s.%e'), compile_format('%s.%e'))
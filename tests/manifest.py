@@ -0,0 +1,121 @@
+"""This module has unit tests for onlinejudge_command.manifest module.
+"""
+
+import json
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+
+from onlinejudge_command.manifest import *
+from onlinejudge_command.result_cache import hash_file
+
+
+def make_directory_old(path: pathlib.Path) -> None:
+    # The manifest doesn't trust directories which are modified just before it is saved.
+    mtime_ns = time.time_ns() - 60 * 10**9
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class ManifestTest(unittest.TestCase):
+    def test_create(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            (directory / 'sample-1.in').write_text('foo\n')
+            (directory / 'sample-1.out').write_text('bar\n')
+            (directory / 'sample-1.in~').write_text('baz\n')
+
+            self.assertIsNone(open_manifest(directory, '%s.%e'))
+            manifest = open_manifest(directory, '%s.%e', create=True)
+            assert manifest is not None
+            manifest.save()
+            self.assertTrue((directory / MANIFEST_FILE_NAME).exists())
+            self.assertEqual(manifest.get_test_cases(), {'sample-1': {'in': directory / 'sample-1.in', 'out': directory / 'sample-1.out'}})
+
+    def make_fresh_manifest(self, directory: pathlib.Path) -> None:
+        (directory / MANIFEST_FILE_NAME).write_text('{}')  # an unknown version. The file is made in advance not to change the mtime of the directory.
+        make_directory_old(directory)
+        manifest = open_manifest(directory, '%s.%e', create=True)
+        assert manifest is not None
+        manifest.save()
+
+    def test_fresh(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            (directory / 'sample-1.in').write_text('foo\n')
+            self.make_fresh_manifest(directory)
+
+            # The cases are read from the manifest without walking the directory while the mtime of the directory is unchanged.
+            mtime_ns = directory.stat().st_mtime_ns
+            (directory / 'sample-2.in').write_text('bar\n')
+            os.utime(directory, ns=(mtime_ns, mtime_ns))
+            manifest = open_manifest(directory, '%s.%e')
+            assert manifest is not None
+            self.assertEqual(manifest.get_names(), {'sample-1'})
+
+    def test_changed_while_used(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            (directory / 'sample-1.in').write_text('foo\n')
+            self.make_fresh_manifest(directory)
+            manifest = open_manifest(directory, '%s.%e')
+            assert manifest is not None
+
+            # Another command adds a file while the manifest is used. Saving the manifest must not hide it.
+            (directory / 'sample-2.in').write_text('bar\n')
+            make_directory_old(directory)
+            manifest.hash_file(directory / 'sample-1.in')
+            manifest.save()
+            manifest = open_manifest(directory, '%s.%e')
+            assert manifest is not None
+            self.assertEqual(manifest.get_names(), {'sample-1', 'sample-2'})
+
+    def test_add_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            (directory / 'sample-1.in').write_text('foo\n')
+            self.make_fresh_manifest(directory)
+            manifest = open_manifest(directory, '%s.%e')
+            assert manifest is not None
+
+            # Files added by this process keep the manifest up to date.
+            (directory / 'sample-2.in').write_text('bar\n')
+            manifest.add_file(directory / 'sample-2.in', b'bar\n')
+            manifest.save()
+            with (directory / MANIFEST_FILE_NAME).open() as fh:
+                data = json.load(fh)
+            self.assertEqual(data['directories'], {os.curdir: directory.stat().st_mtime_ns})
+            self.assertEqual(set(data['cases'].keys()), {'sample-1', 'sample-2'})
+
+    def test_stale(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            (directory / 'sample-1.in').write_text('foo\n')
+            manifest = open_manifest(directory, '%s.%e', create=True)
+            assert manifest is not None
+            manifest.save()
+
+            (directory / 'sample-2.in').write_text('bar\n')
+            manifest = open_manifest(directory, '%s.%e')
+            assert manifest is not None
+            self.assertEqual(manifest.get_names(), {'sample-1', 'sample-2'})
+
+    def test_unrecognizable_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            (directory / 'sample-1.txt').write_text('foo\n')
+            self.assertIsNone(open_manifest(directory, '%s.%e', create=True))
+
+    def test_hash_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            directory = pathlib.Path(tempdir)
+            path = directory / 'sample-1.in'
+            path.write_text('foo\n')
+            manifest = open_manifest(directory, '%s.%e', create=True)
+            assert manifest is not None
+
+            self.assertEqual(manifest.hash_file(path), hash_file(path))
+            path.write_text('bar\n')
+            os.utime(path, ns=(0, 0))  # the size is unchanged
+            self.assertEqual(manifest.hash_file(path), hash_file(path))
@@ -1,7 +1,10 @@
 """This module has unit tests for onlinejudge_command.output_comparators module.
 """
 
+import io
+import random
 import unittest
+from typing import *
 
 from onlinejudge_command.output_comparators import *
 
@@ -105,6 +108,17 @@ class FloatingPointNumberComparatorTest(unittest.TestCase):
         compare = FloatingPointNumberComparator(rel_tol=rel_tol, abs_tol=abs_tol)
         self.assertEqual(compare(x, y), result)
 
+    def test_find_first_mismatch(self) -> None:
+        rnd = random.Random(0)
+        words = [b'0', b'1', b'1.0001', b'-1', b'1e400', b'-1e400', b'inf', b'nan', b'1_000', b'1000', b'yes', b'1\0', b'0x10']
+        compare = FloatingPointNumberComparator(rel_tol=0.001, abs_tol=0.001)
+        for _ in range(300):
+            n = rnd.randint(0, 100)
+            x = [rnd.choice(words) for _ in range(n)]
+            y = [rnd.choice(words) if rnd.random() < 0.05 else word for word in x]
+            expected = next((i for i in range(n) if not compare(x[i], y[i])), None)
+            self.assertEqual(compare.find_first_mismatch(x, y), expected, (x, y))
+
 
 class SplitComparatorTest(unittest.TestCase):
     def test_same(self) -> None:
@@ -197,3 +211,142 @@ class CRLFInsensitiveComparatorTest(unittest.TestCase):
 
         compare = CRLFInsensitiveComparator(file_comparator)
         self.assertEqual(compare(x, y), result)
+
+
+def _build_non_streaming_comparator(compare_mode: CompareMode, *, error: Optional[float]) -> OutputComparator:
+    if compare_mode == CompareMode.EXACT_MATCH and error is None:
+        return ExactComparator()
+    if compare_mode == CompareMode.CRLF_INSENSITIVE_EXACT_MATCH and error is None:
+        return CRLFInsensitiveComparator(ExactComparator())
+    if error is not None:
+        word_comparator: OutputComparator = FloatingPointNumberComparator(rel_tol=error, abs_tol=error)
+    else:
+        word_comparator = ExactComparator()
+    if compare_mode == CompareMode.IGNORE_SPACES_AND_NEWLINES:
+        return CRLFInsensitiveComparator(SplitComparator(word_comparator))
+    return CRLFInsensitiveComparator(SplitLinesComparator(SplitComparator(word_comparator)))
+
+
+class StreamingComparatorTest(unittest.TestCase):
+    def compare(self, compare_mode: CompareMode, x: bytes, y: bytes, *, error: Optional[float] = None, chunk_size: int = 1) -> Optional[int]:
+        comparator = build_streaming_comparator(compare_mode, error=error)
+        return comparator.compare_files(io.BytesIO(x), io.BytesIO(y), chunk_size=chunk_size).offset
+
+    def test_same_results_to_non_streaming_comparators(self) -> None:
+        rnd = random.Random(0)
+        for _ in range(3000):
+            x = bytes(rnd.choice(b'ab1.2 \r\n') for _ in range(rnd.randint(0, 10)))
+            y = bytes(rnd.choice(b'ab1.2 \r\n') for _ in range(rnd.randint(0, 10)))
+            if rnd.random() < 0.5:
+                y = x.replace(b'\n', b'\r\n') if rnd.random() < 0.5 else x + b' \n'
+            compare_mode = rnd.choice(list(CompareMode))
+            error = rnd.choice([None, 0.5])
+            chunk_size = rnd.randint(1, 4)
+            expected = _build_non_streaming_comparator(compare_mode, error=error)(x, y)
+            actual = self.compare(compare_mode, x, y, error=error, chunk_size=chunk_size) is None
+            self.assertEqual(actual, expected, (x, y, compare_mode, error, chunk_size))
+
+    def test_exact_match_offset(self) -> None:
+        self.assertEqual(self.compare(CompareMode.EXACT_MATCH, b'Hello, world!\n', b'Hello, World!\n', chunk_size=3), 7)
+        self.assertEqual(self.compare(CompareMode.EXACT_MATCH, b'Hello\n', b'Hello\nworld\n', chunk_size=3), 6)
+        self.assertEqual(self.compare(CompareMode.EXACT_MATCH, b'Hello\nworld\n', b'Hello\n', chunk_size=3), 6)
+
+    def test_crlf_straddling_chunks(self) -> None:
+        self.assertIsNone(self.compare(CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, b'foo\r\nbar\r\n', b'foo\nbar\n', chunk_size=4))
+        self.assertEqual(self.compare(CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, b'foo\r\nbaz\r\n', b'foo\nbar\n', chunk_size=4), 7)
+
+    def test_word_straddling_chunks(self) -> None:
+        self.assertIsNone(self.compare(CompareMode.IGNORE_SPACES, b'foo  bar \n', b'foo bar\n', chunk_size=2))
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES, b'foo bar baz\n', b'foo bar bax\n', chunk_size=2), 8)
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES, b'foo\nbar\n', b'foo bar\n', chunk_size=2), 3)
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES_AND_NEWLINES, b'foo\nbar\n', b'foo bar baz\n', chunk_size=2), 7)
+
+    def test_floating_point_numbers(self) -> None:
+        self.assertIsNone(self.compare(CompareMode.IGNORE_SPACES, b'1.0001 2\n', b'1.0 2.0\n', error=0.001, chunk_size=2))
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES, b'1.0001 2.1\n', b'1.0 2.0\n', error=0.001, chunk_size=2), 7)
+
+    def test_many_floating_point_numbers(self) -> None:
+        n = 3 * WORD_BATCH_SIZE
+        x = ''.join('{:.7f}\n'.format(i / 3) for i in range(n)).encode()
+        y = ''.join('{:.4f}\n'.format(i / 3) for i in range(n)).encode()
+        self.assertIsNone(self.compare(CompareMode.IGNORE_SPACES, x, y, error=0.001, chunk_size=CHUNK_SIZE))
+        self.assertIsNone(self.compare(CompareMode.IGNORE_SPACES_AND_NEWLINES, x, y, error=0.001, chunk_size=CHUNK_SIZE))
+        z = y.replace(b'\n1000.0000\n', b'\n1002.0000\n')
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES, z, x, error=0.001, chunk_size=CHUNK_SIZE), z.index(b'1002.0000'))
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES_AND_NEWLINES, z, x, error=0.001, chunk_size=CHUNK_SIZE), z.index(b'1002.0000'))
+
+
+class CompareOutputsTest(unittest.TestCase):
+    def compare(self, compare_mode: CompareMode, x: bytes, y: bytes, *, error: Optional[float] = None, chunk_size: int = 1) -> ComparisonResult:
+        return compare_outputs(io.BytesIO(x), io.BytesIO(y), compare_mode=compare_mode, error=error, chunk_size=chunk_size)
+
+    def test_matched(self) -> None:
+        self.assertEqual(self.compare(CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, b'foo\r\nbar\r\n', b'foo\nbar\n'), ComparisonResult(matched=True))
+
+    def test_position(self) -> None:
+        expected = ComparisonResult(matched=False, offset=15, lineno=1, word_index=3, is_whitespace_only=False)
+        self.assertEqual(self.compare(CompareMode.EXACT_MATCH, b'foo bar\nhello wrold\n', b'foo bar\nhello world\n', chunk_size=3), expected)
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES, b'foo bar\nhello wrold\n', b'foo  bar\nhello world\n', chunk_size=3), expected._replace(offset=14))  # the beginning of the word
+
+    def test_whitespace_only(self) -> None:
+        expected = ComparisonResult(matched=False, offset=3, lineno=0, word_index=0, is_whitespace_only=True)
+        self.assertEqual(self.compare(CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, b'foo bar\n', b'foo\nbar\n'), expected)
+        # This is checked only when --ignore-spaces may help, i.e. for exact comparison without errors.
+        self.assertEqual(self.compare(CompareMode.IGNORE_SPACES, b'foo bar\n', b'foo\nbar\n'), expected._replace(offset=4, word_index=1, is_whitespace_only=False))  # the word after the missing newline
+        self.assertEqual(self.compare(CompareMode.CRLF_INSENSITIVE_EXACT_MATCH, b'1.0 2.0\n', b'1.0\n2.0\n', error=0.1), expected._replace(offset=4, word_index=1, is_whitespace_only=False))
+
+    def test_count_lines_and_words(self) -> None:
+        rnd = random.Random(0)
+        for _ in range(1000):
+            x = bytes(rnd.choice(b'ab \n') for _ in range(rnd.randint(1, 20)))
+            y = x[:rnd.randint(0, len(x) - 1)] + b'!'
+            result = self.compare(CompareMode.EXACT_MATCH, x, y, chunk_size=rnd.randint(1, 4))
+            assert result.offset is not None
+            prefix = x[:result.offset]
+            expected_word_index = len(prefix.split()) - (1 if prefix and not prefix[-1:].isspace() else 0)
+            self.assertEqual((result.lineno, result.word_index), (prefix.count(b'\n'), expected_word_index), (x, y))
+
+    def test_same_results_to_non_streaming_comparators(self) -> None:
+        rnd = random.Random(0)
+        for _ in range(3000):
+            x = bytes(rnd.choice(b'ab1.2 \r\n') for _ in range(rnd.randint(0, 10)))
+            y = bytes(rnd.choice(b'ab1.2 \r\n') for _ in range(rnd.randint(0, 10)))
+            if rnd.random() < 0.5:
+                y = x.replace(b'\n', b'\r\n') if rnd.random() < 0.5 else x.replace(b' ', b'\n')
+            compare_mode = rnd.choice(list(CompareMode))
+            error = rnd.choice([None, 0.5])
+            result = self.compare(compare_mode, x, y, error=error, chunk_size=rnd.randint(1, 4))
+            self.assertEqual(result.matched, _build_non_streaming_comparator(compare_mode, error=error)(x, y), (x, y, compare_mode, error))
+            if result.matched:
+                continue
+
+            # the positions are counted as the prefix of the actual output
+            assert result.offset is not None
+            prefix = x[:result.offset]
+            expected_word_index = len(prefix.split()) - (1 if prefix and not prefix[-1:].isspace() else 0)
+            self.assertEqual((result.lineno, result.word_index), (prefix.count(b'\n'), expected_word_index), (x, y, compare_mode, error))
+            # the hint of --ignore-spaces is only for exact comparison without errors
+            is_whitespace_only = False
+            if compare_mode in (CompareMode.EXACT_MATCH, CompareMode.CRLF_INSENSITIVE_EXACT_MATCH) and error is None:
+                is_whitespace_only = _build_non_streaming_comparator(CompareMode.IGNORE_SPACES_AND_NEWLINES, error=None)(x, y)
+            self.assertEqual(result.is_whitespace_only, is_whitespace_only, (x, y, compare_mode, error))
+
+    def test_read_once(self) -> None:
+        class CountingBytesIO(io.BytesIO):
+            read_size = 0
+
+            def read(self, size: Optional[int] = -1) -> bytes:
+                data = super().read(size)
+                self.read_size += len(data)
+                return data
+
+        x = b'foo bar\n' * 1000 + b'baz\n' + b'foo bar\n' * 1000
+        y = b'foo bar\n' * 1000 + b'baz \n' + b'foo\nbar\n' * 1000
+        for compare_mode in (CompareMode.EXACT_MATCH, CompareMode.CRLF_INSENSITIVE_EXACT_MATCH):
+            actual = CountingBytesIO(x)
+            expected = CountingBytesIO(y)
+            result = compare_outputs(actual, expected, compare_mode=compare_mode, error=None, chunk_size=100)
+            self.assertEqual(result, ComparisonResult(matched=False, offset=8003, lineno=1000, word_index=2000, is_whitespace_only=True))
+            # only the chunk at the mismatch is read again
+            self.assertLess(actual.read_size, len(x) + 100)
+            self.assertLess(expected.read_size, len(y) + 100)
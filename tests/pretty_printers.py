@@ -1,12 +1,15 @@
 """This module has unit tests for onlinejudge_command.pretty_printers module.
 """
 
+import pathlib
+import random
+import tempfile
 import textwrap
 import unittest
 from typing import *
 
 from onlinejudge_command.output_comparators import CompareMode
-from onlinejudge_command.pretty_printers import _LineDiffOp, _make_diff_between_file_and_file, _PrettyToken, _PrettyTokenType, _render_tokens, _tokenize_file_content_without_snipping, _tokenize_large_file_content, _tokenize_line, _tokenize_pretty_diff
+from onlinejudge_command.pretty_printers import LARGE_FILE_CONTENT_SIZE, MAX_DIFF_LINES, _DiffRow, _DiffRowDots, _get_line_opcodes, _iterate_rows_around_diff_lines, _iterate_rows_with_dots, _LineDiffOp, _LineDiffPosition, _make_diff_between_file_and_file, _PrettyToken, _PrettyTokenType, _render_tokens, _tokenize_file_content_without_snipping, _tokenize_large_file_content, _tokenize_large_file_content_with_windows, _tokenize_line, _tokenize_pretty_diff, _TooManyDiffLinesError, _warn_if_empty, make_pretty_large_file_content, make_pretty_large_file_content_of_file
 
 
 class TokenizeLineTest(unittest.TestCase):
@@ -168,6 +171,56 @@ class TokenizeLargeFileContentTest(unittest.TestCase):
         self.assertEqual(actual, expected)
 
 
+class TokenizeLargeFileContentWithWindowsTest(unittest.TestCase):
+    def test_same_as_whole(self) -> None:
+        # The contents are smaller than LARGE_FILE_CONTENT_SIZE, so _tokenize_large_file_content decodes the whole.
+        random.seed(0)
+        alphabet = [b'a', b'b', b' ', b'\t', b'\n', b'\r\n', b'\n\n', 'あ'.encode(), b'xyzxyzxyz', b'\r', b'\xff', b'\x0c']
+        weights = [10, 10, 3, 1, 8, 2, 2, 2, 2, 0.05, 0.05, 0.05]
+        for _ in range(1000):
+            content = b''.join(random.choices(alphabet, weights, k=random.randint(1, 300)))
+            limit = random.randint(3, 15)
+            head = random.randint(0, limit // 2)
+            tail = random.randint(0, limit - head - 1)
+            char_in_line = random.randint(1, 10)
+
+            expected = _tokenize_large_file_content(content=content, limit=limit, head=head, tail=tail, char_in_line=char_in_line)
+            actual = _tokenize_large_file_content_with_windows(content=content, limit=limit, head=head, tail=tail, char_in_line=char_in_line)
+            if actual is not None:
+                self.assertEqual(_warn_if_empty(actual), expected)
+
+    def test_too_many_lines(self) -> None:
+        content = b'hello\n' * (LARGE_FILE_CONTENT_SIZE // len(b'hello\n') + 1)
+        expected = [
+            _PrettyToken(_PrettyTokenType.BODY, 'hello'),
+            _PrettyToken(_PrettyTokenType.NEWLINE, '\n'),
+            _PrettyToken(_PrettyTokenType.HINT, '... ({} lines) ...\n'.format(len(content) // len(b'hello\n') - 2)),
+            _PrettyToken(_PrettyTokenType.BODY, 'hello'),
+            _PrettyToken(_PrettyTokenType.NEWLINE, '\n'),
+        ]
+
+        actual = _tokenize_large_file_content_with_windows(content=content, limit=40, head=1, tail=1, char_in_line=40)
+        self.assertEqual(actual, expected)
+
+    def test_invalid_utf8(self) -> None:
+        content = b'hello\n' * (LARGE_FILE_CONTENT_SIZE // len(b'hello\n')) + b'\xff\n'
+
+        actual = _tokenize_large_file_content_with_windows(content=content, limit=40, head=20, tail=10, char_in_line=40)
+        self.assertIsNone(actual)
+
+
+class MakePrettyLargeFileContentOfFileTest(unittest.TestCase):
+    def test_same_as_content(self) -> None:
+        for content in [b'hello\nworld\n', b'hello\n' * 100, b'hello' * 20000, b'\xff\n', b'']:
+            with tempfile.TemporaryDirectory() as tempdir:
+                path = pathlib.Path(tempdir) / 'input.txt'
+                path.write_bytes(content)
+
+                expected = make_pretty_large_file_content(content, limit=40, head=20, tail=10)
+                actual = make_pretty_large_file_content_of_file(path, limit=40, head=20, tail=10)
+                self.assertEqual(actual, expected)
+
+
 class TokenizeFileContentWithoutSnippingTest(unittest.TestCase):
     def test_small(self) -> None:
         content = b'hello\nworld\n'
@@ -355,6 +408,143 @@ class MakeDiffBetweenFileAndFileTest(unittest.TestCase):
         actual = _make_diff_between_file_and_file(a, b, compare_mode=compare_mode)
         self.assertEqual(actual, expected)
 
+    def test_file_difflib_with_matched_lines(self) -> None:
+        a = ''.join([
+            'foo\n',
+            'baz\n',
+            'hello\n',
+            'world\n',
+        ])
+        b = ''.join([
+            'foo\n',
+            'baz\n',
+            'hello\n',
+            'bar\n',
+            'world\n',
+        ])
+        compare_mode = CompareMode.CRLF_INSENSITIVE_EXACT_MATCH
+        expected = [
+            _LineDiffOp(lineno=3, left=None, right=[
+                _PrettyToken(_PrettyTokenType.BODY_HIGHLIGHT_RIGHT, 'bar'),
+                _PrettyToken(_PrettyTokenType.NEWLINE, '\n'),
+            ]),
+        ]
+
+        actual = _make_diff_between_file_and_file(a, b, compare_mode=compare_mode, matched_lines=3)
+        self.assertEqual(actual, expected)
+        self.assertEqual(_make_diff_between_file_and_file(a, b, compare_mode=compare_mode), expected)
+
+
+class GetLineOpcodesTest(unittest.TestCase):
+    def test_simple(self) -> None:
+        a = ['foo\n', 'baz\n', 'hello\n', 'world\n', 'hey\n', 'wow\n']
+        b = ['foo\n', 'bar\n', 'baz\n', 'hello\n', 'world\n', 'wow\n', 'wow\n']
+        expected = [
+            ('equal', 0, 1, 0, 1),
+            ('insert', 1, 1, 1, 2),
+            ('equal', 1, 4, 2, 5),
+            ('delete', 4, 5, 5, 5),
+            ('equal', 5, 6, 5, 6),
+            ('insert', 6, 6, 6, 7),
+        ]
+
+        self.assertEqual(_get_line_opcodes(a, b), expected)
+
+    def test_replace(self) -> None:
+        a = ['a\n', 'b\n', 'c\n']
+        b = ['a\n', 'x\n', 'y\n', 'c\n']
+        expected = [
+            ('equal', 0, 1, 0, 1),
+            ('replace', 1, 2, 1, 3),
+            ('equal', 2, 3, 3, 4),
+        ]
+
+        self.assertEqual(_get_line_opcodes(a, b), expected)
+
+    def test_shortest(self) -> None:
+        def lcs(a: List[str], b: List[str]) -> int:
+            dp = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+            for i in range(len(a)):
+                for j in range(len(b)):
+                    dp[i + 1][j + 1] = dp[i][j] + 1 if a[i] == b[j] else max(dp[i][j + 1], dp[i + 1][j])
+            return dp[len(a)][len(b)]
+
+        rnd = random.Random(0)
+        for _ in range(300):
+            a = [rnd.choice('abc') for _ in range(rnd.randint(0, 10))]
+            b = [rnd.choice('abc') for _ in range(rnd.randint(0, 10))]
+            reconstructed: List[str] = []
+            edits = 0
+            for tag, l_a, r_a, l_b, r_b in _get_line_opcodes(a, b):
+                if tag == 'equal':
+                    self.assertEqual(a[l_a:r_a], b[l_b:r_b])
+                else:
+                    edits += (r_a - l_a) + (r_b - l_b)
+                reconstructed += b[l_b:r_b]
+            self.assertEqual(reconstructed, b)
+            self.assertEqual(edits, len(a) + len(b) - 2 * lcs(a, b))
+
+    def test_repetitive(self) -> None:
+        # consecutive same lines are typical in outputs, and must not take quadratic time
+        a = ['0\n'] * 200000
+        b = ['0\n'] * 199900 + ['1\n']
+        expected = [
+            ('equal', 0, 199900, 0, 199900),
+            ('replace', 199900, 200000, 199900, 199901),
+        ]
+
+        self.assertEqual(_get_line_opcodes(a, b), expected)
+
+    def test_too_many_diff_lines(self) -> None:
+        a = ['a\n'] * 20
+        b = ['b\n'] * 20
+
+        self.assertRaises(_TooManyDiffLinesError, lambda: _get_line_opcodes(a, b, max_diff_lines=39))
+        self.assertEqual(len(_get_line_opcodes(a, b, max_diff_lines=40)), 1)
+
+
+class IterateDiffRowsTest(unittest.TestCase):
+    def test_around_diff_lines(self) -> None:
+        positions = [
+            _LineDiffPosition(10, True, True),
+            _LineDiffPosition(12, False, True),
+            _LineDiffPosition(1000000, True, False),
+        ]
+        expected = [
+            _DiffRow(8, 8, None),
+            _DiffRow(9, 9, None),
+            _DiffRow(10, 10, positions[0]),
+            _DiffRow(11, 11, None),
+            _DiffRow(None, 12, positions[1]),
+            _DiffRow(12, 13, None),
+            _DiffRow(13, 14, None),
+            _DiffRow(999998, 999999, None),
+            _DiffRow(999999, 1000000, None),
+            _DiffRow(1000000, None, positions[2]),
+            _DiffRow(1000001, 1000001, None),
+        ]
+
+        actual = list(_iterate_rows_around_diff_lines(positions, lines_a=1000002, lines_b=1000002, size=2))
+        self.assertEqual(actual, expected)
+
+    def test_with_dots(self) -> None:
+        rows = [
+            _DiffRow(3, 3, None),
+            _DiffRow(4, 4, _LineDiffPosition(4, True, True)),
+            _DiffRow(9, 9, _LineDiffPosition(9, True, True)),
+        ]
+        expected = [
+            _DiffRowDots,
+            _DiffRow(3, 3, None),
+            _DiffRow(4, 4, _LineDiffPosition(4, True, True)),
+            _DiffRowDots,
+            _DiffRow(9, 9, _LineDiffPosition(9, True, True)),
+            _DiffRowDots,
+        ]
+
+        actual = list(_iterate_rows_with_dots(iter(rows), lines_a=20, lines_b=20))
+        self.assertEqual(actual, expected)
+
 
 class MakePrettyDiffTest(unittest.TestCase):
     def test_word_by_word(self) -> None:
@@ -478,6 +668,33 @@ class MakePrettyDiffLimitTest(unittest.TestCase):
         actual = _render_tokens(tokens=tokens, font_dim=font_dim, font_bold=font_bold, font_red=font_red, font_blue=font_blue)
         self.assertEqual(len(actual.splitlines()), expected)
 
+    def test_too_many_diff_lines(self) -> None:
+        a = ''.join([
+            'a\n',
+        ] * 1000)
+        b = ''.join([
+            'b\n',
+        ] * 999)
+        compare_mode = CompareMode.CRLF_INSENSITIVE_EXACT_MATCH
+        char_in_line = 40
+        limit = 40
+        # the hint, the header, `limit` rows of lines at the same line numbers, and the summary
+        expected = [
+            '(too many differences: more than {} lines are deleted or added)'.format(MAX_DIFF_LINES),
+            'output:             expected:',
+            ' 1| a                1| b',
+        ]
+
+        font_dim = lambda s: s
+        font_bold = lambda s: s
+        font_red = lambda s: s
+        font_blue = lambda s: s
+        tokens = _tokenize_pretty_diff(a, expected=b, compare_mode=compare_mode, char_in_line=char_in_line, limit=limit)
+        actual = _render_tokens(tokens=tokens, font_dim=font_dim, font_bold=font_bold, font_red=font_red, font_blue=font_blue).splitlines()
+        self.assertEqual(actual[:3], expected)
+        self.assertEqual(len(actual), 1 + 1 + limit + 1)
+        self.assertEqual(actual[-1], '(also {} lines are deleted and {} lines are added...)'.format(1000 - limit, 999 - limit))
+
     def test_without_limit(self) -> None:
         a = ''.join([
             'a\n',
@@ -0,0 +1,88 @@
+"""This module has unit tests for onlinejudge_command.profiling module.
+"""
+
+import unittest
+
+from onlinejudge_command.profiling import *
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_summarize(self) -> None:
+        events = [
+            Event(name='spawn', case='a', begin=0.0, end=1.0, pid=1, tid=1),
+            Event(name='run', case='a', begin=1.0, end=4.0, pid=1, tid=1),
+            Event(name='spawn', case='b', begin=0.5, end=2.5, pid=1, tid=2),
+        ]
+        expected = [
+            {
+                'name': 'spawn',
+                'count': 2,
+                'total': 3.0,
+                'mean': 1.5,
+                'max': 2.0,
+            },
+            {
+                'name': 'run',
+                'count': 1,
+                'total': 3.0,
+                'mean': 3.0,
+                'max': 3.0,
+            },
+        ]
+
+        self.assertEqual(summarize(events), expected)
+
+    def test_summary_table(self) -> None:
+        events = [Event(name='compare', case=None, begin=0.0, end=0.25, pid=1, tid=1)]
+        expected = [
+            'time of oj itself (sec):',
+            'phase    count     total      mean       max',
+            'compare      1  0.250000  0.250000  0.250000',
+        ]
+
+        self.assertEqual(make_summary_table(events), expected)
+
+
+class MakeChromeTraceTest(unittest.TestCase):
+    def test_simple(self) -> None:
+        events = [
+            Event(name='run', case='a', begin=10.5, end=11.0, pid=1, tid=2),
+            Event(name='glob', case=None, begin=10.0, end=10.25, pid=1, tid=1),
+        ]
+        expected = {
+            'traceEvents': [
+                {
+                    'name': 'glob',
+                    'cat': 'oj',
+                    'ph': 'X',
+                    'ts': 0.0,
+                    'dur': 250000.0,
+                    'pid': 1,
+                    'tid': 1,
+                },
+                {
+                    'name': 'run',
+                    'cat': 'oj',
+                    'ph': 'X',
+                    'ts': 500000.0,
+                    'dur': 500000.0,
+                    'pid': 1,
+                    'tid': 2,
+                    'args': {
+                        'case': 'a'
+                    },
+                },
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+        self.assertEqual(make_chrome_trace(events, origin=10.0), expected)
+
+
+class PhaseTest(unittest.TestCase):
+    def test_disabled(self) -> None:
+        # nothing is recorded before enable() is called
+        self.assertIsNone(get_profiler())
+        with phase('run'):
+            pass
+        self.assertIsNone(get_profiler())